@@ -3,7 +3,8 @@
 import os
 from flask import Flask
 from flask_cors import CORS
-from .extensions import db, login_manager, migrate
+from .extensions import db, login_manager, migrate, async_db, invalidation_bus, response_cache, metrics, tracer, slow_query_log, reminders
+from .commands import register_commands
 
 def create_app(test_config=None):
     app = Flask(__name__, instance_relative_config=True)
@@ -26,9 +27,19 @@ def create_app(test_config=None):
     login_manager.init_app(app)
     CORS(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+    # flask db は作業ディレクトリによらずパッケージの migrations を使う。SQLite の ALTER はバッチで行う
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'), render_as_batch=True)
+    async_db.init_app(app)
+    invalidation_bus.init_app(app)
+    response_cache.init_app(app, invalidation_bus)
+    metrics.init_app(app, db)
+    metrics.add_collector(response_cache.metric_samples)
+    tracer.init_app(app, db)
+    slow_query_log.init_app(app, db)
+    reminders.init_app(app, invalidation_bus)
 
     register_blueprints(app)
+    register_commands(app)
 
     app.add_url_rule('/', endpoint='index')
 
@@ -36,8 +47,15 @@ def create_app(test_config=None):
 
 def register_blueprints(app):
     # Import and register blueprints here
-    from .api import index, auth, task, workbook
+    from .api import index, health, metrics, debug, auth, task, workbook, plan, calendar, reminder, search
     app.register_blueprint(index.bp)
+    app.register_blueprint(health.bp)
+    app.register_blueprint(metrics.bp)
+    app.register_blueprint(debug.bp)
     app.register_blueprint(auth.bp)
     app.register_blueprint(task.bp)
-    app.register_blueprint(workbook.bp)
\ No newline at end of file
+    app.register_blueprint(workbook.bp)
+    app.register_blueprint(plan.bp)
+    app.register_blueprint(calendar.bp)
+    app.register_blueprint(reminder.bp)
+    app.register_blueprint(search.bp)
\ No newline at end of file
@@ -1,12 +1,17 @@
 # api/auth.py
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, g
+import jwt
 from ..models.user_model import add_user, verify_user, get_user_by_id
-from ..utils.token import generate_access_token, generate_refresh_token, token_required
+from ..models.revoked_token_model import revoke_token
+from ..utils.query_budget import query_budget
+from ..utils.read_only import read_only
+from ..utils.token import generate_access_token, generate_refresh_token, token_required, refresh_token_required, verify_token, REFRESH_TOKEN_TYPE
 
 bp = Blueprint('auth', __name__)
 
 @bp.route('/signup', methods=['POST'])
+@query_budget(4)
 def signup():
     data = request.json  # JSON データを取得
     
@@ -32,6 +37,7 @@ def signup():
 
 
 @bp.route('/login', methods=['POST'])
+@query_budget(3)
 def login():
     data = request.json  # JSON データを取得
     
@@ -54,27 +60,51 @@ def login():
 
 
 @bp.route('/logout', methods=['GET'])
+@query_budget(4)
 @token_required
 def logout(user_id):
+    # 使用中のアクセストークンを失効させる
+    revoke_token(g.token_payload)
+
+    # リフレッシュトークンが送られた場合はそれも失効させる
+    data = request.get_json(silent=True) or {}
+    refresh_token = data.get('refresh_token')
+    if refresh_token:
+        try:
+            refresh_payload = verify_token(refresh_token)
+            if refresh_payload.get('user_id') == user_id and refresh_payload.get('type') == REFRESH_TOKEN_TYPE:
+                revoke_token(refresh_payload)
+        except jwt.InvalidTokenError:
+            pass
+
     return jsonify({'message': 'Successfully logged out'}), 200
 
 
 @bp.route('/check_logging', methods=['GET'])
+@query_budget(1)
 @token_required
 def check_logging(user_id):
     return jsonify({'message': f'Access granted for user: {user_id}'}), 200
 
 
 @bp.route('/get_user_info', methods=['GET'])
+@query_budget(4)
 @token_required
+@read_only
 def get_user_info(user_id):
     user, status_code = get_user_by_id(user_id)
     return jsonify({'user': user}), status_code
 
 
 @bp.route('/refresh', methods=['POST'])
-@token_required
+@query_budget(4)
+@refresh_token_required
 def refresh_access_token(user_id):
+    # リフレッシュトークンのローテーション: 使用したトークンを失効させる
+    response, status_code = revoke_token(g.token_payload)
+    if status_code == 500:
+        return jsonify(response), status_code
+
     new_access_token = generate_access_token(user_id)
     new_refresh_token = generate_refresh_token(user_id)
     return jsonify({'access_token': new_access_token, 'refresh_token': new_refresh_token}), 200
\ No newline at end of file
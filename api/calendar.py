@@ -0,0 +1,34 @@
+# api/calendar.py
+
+from flask import Blueprint, jsonify, request
+from ..utils.query_budget import query_budget
+from ..utils.read_only import read_only
+from ..utils.token import token_required
+from ..models.calendar_model import get_calendar, get_upcoming
+
+bp = Blueprint('calendar', __name__)
+
+
+@bp.route('/calendar')
+@query_budget(4)
+@token_required
+@read_only
+def calendar(user_id):
+    result, status_code = get_calendar(user_id, request.args.get('from'), request.args.get('to'), request.args.get('tz'))
+    return jsonify(result), status_code
+
+
+@bp.route('/upcoming')
+@query_budget(7)
+@token_required
+@read_only
+def upcoming(user_id):
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return jsonify({'error': 'Limit must be an integer.'}), 400
+
+    result, status_code = get_upcoming(user_id, limit)
+    return jsonify(result), status_code
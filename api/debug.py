@@ -0,0 +1,25 @@
+# api/debug.py
+
+from flask import Blueprint, jsonify, request, current_app, abort
+from ..extensions import tracer, slow_query_log
+
+bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+
+@bp.before_request
+def require_debug_endpoint():
+    # SQL 文やパラメータが含まれるため、設定で有効にした場合のみ公開する
+    if not current_app.config.get('TRACE_DEBUG_ENDPOINT', False):
+        abort(404)
+
+
+@bp.route('/traces')
+def get_traces():
+    limit = request.args.get('limit', type=int)
+    return jsonify(tracer.recent(limit)), 200
+
+
+@bp.route('/slow_queries')
+def get_slow_queries():
+    limit = request.args.get('limit', type=int)
+    return jsonify(slow_query_log.recent(limit)), 200
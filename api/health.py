@@ -0,0 +1,23 @@
+# api/health.py
+
+from flask import Blueprint, jsonify, current_app
+
+bp = Blueprint('health', __name__)
+
+
+@bp.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'}), 200
+
+
+@bp.route('/readyz')
+def readyz():
+    # server.py で起動した場合はウォームアップ完了までと停止処理中は ready にならない
+    # 開発サーバー（app.py）では常に ready
+    readiness = current_app.extensions.get('server_readiness')
+    if readiness is None:
+        return jsonify({'status': 'ready'}), 200
+
+    state = readiness.snapshot()
+    status_code = 200 if state['status'] == 'ready' else 503
+    return jsonify(state), status_code
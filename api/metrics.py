@@ -0,0 +1,11 @@
+# api/metrics.py
+
+from flask import Blueprint, Response
+from ..extensions import metrics
+
+bp = Blueprint('metrics', __name__)
+
+
+@bp.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
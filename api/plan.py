@@ -0,0 +1,37 @@
+# api/plan.py
+
+from flask import Blueprint, jsonify, request
+from ..utils.query_budget import query_budget
+from ..utils.token import token_required
+from ..models.plan_model import get_daily_plan, set_daily_capacity
+
+bp = Blueprint('plan', __name__)
+
+
+@bp.route('/get_daily_plan')
+# 割り当て直しに失敗して全体を作り直す場合も含めた文数
+@query_budget(13)
+@token_required
+def get_plan(user_id):
+    capacity = request.args.get('capacity')
+    if capacity is not None:
+        try:
+            capacity = int(capacity)
+        except ValueError:
+            return jsonify({'error': 'Daily capacity must be an integer.'}), 400
+
+    result, status_code = get_daily_plan(user_id, capacity)
+    return jsonify(result), status_code
+
+
+@bp.route('/set_daily_capacity', methods=['POST'])
+@query_budget(3)
+@token_required
+def update_daily_capacity(user_id):
+    data = request.json
+
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    result, status_code = set_daily_capacity(user_id, data.get('daily_capacity'))
+    return jsonify(result), status_code
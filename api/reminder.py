@@ -0,0 +1,26 @@
+# api/reminder.py
+
+from flask import Blueprint, jsonify, request
+from ..utils.query_budget import query_budget
+from ..utils.read_only import read_only
+from ..utils.token import token_required
+from ..models.reminder_model import get_reminder_events
+
+bp = Blueprint('reminder', __name__)
+
+
+@bp.route('/get_reminders')
+@query_budget(3)
+@token_required
+@read_only
+def get_reminders(user_id):
+    try:
+        after_id = request.args.get('after')
+        after_id = int(after_id) if after_id is not None else None
+        limit = request.args.get('limit')
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({'error': 'after and limit must be integers.'}), 400
+
+    result, status_code = get_reminder_events(user_id, after_id, limit)
+    return jsonify(result), status_code
@@ -0,0 +1,24 @@
+# api/search.py
+
+from flask import Blueprint, jsonify, request
+from ..utils.query_budget import query_budget
+from ..utils.read_only import read_only
+from ..utils.token import token_required
+from ..models.search_model import search, DEFAULT_PER_PAGE
+
+bp = Blueprint('search', __name__)
+
+
+@bp.route('/search')
+@query_budget(6)
+@token_required
+@read_only
+def search_items(user_id):
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', DEFAULT_PER_PAGE))
+    except ValueError:
+        return jsonify({'error': 'page and per_page must be integers.'}), 400
+
+    result, status_code = search(user_id, request.args.get('q'), page, per_page)
+    return jsonify(result), status_code
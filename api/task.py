@@ -1,6 +1,8 @@
 # api/task.py
 
 from flask import Blueprint, jsonify, request
+from ..utils.query_budget import query_budget
+from ..utils.read_only import read_only
 from ..utils.token import token_required
 from ..models.task_model import add_task, get_all_tasks, set_finish_state, db_delete_task
 
@@ -8,6 +10,7 @@ bp = Blueprint('task', __name__)
 
 
 @bp.route('/create_task', methods=['POST'])
+@query_budget(3)
 @token_required
 def create_task(user_id):
     data = request.json
@@ -21,30 +24,34 @@ def create_task(user_id):
 
 
 @bp.route('/get_tasks')
+@query_budget(4)
 @token_required
+@read_only
 def get_tasks(user_id):
     result, status_code = get_all_tasks(user_id)
     return jsonify(result), status_code
     
 
 @bp.route('/set_task_finish_state', methods=['POST'])
+@query_budget(3)
 @token_required
 def set_task_finish_state(user_id):
     data = request.get_json()
     task_id = data.get('task_id')
     completed = data.get('completed')
 
-    response, status_code = set_finish_state(user_id, task_id, completed)
+    response, status_code = set_finish_state(user_id, task_id, completed, data.get('version'))
 
     return jsonify(response), status_code
 
 
 @bp.route('/delete_task', methods=['POST'])
+@query_budget(4)
 @token_required
 def delete_task(use_id):
     data = request.get_json()
     task_id = data.get('task_id')
-    response, status_code = db_delete_task(use_id, task_id)
+    response, status_code = db_delete_task(use_id, task_id, data.get('version'))
 
     return jsonify(response), status_code
 
@@ -1,6 +1,8 @@
 # api/workbook.py
 
 from flask import Blueprint, jsonify, request
+from ..utils.query_budget import query_budget
+from ..utils.read_only import read_only
 from ..utils.token import token_required
 from ..models.workbook_model import add_workbook, get_all_workbooks, db_delete_workbook
 from ..models.page_model import set_completed_state_by_ranges
@@ -10,6 +12,7 @@ bp = Blueprint('workbook', __name__)
 
 
 @bp.route('/create_workbook', methods=['POST'])
+@query_budget(3)
 @token_required
 def create_workbook(user_id):
     data = request.json
@@ -23,13 +26,16 @@ def create_workbook(user_id):
 
 
 @bp.route('/get_workbooks')
+@query_budget(5)
 @token_required
+@read_only
 def get_workbooks(user_id):
     result, status_code = get_all_workbooks(user_id)
     return jsonify(result), status_code
     
 
 @bp.route('/try_add_assignment', methods=['POST'])
+@query_budget(6)
 @token_required
 def try_add_assignment(user_id):
     data = request.json
@@ -43,6 +49,7 @@ def try_add_assignment(user_id):
 
 
 @bp.route('/merge_assignment', methods=['POST'])
+@query_budget(6)
 @token_required
 def merge_assignment(user_id):
     data = request.json
@@ -56,6 +63,7 @@ def merge_assignment(user_id):
 
 
 @bp.route('/add_assignment', methods=['POST'])
+@query_budget(7)
 @token_required
 def add_assignment(user_id):
     data = request.json
@@ -69,13 +77,16 @@ def add_assignment(user_id):
 
 
 @bp.route('/get_all_assignments')
+@query_budget(5)
 @token_required
+@read_only
 def get_all_assignments(user_id):
     result, status_code = get_all_assignment(user_id)
     return jsonify(result), status_code
 
 
 @bp.route('/add_completed_page_ranges', methods=['POST'])
+@query_budget(5)
 @token_required
 def add_completed_page_ranges(user_id):
     data = request.json
@@ -91,6 +102,7 @@ def add_completed_page_ranges(user_id):
 
 
 @bp.route('/delete_workbook', methods=['POST'])
+@query_budget(6)
 @token_required
 def delete_workbook(user_id):
     data = request.json
@@ -99,12 +111,13 @@ def delete_workbook(user_id):
         return jsonify({'error': 'No data provided'}), 400
     
     workbook_id = data.get('workbook_id')
-    result, status_code = db_delete_workbook(user_id, workbook_id)
+    result, status_code = db_delete_workbook(user_id, workbook_id, data.get('version'))
 
     return jsonify(result), status_code
 
 
 @bp.route('/delete_assignment', methods=['POST'])
+@query_budget(4)
 @token_required
 def delete_assignment(user_id):
     data = request.json
@@ -113,6 +126,6 @@ def delete_assignment(user_id):
         return jsonify({'error': 'No data provided'}), 400
     
     assignment_id = data.get('assignment_id')
-    result, status_code = db_delete_assignment(user_id, assignment_id)
+    result, status_code = db_delete_assignment(user_id, assignment_id, data.get('version'))
 
     return jsonify(result), status_code
\ No newline at end of file
@@ -0,0 +1,127 @@
+# asgi.py
+"""
+ASGI entry point.
+    uvicorn allocaide_backend.asgi:create_asgi_app --factory --workers 4
+
+Small read-only GET endpoints are served by async views over AsyncSession
+(aiosqlite for SQLite). Every other route is forwarded to the Flask app, so the
+auth, task and workbook blueprints behave exactly as in the WSGI server.
+Requires the packages in requirements-asgi.txt (asgiref, aiosqlite, uvicorn).
+"""
+
+import asyncio
+
+from asgiref.wsgi import WsgiToAsgi
+
+from . import create_app
+from .extensions import async_db, invalidation_bus, response_cache
+from .utils.token import authenticate
+from .models.task_model import get_all_tasks_async
+from .models.user_model import get_user_by_id_async
+from .models.workbook_model import get_all_workbooks_async
+
+# パス -> 非同期ビュー（GET のみ）
+ASYNC_VIEWS = {}
+
+
+def async_view(path):
+    def decorator(func):
+        ASYNC_VIEWS[path] = func
+        return func
+    return decorator
+
+
+@async_view('/check_logging')
+async def check_logging(session, user_id):
+    return {'message': f'Access granted for user: {user_id}'}, 200
+
+
+@async_view('/get_user_info')
+async def get_user_info(session, user_id):
+    user, status_code = await get_user_by_id_async(session, user_id)
+    return {'user': user}, status_code
+
+
+@async_view('/get_tasks')
+async def get_tasks(session, user_id):
+    return await get_all_tasks_async(session, user_id)
+
+
+@async_view('/get_workbooks')
+async def get_workbooks(session, user_id):
+    # 同期モードと同じレスポンスキャッシュを使う
+    key = response_cache.make_key(user_id, 'get_all_workbooks')
+    found, value = response_cache.get(key)
+    if found:
+        return value
+
+    version = response_cache.get_version(user_id, 'get_all_workbooks')
+    value = await get_all_workbooks_async(session, user_id)
+    response_cache.set(key, value, version)
+    return value
+
+
+class AsgiApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi_app = WsgiToAsgi(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        view = None
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            view = ASYNC_VIEWS.get(scope['path'])
+
+        if view is None:
+            await self.wsgi_app(scope, receive, send)
+            return
+
+        await self.handle(view, scope, send)
+
+    def authenticate(self, authorization_header):
+        # 無効化バスの読み込みと失効済みトークンの確認は同期の SQLite I/O なので、スレッドで実行する
+        with self.flask_app.app_context():
+            invalidation_bus.poll()
+            return authenticate(authorization_header)
+
+    async def handle(self, view, scope, send):
+        headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in scope['headers']}
+
+        payload, error_response, status_code = await asyncio.to_thread(self.authenticate, headers.get('authorization'))
+        with self.flask_app.app_context():
+            if error_response:
+                result = error_response
+            else:
+                try:
+                    async with async_db.session() as session:
+                        result, status_code = await view(session, payload['user_id'])
+                except Exception as e:
+                    result, status_code = {'error': str(e)}, 500
+
+            # Flask の jsonify と同じ形式でシリアライズする
+            response = self.flask_app.json.response(result)
+
+        response_headers = [(b'content-type', response.content_type.encode('latin-1'))]
+        if 'origin' in headers:
+            # Flask-CORS の既定（全オリジン許可）に合わせる
+            response_headers.append((b'access-control-allow-origin', b'*'))
+
+        await send({'type': 'http.response.start', 'status': status_code, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_db.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(flask_app=None):
+    return AsgiApp(flask_app or create_app())
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the service.
+Run each module from the directory that contains the package, e.g.
+    python -m allocaide_backend.bench.assignment_read
+ベンチマークは一時ディレクトリの SQLite データベースに対して実行されます。
+"""
@@ -0,0 +1,68 @@
+"""
+課題のページ範囲読み出しのベンチマーク。
+中間テーブル（assignment_page_range_link + page_range）経由の旧読み出しと、
+Assignment.page_ranges のインライン列をデコードする新読み出しを比較する。
+"""
+
+import argparse
+
+from sqlalchemy.orm import subqueryload
+
+from ..extensions import db
+from ..models.user_model import User
+from ..models.workbook_model import Workbook
+from ..models.assignment_model import Assignment, PageRange
+from ..utils.model_util import ranges_data_to_ranges_list, encode_page_ranges, decode_page_ranges
+from .common import create_bench_app, measure, print_summary
+
+
+def seed(assignments, ranges_per_assignment):
+    user = User(username='bench', password='x')
+    db.session.add(user)
+    db.session.flush()
+    workbook = Workbook(title='bench', user_id=user.id)
+    db.session.add(workbook)
+    db.session.flush()
+
+    for i in range(assignments):
+        ranges = [[j * 10 + 1, j * 10 + 5] for j in range(ranges_per_assignment)]
+        assignment = Assignment(workbook_id=workbook.id, page_ranges=encode_page_ranges(ranges))
+        assignment.assignment_page_ranges.extend(PageRange(start=start, end=end) for start, end in ranges)
+        db.session.add(assignment)
+    db.session.commit()
+    return workbook.id
+
+
+def read_legacy(workbook_id):
+    assignments = db.session.query(Assignment).options(
+        subqueryload(Assignment.assignment_page_ranges)
+    ).filter_by(workbook_id=workbook_id, is_deleted=False).all()
+    result = [ranges_data_to_ranges_list(a.assignment_page_ranges) for a in assignments]
+    db.session.expunge_all()
+    return result
+
+
+def read_inline(workbook_id):
+    assignments = db.session.query(Assignment).filter_by(workbook_id=workbook_id, is_deleted=False).all()
+    result = [decode_page_ranges(a.page_ranges) for a in assignments]
+    db.session.expunge_all()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--assignments', type=int, default=200)
+    parser.add_argument('--ranges', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    with app.app_context():
+        workbook_id = seed(args.assignments, args.ranges)
+        assert read_legacy(workbook_id) == read_inline(workbook_id)
+        print_summary('link table (before)', measure(lambda: read_legacy(workbook_id), args.repeat))
+        print_summary('inline column (after)', measure(lambda: read_inline(workbook_id), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+同期モード（Werkzeug のスレッドサーバー）と非同期モード（uvicorn + asgi.py）の
+同時接続スループットの比較。
+同じ SQLite データベースに対してそれぞれのサーバーをサブプロセスで起動し、
+指定した数の同時接続から GET エンドポイントを叩く。
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from .. import create_app
+from ..extensions import db
+from .common import print_summary, signup
+
+MODULE = f'{__package__}.async_serving'
+PATHS = ['/get_tasks', '/get_workbooks', '/get_user_info']
+
+
+def create_server_app(database_path):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + database_path,
+        'INVALIDATION_BUS_PATH': database_path + '.bus',
+    })
+
+
+def serve(mode, database_path, port):
+    if mode == 'sync':
+        from werkzeug.serving import run_simple
+        run_simple('127.0.0.1', port, create_server_app(database_path), threaded=True)
+    else:
+        import uvicorn
+        from ..asgi import create_asgi_app
+        uvicorn.run(create_asgi_app(create_server_app(database_path)), host='127.0.0.1', port=port, log_level='warning')
+
+
+def seed(database_path, tasks, workbooks):
+    app = create_server_app(database_path)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    headers = signup(client)
+    for i in range(tasks):
+        client.post('/create_task', json={'title': f'task {i}', 'deadline': '2030-01-01T00:00:00'}, headers=headers)
+    for i in range(workbooks):
+        client.post('/create_workbook', json={'title': f'workbook {i}'}, headers=headers)
+    return headers['Authorization']
+
+
+async def fetch(port, path, authorization):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write((
+        f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: {authorization}\r\nConnection: close\r\n\r\n'
+    ).encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def drive(port, authorization, concurrency, requests):
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, PATHS[i % len(PATHS)], authorization)
+                if status != 200:
+                    errors += 1
+            except OSError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors, time.perf_counter() - started
+
+
+async def wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f'Server on port {port} did not start.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--serve', choices=['sync', 'async'], help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=5077)
+    parser.add_argument('--concurrency', default='1,16,64', help='同時接続数のカンマ区切り')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=50)
+    parser.add_argument('--workbooks', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.database, args.port)
+        return
+
+    database_path = os.path.join(tempfile.mkdtemp(prefix='allocaide_bench_'), 'bench.sqlite')
+    authorization = seed(database_path, args.tasks, args.workbooks)
+
+    for mode in ('sync', 'async'):
+        server = subprocess.Popen([
+            sys.executable, '-m', MODULE, '--serve', mode, '--database', database_path, '--port', str(args.port)
+        ])
+        try:
+            asyncio.run(wait_for_port(args.port))
+            for concurrency in [int(value) for value in args.concurrency.split(',')]:
+                latencies, errors, elapsed = asyncio.run(drive(args.port, authorization, concurrency, args.requests))
+                print_summary(f'{mode} c={concurrency}', latencies)
+                print(f'{"":<32} throughput={len(latencies) / elapsed:.1f} req/s errors={errors}')
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
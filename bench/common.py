@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+
+from .. import create_app
+from ..extensions import db
+
+
+def create_bench_app(**config):
+    """
+    一時ディレクトリの SQLite データベースを使うアプリを作成し、テーブルを作成する。
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='allocaide_bench_')
+    test_config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp_dir, 'bench.sqlite'),
+    }
+    test_config.update(config)
+    app = create_app(test_config)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def measure(func, repeat=100):
+    """func を repeat 回実行し、1 回ごとの経過時間（秒）のリストを返す。"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'count': len(samples),
+        'mean_ms': (sum(samples) / len(samples)) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+    }
+
+
+def print_summary(name, samples):
+    summary = summarize(samples)
+    print(f"{name:<32} n={summary['count']:<6} mean={summary['mean_ms']:.3f}ms "
+          f"p50={summary['p50_ms']:.3f}ms p95={summary['p95_ms']:.3f}ms p99={summary['p99_ms']:.3f}ms")
+    return summary
+
+
+def signup(client, username='bench', password='Bench#123'):
+    """テスト用ユーザーを作成し、Authorization ヘッダーを返す。"""
+    response = client.post('/signup', json={'username': username, 'password': password, 'checkPassword': password})
+    return {'Authorization': 'Bearer ' + response.get_json()['access_token']}
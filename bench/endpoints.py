@@ -0,0 +1,253 @@
+"""
+全エンドポイントのベンチマーク。
+データ量の段階（bench.seed.TIERS）ごとに合成データを作成し、最初のシードユーザーとして
+各ブループリントのエンドポイントをテストクライアントで順に呼び出して、
+スループットと p50/p95/p99 のレイテンシを JSON に保存します。
+書き込み系は毎回別の対象に対して実行し、削除系は計測中に作成した行を削除します。
+
+    python -m allocaide_backend.bench.endpoints --tiers small,medium --output results.json
+    python -m allocaide_backend.bench.endpoints --tiers small --baseline results.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
+import sqlalchemy
+from sqlalchemy import select
+
+from ..extensions import db
+from ..models.user_model import User
+from ..models.workbook_model import Workbook
+from ..models.assignment_model import Assignment
+from ..models.task_model import Task
+from ..utils.token import generate_access_token, generate_refresh_token
+from .common import create_bench_app, summarize
+from .seed import SEED_PASSWORD, TIERS, seed_database
+
+
+def run_requests(client, requests):
+    """requests を順に送り、(経過時間のリスト, エラー件数, 合計時間) を返す。"""
+    samples = []
+    errors = 0
+    started_all = time.perf_counter()
+    for method, path, kwargs in requests:
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        samples.append(time.perf_counter() - started)
+        if response.status_code >= 500:
+            errors += 1
+    return samples, errors, time.perf_counter() - started_all
+
+
+def owned_ids(model, user_id, after_id=0):
+    query = select(model.id).where(model.id > after_id, model.is_deleted == False)
+    if model is Assignment:
+        query = query.join(Workbook, Workbook.id == Assignment.workbook_id).where(Workbook.user_id == user_id)
+    else:
+        query = query.where(model.user_id == user_id)
+    return list(db.session.scalars(query.order_by(model.id)))
+
+
+def build_scenarios(app, user_id, repeat):
+    """
+    (名前, リクエストを生成する関数) のリストを返す。
+    関数は計測の直前に呼ばれるため、前のシナリオで作成された行を参照できます。
+    """
+    with app.app_context():
+        headers = {'Authorization': 'Bearer ' + generate_access_token(user_id)}
+        workbook_ids = owned_ids(Workbook, user_id)
+        assignment_ids = owned_ids(Assignment, user_id)
+        task_ids = owned_ids(Task, user_id)
+        seeded_max = {model: db.session.scalar(select(sqlalchemy.func.max(model.id))) or 0
+                      for model in (Workbook, Assignment, Task)}
+
+    def pick(ids, i):
+        return ids[i % len(ids)]
+
+    def created(model):
+        with app.app_context():
+            return owned_ids(model, user_id, seeded_max[model])
+
+    def fresh_tokens(generate):
+        with app.app_context():
+            return [generate(user_id) for _ in range(repeat)]
+
+    def same(method, path, **kwargs):
+        return lambda: [(method, path, dict(kwargs, headers=headers))] * repeat
+
+    deadline = datetime(2031, 1, 1)
+    return [
+        ('GET /', same('GET', '/')),
+        ('GET /healthz', same('GET', '/healthz')),
+        ('GET /metrics', same('GET', '/metrics')),
+        ('GET /check_logging', same('GET', '/check_logging')),
+        ('GET /get_user_info', same('GET', '/get_user_info')),
+        ('GET /get_workbooks', same('GET', '/get_workbooks')),
+        ('GET /get_tasks', same('GET', '/get_tasks')),
+        ('GET /get_all_assignments', same('GET', '/get_all_assignments')),
+        ('POST /signup', lambda: [
+            ('POST', '/signup', {'json': {'username': f'signup{i}', 'password': SEED_PASSWORD, 'checkPassword': SEED_PASSWORD}})
+            for i in range(repeat)
+        ]),
+        ('POST /login', lambda: [
+            ('POST', '/login', {'json': {'username': f'signup{i}', 'password': SEED_PASSWORD}}) for i in range(repeat)
+        ]),
+        ('POST /refresh', lambda: [
+            ('POST', '/refresh', {'headers': {'Authorization': 'Bearer ' + token}})
+            for token in fresh_tokens(generate_refresh_token)
+        ]),
+        ('GET /logout', lambda: [
+            ('GET', '/logout', {'headers': {'Authorization': 'Bearer ' + token}})
+            for token in fresh_tokens(generate_access_token)
+        ]),
+        ('POST /create_workbook', lambda: [
+            ('POST', '/create_workbook', {'json': {'title': f'Bench {i}'}, 'headers': headers}) for i in range(repeat)
+        ]),
+        ('POST /create_task', lambda: [
+            ('POST', '/create_task', {'json': {'title': f'Bench {i}', 'deadline': (deadline + timedelta(days=i)).isoformat()},
+                                      'headers': headers})
+            for i in range(repeat)
+        ]),
+        ('POST /set_task_finish_state', lambda: [
+            ('POST', '/set_task_finish_state', {'json': {'task_id': pick(task_ids, i), 'completed': i % 2 == 0}, 'headers': headers})
+            for i in range(repeat)
+        ]),
+        ('POST /add_assignment', lambda: [
+            ('POST', '/add_assignment', {'json': {
+                'workbook_id': pick(workbook_ids, i), 'deadline': (deadline + timedelta(days=i)).isoformat(),
+                'add_type': 'new', 'supplementary': 'bench', 'assignment_page_ranges': [{'start': i + 1, 'end': i + 20}],
+            }, 'headers': headers})
+            for i in range(repeat)
+        ]),
+        # add_assignment と同じワークブックと締め切りで送り、重複の確認（202）を計測する
+        ('POST /try_add_assignment', lambda: [
+            ('POST', '/try_add_assignment', {'json': {
+                'workbook_id': pick(workbook_ids, i), 'deadline': (deadline + timedelta(days=i)).isoformat(),
+                'add_type': 'try', 'assignment_page_ranges': [{'start': 1, 'end': 20}],
+            }, 'headers': headers})
+            for i in range(repeat)
+        ]),
+        ('POST /merge_assignment', lambda: [
+            ('POST', '/merge_assignment', {'json': {
+                'workbook_id': workbook_id, 'merge_target_assignment_id': assignment_id, 'supplementary': f'merge {i}',
+                'assignment_page_ranges': [{'start': i + 5, 'end': i + 40}],
+            }, 'headers': headers})
+            for i, (assignment_id, workbook_id) in enumerate(created_assignment_pairs(app, user_id, seeded_max[Assignment], repeat))
+        ]),
+        ('POST /add_completed_page_ranges', lambda: [
+            ('POST', '/add_completed_page_ranges', {'json': {
+                'workbook_id': pick(workbook_ids, i), 'completed_ranges': [[i + 1, i + 10]],
+            }, 'headers': headers})
+            for i in range(repeat)
+        ]),
+        ('POST /delete_assignment', lambda: [
+            ('POST', '/delete_assignment', {'json': {'assignment_id': assignment_id}, 'headers': headers})
+            for assignment_id in created(Assignment)[:repeat]
+        ]),
+        ('POST /delete_task', lambda: [
+            ('POST', '/delete_task', {'json': {'task_id': task_id}, 'headers': headers})
+            for task_id in created(Task)[:repeat]
+        ]),
+        ('POST /delete_workbook', lambda: [
+            ('POST', '/delete_workbook', {'json': {'workbook_id': workbook_id}, 'headers': headers})
+            for workbook_id in created(Workbook)[:repeat]
+        ]),
+    ]
+
+
+def created_assignment_pairs(app, user_id, after_id, limit):
+    with app.app_context():
+        return db.session.execute(
+            select(Assignment.id, Assignment.workbook_id)
+            .join(Workbook, Workbook.id == Assignment.workbook_id)
+            .where(Workbook.user_id == user_id, Assignment.id > after_id, Assignment.is_deleted == False)
+            .order_by(Assignment.id).limit(limit)
+        ).all()
+
+
+def run_tier(name, config, repeat, response_cache):
+    app = create_bench_app(RESPONSE_CACHE_ENABLED=response_cache)
+    with app.app_context():
+        seed_started = time.perf_counter()
+        rows = seed_database(config)
+        seed_seconds = time.perf_counter() - seed_started
+        user_id = db.session.scalar(select(User.id).order_by(User.id).limit(1))
+
+    client = app.test_client()
+    endpoints = {}
+    print(f'[{name}] ' + ', '.join(f'{count} {table}' for table, count in rows.items()) + f' (seeded in {seed_seconds:.1f}s)')
+    for endpoint, build in build_scenarios(app, user_id, repeat):
+        samples, errors, elapsed = run_requests(client, build())
+        summary = summarize(samples)
+        summary['errors'] = errors
+        summary['throughput_rps'] = len(samples) / elapsed if elapsed else 0.0
+        endpoints[endpoint] = summary
+        print(f"  {endpoint:<34} n={summary['count']:<5} p50={summary['p50_ms']:8.3f}ms "
+              f"p95={summary['p95_ms']:8.3f}ms p99={summary['p99_ms']:8.3f}ms "
+              f"{summary['throughput_rps']:9.1f} req/s errors={errors}")
+
+    return {'config': asdict(config), 'rows': rows, 'seed_seconds': seed_seconds, 'endpoints': endpoints}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=__file__.rsplit('/', 2)[0]).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline):
+    """前回の結果と p95 を比較して表示する。"""
+    print('p95 compared with baseline:')
+    for tier, tier_result in results['tiers'].items():
+        base_endpoints = baseline.get('tiers', {}).get(tier, {}).get('endpoints', {})
+        for endpoint, summary in tier_result['endpoints'].items():
+            base = base_endpoints.get(endpoint)
+            if not base or not base['p95_ms']:
+                continue
+            ratio = summary['p95_ms'] / base['p95_ms']
+            print(f'  [{tier}] {endpoint:<34} {base["p95_ms"]:8.3f}ms -> {summary["p95_ms"]:8.3f}ms ({ratio:.2f}x)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tiers', default='small,medium', help='カンマ区切り: ' + ', '.join(TIERS))
+    parser.add_argument('--repeat', type=int, default=50, help='エンドポイントごとのリクエスト数')
+    parser.add_argument('--response-cache', action='store_true', help='レスポンスキャッシュを有効にして計測する')
+    parser.add_argument('--output', help='結果を保存する JSON ファイル')
+    parser.add_argument('--baseline', help='比較対象の JSON ファイル')
+    args = parser.parse_args()
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'repeat': args.repeat,
+        'response_cache': args.response_cache,
+        'tiers': {},
+    }
+    for tier in args.tiers.split(','):
+        results['tiers'][tier] = run_tier(tier, TIERS[tier], args.repeat, args.response_cache)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Saved results to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+    return 1 if any(summary['errors'] for tier in results['tiers'].values() for summary in tier['endpoints'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+ログインのスループットとテールレイテンシのベンチマーク。
+scrypt のコスト（n）ごとにユーザーを作成し、複数スレッドから同時に /login を呼び出す。
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import create_bench_app, print_summary
+
+PASSWORD = 'Bench#123'
+
+
+def login_storm(app, users, logins, concurrency):
+    def login(i):
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/login', json={'username': f'user{i % users}', 'password': PASSWORD})
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    return [latency for latency, _ in results], [status for _, status in results], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--costs', default='12,14,15', help='log2(n) のカンマ区切り')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=4, help='PASSWORD_HASH_WORKERS')
+    args = parser.parse_args()
+
+    for log_n in [int(cost) for cost in args.costs.split(',')]:
+        app = create_bench_app(
+            PASSWORD_HASH_N=2 ** log_n,
+            PASSWORD_HASH_WORKERS=args.workers,
+            PASSWORD_HASH_MAX_PENDING=args.logins,
+        )
+        client = app.test_client()
+        for i in range(args.users):
+            client.post('/signup', json={'username': f'user{i}', 'password': PASSWORD, 'checkPassword': PASSWORD})
+
+        latencies, statuses, elapsed = login_storm(app, args.users, args.logins, args.concurrency)
+        print_summary(f'login n=2^{log_n}', latencies)
+        print(f'{"":<32} throughput={len(latencies) / elapsed:.1f} logins/s '
+              f'ok={statuses.count(200)} busy={statuses.count(503)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+各エンドポイントの SQL 文の数を @query_budget の宣言と照合するチェック。
+データ量を変えた段階ごとに同じリクエストを送り、予算超過や N+1 があれば終了コード 1 で終了します。
+同じ検査は tests/test_query_budgets.py でも pytest から実行されます。
+
+    python -m allocaide_backend.bench.query_budgets
+"""
+
+import argparse
+import sys
+
+from .common import create_bench_app, signup
+from ..utils.query_budget import QueryBudgetExceeded, assert_query_budget, get_query_budget, match_endpoint
+
+DEADLINE = '2030-01-01T00:00:00'
+# 段階: (ワークブック数, 課題あたりの範囲数, 完了済みの課題数)
+DEFAULT_TIERS = '2x1,20x5,4x1x40'
+
+
+def seed(client, headers, workbooks, ranges_per_assignment, completed_assignments=0):
+    """
+    ワークブックごとにタスク・課題・完了済みページを作成する。
+    completed_assignments を渡すと、ページをすべて終えた課題を通常の課題より前の締め切りで追加します。
+    """
+    for i in range(workbooks):
+        client.post('/create_workbook', json={'title': f'workbook {i}'}, headers=headers)
+        client.post('/create_task', json={'title': f'task {i}', 'deadline': DEADLINE}, headers=headers)
+        ranges = [{'start': j * 20 + 1, 'end': j * 20 + 10} for j in range(ranges_per_assignment)]
+        client.post('/add_assignment', json={
+            'workbook_id': i + 1, 'deadline': DEADLINE, 'add_type': 'new',
+            'supplementary': 'note', 'assignment_page_ranges': ranges,
+        }, headers=headers)
+        client.post('/add_completed_page_ranges', json={
+            'workbook_id': i + 1, 'completed_ranges': [[1, 5], [21, 25]],
+        }, headers=headers)
+    for i in range(completed_assignments):
+        client.post('/add_assignment', json={
+            'workbook_id': i % workbooks + 1, 'deadline': f'2029-12-{i % 28 + 1:02d}T00:00:00', 'add_type': 'new',
+            'supplementary': 'done', 'assignment_page_ranges': [{'start': 1, 'end': 5}],
+        }, headers=headers)
+
+
+def build_requests(workbooks):
+    last = workbooks
+    return [
+        ('POST', '/login', {'json': {'username': 'bench', 'password': 'Bench#123'}}),
+        ('GET', '/check_logging', {}),
+        ('GET', '/get_user_info', {}),
+        ('GET', '/get_workbooks', {}),
+        ('GET', '/get_tasks', {}),
+        ('GET', '/get_all_assignments', {}),
+        # 保存した計画がない状態で全体を作成する
+        ('GET', '/get_daily_plan', {}),
+        ('GET', '/calendar', {'query_string': {'from': '2029-12-01', 'to': '2030-01-31'}}),
+        ('GET', '/upcoming', {'query_string': {'limit': 10}}),
+        ('GET', '/upcoming?limit=2', {}),
+        ('GET', '/get_reminders', {}),
+        ('GET', '/search', {'query_string': {'q': 'workbook'}}),
+        ('POST', '/create_workbook', {'json': {'title': 'extra'}}),
+        ('POST', '/create_task', {'json': {'title': 'extra', 'deadline': DEADLINE}}),
+        ('POST', '/try_add_assignment', {'json': {
+            'workbook_id': 1, 'deadline': DEADLINE, 'add_type': 'try',
+            'assignment_page_ranges': [{'start': 1, 'end': 50}],
+        }}),
+        ('POST', '/add_assignment', {'json': {
+            'workbook_id': 1, 'deadline': '2031-01-01T00:00:00', 'add_type': 'new',
+            'supplementary': 'extra', 'assignment_page_ranges': [{'start': 1, 'end': 50}],
+        }}),
+        ('POST', '/merge_assignment', {'json': {
+            'workbook_id': 1, 'merge_target_assignment_id': 1, 'supplementary': 'merged',
+            'assignment_page_ranges': [{'start': 5, 'end': 80}],
+        }}),
+        ('POST', '/add_completed_page_ranges', {'json': {'workbook_id': 1, 'completed_ranges': [[1, 60]]}}),
+        ('POST', '/set_task_finish_state', {'json': {'task_id': 1, 'completed': True}}),
+        ('POST', '/delete_task', {'json': {'task_id': last}}),
+        ('POST', '/delete_assignment', {'json': {'assignment_id': last}}),
+        ('POST', '/delete_workbook', {'json': {'workbook_id': last}}),
+        # 上の書き込みで変更された課題だけを割り当て直す
+        ('GET', '/get_daily_plan', {}),
+        ('GET', '/get_daily_plan', {}),
+        # トークンを失効させるため最後に送る
+        ('GET', '/logout', {}),
+    ]
+
+
+def parse_tier(tier):
+    """'ワークブック数x範囲数[x完了済みの課題数]' を整数のタプルにする。"""
+    values = [int(value) for value in tier.split('x')]
+    return tuple(values) if len(values) == 3 else (*values, 0)
+
+
+def check(workbooks, ranges_per_assignment, completed_assignments=0):
+    # レスポンスキャッシュが効くと SQL が発行されないため無効にする
+    app = create_bench_app(RESPONSE_CACHE_ENABLED=False)
+    client = app.test_client()
+    headers = signup(client)
+    seed(client, headers, workbooks, ranges_per_assignment, completed_assignments)
+
+    failures = []
+    for method, path, kwargs in build_requests(workbooks):
+        max_queries, _ = get_query_budget(app, match_endpoint(app, method, path))
+        try:
+            response = assert_query_budget(client, method, path, headers=headers, **kwargs)
+            result = f'ok ({response.status_code})'
+        except QueryBudgetExceeded as e:
+            failures.append(str(e))
+            result = 'FAILED'
+        print(f'  {method:<5} {path:<28} budget={max_queries!s:<5} {result}')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tiers', default=DEFAULT_TIERS, help='ワークブック数x課題あたりの範囲数[x完了済みの課題数]（カンマ区切り）')
+    args = parser.parse_args()
+
+    failures = []
+    for tier in args.tiers.split(','):
+        workbooks, ranges_per_assignment, completed_assignments = parse_tier(tier)
+        print(f'[{workbooks} workbooks, {ranges_per_assignment} ranges per assignment, {completed_assignments} completed assignments]')
+        failures += check(workbooks, ranges_per_assignment, completed_assignments)
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
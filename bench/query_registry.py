@@ -0,0 +1,47 @@
+"""
+ホットなルックアップ 1 回あたりのオーバーヘッドの比較。
+ORM の Query を毎回組み立てる方法と、登録済みの select() を使い回す方法を比較する。
+"""
+
+import argparse
+
+from ..extensions import db
+from ..models.user_model import User, ACTIVE_USER_BY_USERNAME_QUERY
+from ..models.workbook_model import Workbook, WORKBOOK_FOR_USER_QUERY
+from ..models.task_model import Task, TASK_FOR_USER_QUERY
+from ..utils.query_registry import fetch_first
+from .common import create_bench_app, measure, print_summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5000)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    with app.app_context():
+        user = User(username='bench', password='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add_all([Workbook(title='bench', user_id=user.id), Task(title='bench', user_id=user.id)])
+        db.session.commit()
+
+        cases = [
+            ('workbook_for_user',
+             lambda: Workbook.query.filter_by(id=1, user_id=1).first(),
+             lambda: fetch_first(WORKBOOK_FOR_USER_QUERY, workbook_id=1, user_id=1)),
+            ('task_for_user',
+             lambda: Task.query.filter_by(id=1, user_id=1, is_deleted=False).first(),
+             lambda: fetch_first(TASK_FOR_USER_QUERY, task_id=1, user_id=1)),
+            ('active_user_by_username',
+             lambda: User.query.filter_by(username='bench', is_deleted=False).first(),
+             lambda: fetch_first(ACTIVE_USER_BY_USERNAME_QUERY, username='bench')),
+        ]
+        for name, orm_query, registered_query in cases:
+            assert orm_query() is registered_query()
+            print_summary(f'{name} (Query)', measure(orm_query, args.repeat))
+            print_summary(f'{name} (registered)', measure(registered_query, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
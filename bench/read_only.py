@@ -0,0 +1,97 @@
+"""
+読み取り専用の高速パスのメモリと CPU 時間の比較。
+1. 一覧の読み込み: ORM オブジェクト（変更追跡あり）と行タプル
+2. GET エンドポイント: READ_ONLY_SESSIONS の無効と有効
+それぞれ 1 回あたりの CPU 時間（time.process_time）と tracemalloc のピークメモリを出力する。
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from sqlalchemy import select
+
+from ..extensions import db
+from ..models.task_model import Task, task_to_dict
+from ..models.workbook_model import Workbook, workbook_to_dict, get_all_workbooks
+from .common import create_bench_app, signup
+
+
+def profile(func, repeat):
+    func()
+    # tracemalloc は CPU 時間を歪めるため、CPU 時間とメモリは別々に計測する
+    started = time.process_time()
+    for _ in range(repeat):
+        func()
+    cpu = (time.process_time() - started) / repeat
+
+    tracemalloc.start()
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.reset_peak()
+        func()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def print_profile(name, cpu, peak):
+    print(f'{name:<40} cpu={cpu * 1000:.3f}ms peak={peak / 1024:.1f}KiB')
+
+
+def seed(client, headers, tasks, workbooks, pages):
+    for i in range(tasks):
+        client.post('/create_task', json={'title': f'task {i}', 'deadline': '2030-01-01T00:00:00'}, headers=headers)
+    for i in range(workbooks):
+        client.post('/create_workbook', json={'title': f'workbook {i}'}, headers=headers)
+        client.post('/add_completed_page_ranges', json={'workbook_id': i + 1, 'completed_ranges': [[1, pages]]}, headers=headers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=500)
+    parser.add_argument('--workbooks', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_bench_app(RESPONSE_CACHE_ENABLED=False)
+    client = app.test_client()
+    headers = signup(client)
+    seed(client, headers, args.tasks, args.workbooks, args.pages)
+
+    with app.app_context():
+        def tasks_as_entities():
+            [task_to_dict(task) for task in Task.query.filter_by(user_id=1, is_deleted=False).all()]
+            db.session.rollback()
+
+        def tasks_as_rows():
+            rows = db.session.execute(
+                select(Task.id, Task.title, Task.supplementary, Task.deadline, Task.completed)
+                .filter_by(user_id=1, is_deleted=False)
+            ).all()
+            [task_to_dict(row) for row in rows]
+            db.session.rollback()
+
+        def workbooks_as_entities():
+            [workbook_to_dict(workbook) for workbook in Workbook.query.filter_by(user_id=1).all()]
+            db.session.rollback()
+
+        print_profile('tasks: ORM entities', *profile(tasks_as_entities, args.repeat))
+        print_profile('tasks: row tuples', *profile(tasks_as_rows, args.repeat))
+        def workbooks_as_rows():
+            get_all_workbooks(1)
+            db.session.rollback()
+
+        print_profile('workbooks: ORM entities', *profile(workbooks_as_entities, args.repeat))
+        print_profile('workbooks: row tuples', *profile(workbooks_as_rows, args.repeat))
+
+    for path in ('/get_tasks', '/get_workbooks', '/get_all_assignments', '/get_user_info'):
+        for enabled in (False, True):
+            app.config['READ_ONLY_SESSIONS'] = enabled
+            cpu, peak = profile(lambda: client.get(path, headers=headers), args.repeat)
+            print_profile(f'{path} (read-only={enabled})', cpu, peak)
+
+
+if __name__ == '__main__':
+    main()
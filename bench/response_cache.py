@@ -0,0 +1,49 @@
+"""
+レスポンスキャッシュのベンチマーク。
+/get_workbooks と /get_all_assignments をキャッシュ無効・有効で叩き、p50/p99 レイテンシを比較する。
+"""
+
+import argparse
+
+from ..extensions import response_cache
+from .common import create_bench_app, measure, print_summary, signup
+
+
+def seed(client, headers, workbooks, assignments_per_workbook):
+    for i in range(workbooks):
+        client.post('/create_workbook', json={'title': f'workbook {i}'}, headers=headers)
+        workbook_id = i + 1
+        for j in range(assignments_per_workbook):
+            client.post('/add_assignment', json={
+                'workbook_id': workbook_id,
+                'deadline': f'2030-01-{j % 28 + 1:02d}T00:00:00',
+                'add_type': 'new',
+                'assignment_page_ranges': [{'start': j * 10 + 1, 'end': j * 10 + 8}],
+            }, headers=headers)
+        client.post('/add_completed_page_ranges', json={'workbook_id': workbook_id, 'completed_ranges': [[1, 20]]}, headers=headers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workbooks', type=int, default=5)
+    parser.add_argument('--assignments', type=int, default=10, help='ワークブックあたりの課題数')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    client = app.test_client()
+    headers = signup(client)
+    seed(client, headers, args.workbooks, args.assignments)
+
+    for path in ('/get_workbooks', '/get_all_assignments'):
+        response_cache.enabled = False
+        print_summary(f'{path} (cache off)', measure(lambda: client.get(path, headers=headers), args.repeat))
+        response_cache.enabled = True
+        response_cache.clear()
+        print_summary(f'{path} (cache on)', measure(lambda: client.get(path, headers=headers), args.repeat))
+
+    print(response_cache.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+合成データの生成。
+ユーザーごとにワークブック、完了済みページ、重なりのあるページ範囲を持つ課題、タスクを作成し、
+テーブルごとにまとめて INSERT します。同じ seed と base_date からは同じデータが生成されます。
+
+    python -m allocaide_backend.bench.seed --users 50 --workbooks 20   # 一時データベースに生成して件数を表示
+    flask seed-data --users 50 --workbooks 20                           # アプリのデータベースに生成
+"""
+
+import argparse
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from ..extensions import db
+from ..models.user_model import User
+from ..models.workbook_model import Workbook
+from ..models.page_model import Page
+from ..models.assignment_model import Assignment
+from ..models.task_model import Task
+from ..utils.password import hash_password
+from ..utils.util import remove_range_duplicates
+from ..utils.model_util import encode_page_ranges
+
+SEED_PASSWORD = 'Bench#123'
+# 1 回の executemany で送る行数
+INSERT_BATCH_SIZE = 5000
+
+
+@dataclass
+class SeedConfig:
+    users: int = 10
+    workbooks_per_user: int = 5
+    pages_per_workbook: int = 100
+    completed_ratio: float = 0.4
+    assignments_per_workbook: int = 3
+    ranges_per_assignment: int = 4
+    tasks_per_user: int = 20
+    seed: int = 0
+    base_date: str = None  # YYYY-MM-DD。省略時は今日
+
+
+TIERS = {
+    'small': SeedConfig(users=10, workbooks_per_user=5, pages_per_workbook=100,
+                        assignments_per_workbook=3, ranges_per_assignment=4, tasks_per_user=20),
+    'medium': SeedConfig(users=50, workbooks_per_user=20, pages_per_workbook=200,
+                         assignments_per_workbook=5, ranges_per_assignment=5, tasks_per_user=100),
+    'large': SeedConfig(users=100, workbooks_per_user=40, pages_per_workbook=400,
+                        assignments_per_workbook=8, ranges_per_assignment=6, tasks_per_user=300),
+}
+
+
+def next_id(model):
+    return (db.session.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def bulk_insert(model, rows):
+    for offset in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.session.execute(insert(model), rows[offset:offset + INSERT_BATCH_SIZE])
+
+
+def random_ranges(rng, pages, count):
+    ranges = []
+    for _ in range(count):
+        start = rng.randint(1, pages)
+        end = min(pages, start + rng.randint(4, 30))
+        ranges.append([start, end])
+    return remove_range_duplicates(ranges)
+
+
+def seed_database(config):
+    """
+    config に従ってデータを作成し、作成した行数の辞書を返す。
+    ユーザー名は seed{seed}_user{n}、パスワードは SEED_PASSWORD です。
+    """
+    rng = random.Random(config.seed)
+    if config.base_date:
+        base_date = datetime.strptime(config.base_date, '%Y-%m-%d')
+    else:
+        base_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # scrypt は重いため、全ユーザーで同じハッシュを使う
+    password_hash = hash_password(SEED_PASSWORD)
+
+    user_id, workbook_id, assignment_id = next_id(User), next_id(Workbook), next_id(Assignment)
+    users, workbooks, pages, assignments, tasks = [], [], [], [], []
+
+    for user_index in range(config.users):
+        users.append({
+            'id': user_id, 'username': f'seed{config.seed}_user{user_index}',
+            'password': password_hash, 'is_deleted': False,
+        })
+
+        for workbook_index in range(config.workbooks_per_user):
+            workbooks.append({
+                'id': workbook_id, 'title': f'Workbook {workbook_index}', 'user_id': user_id, 'is_deleted': False,
+            })
+            for number in range(1, config.pages_per_workbook + 1):
+                if rng.random() < config.completed_ratio:
+                    pages.append({'workbook_id': workbook_id, 'number': number, 'completed': True, 'is_deleted': False})
+
+            for _ in range(config.assignments_per_workbook):
+                ranges = random_ranges(rng, config.pages_per_workbook, config.ranges_per_assignment)
+                created_at = base_date - timedelta(days=rng.randint(1, 60))
+                assignments.append({
+                    'id': assignment_id, 'workbook_id': workbook_id,
+                    'deadline': base_date + timedelta(days=rng.randint(-14, 90), hours=rng.choice((9, 12, 18, 23))),
+                    'supplementary': rng.choice((None, '', 'Review the exercises', 'Chapter summary\nCheck answers')),
+                    'page_ranges': encode_page_ranges(ranges),
+                    'created_at': created_at, 'updated_at': created_at, 'is_deleted': False,
+                })
+                assignment_id += 1
+            workbook_id += 1
+
+        for task_index in range(config.tasks_per_user):
+            tasks.append({
+                'title': f'Task {task_index}',
+                'supplementary': rng.choice((None, 'Bring the printout', 'Submit online')),
+                'deadline': base_date + timedelta(days=rng.randint(-30, 120), hours=rng.randint(0, 23)),
+                'completed': rng.random() < 0.3, 'user_id': user_id, 'is_deleted': False,
+            })
+        user_id += 1
+
+    for model, rows in ((User, users), (Workbook, workbooks), (Page, pages), (Assignment, assignments), (Task, tasks)):
+        bulk_insert(model, rows)
+    db.session.commit()
+
+    return {'users': len(users), 'workbooks': len(workbooks), 'pages': len(pages),
+            'assignments': len(assignments), 'tasks': len(tasks)}
+
+
+def add_seed_arguments(parser):
+    """flask seed-data と同じ名前のオプションを argparse に追加する。"""
+    defaults = SeedConfig()
+    parser.add_argument('--users', type=int, default=defaults.users)
+    parser.add_argument('--workbooks', dest='workbooks_per_user', type=int, default=defaults.workbooks_per_user)
+    parser.add_argument('--pages', dest='pages_per_workbook', type=int, default=defaults.pages_per_workbook)
+    parser.add_argument('--completed-ratio', type=float, default=defaults.completed_ratio)
+    parser.add_argument('--assignments', dest='assignments_per_workbook', type=int, default=defaults.assignments_per_workbook)
+    parser.add_argument('--ranges', dest='ranges_per_assignment', type=int, default=defaults.ranges_per_assignment)
+    parser.add_argument('--tasks', dest='tasks_per_user', type=int, default=defaults.tasks_per_user)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    parser.add_argument('--base-date', default=defaults.base_date)
+
+
+def main():
+    from .common import create_bench_app
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    with app.app_context():
+        print(seed_database(SeedConfig(**vars(args))))
+        print(app.config['SQLALCHEMY_DATABASE_URI'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+token_required デコレータのオーバーヘッドのマイクロベンチマーク。
+検証済みトークンキャッシュの無効（TOKEN_CACHE_SIZE=0）と有効を比較する。
+"""
+
+import argparse
+
+from ..utils.token import generate_access_token, token_required
+from .common import create_bench_app, measure, print_summary
+
+
+@token_required
+def protected(user_id):
+    return user_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    with app.app_context():
+        token = generate_access_token(1)
+    headers = {'Authorization': 'Bearer ' + token}
+
+    for cache_size in (0, 10000):
+        app.config['TOKEN_CACHE_SIZE'] = cache_size
+        with app.test_request_context('/', headers=headers):
+            assert protected() == 1
+            samples = measure(protected, args.repeat)
+        print_summary(f'token_required (cache={cache_size})', samples)
+
+
+if __name__ == '__main__':
+    main()
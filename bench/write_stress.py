@@ -0,0 +1,204 @@
+"""
+書き込みの同時実行ストレステスト。
+同じワークブックと課題に対して merge_assignment と add_completed_page_ranges を
+複数のスレッドまたはプロセスから同時に送り、スループットとエラー率を計測します。
+終了後に次の不変条件を検査し、違反があれば終了コード 1 で終了します。
+
+- 同じ (number, workbook_id) のページが複数存在しない
+- 成功したマージの範囲と補足情報が課題に残っている（更新の消失がない）
+- 成功した完了登録のページがすべて完了済みになっている
+
+    python -m allocaide_backend.bench.write_stress --mode threads --workers 8 --operations 50
+    python -m allocaide_backend.bench.write_stress --mode processes --workers 4 --operations 50
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from sqlalchemy import func, select
+
+from .. import create_app
+from ..extensions import db
+from .common import signup, summarize
+
+SECRET_KEY = 'write-stress'
+# 全ワーカーが同時に完了登録する共有ページ（未登録ページの同時 INSERT を発生させる）
+SHARED_PAGES = 5
+SHARED_PAGE_START = 100000
+
+
+def create_stress_app(database_path):
+    return create_app({
+        'SECRET_KEY': SECRET_KEY,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + database_path,
+        'INVALIDATION_BUS_PATH': database_path + '.bus',
+    })
+
+
+def prepare(database_path, targets):
+    """ユーザー、ワークブック、課題を作成し、(Authorization ヘッダー, [(workbook_id, assignment_id), ...]) を返す。"""
+    app = create_stress_app(database_path)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    headers = signup(client)
+
+    from ..models.assignment_model import Assignment
+    pairs = []
+    for i in range(targets):
+        client.post('/create_workbook', json={'title': f'stress {i}'}, headers=headers)
+        workbook_id = i + 1
+        client.post('/add_assignment', json={
+            'workbook_id': workbook_id, 'deadline': '2030-01-01T00:00:00', 'add_type': 'new',
+            'supplementary': 'base', 'assignment_page_ranges': [],
+        }, headers=headers)
+        with app.app_context():
+            assignment_id = db.session.scalar(select(Assignment.id).filter_by(workbook_id=workbook_id))
+        pairs.append((workbook_id, assignment_id))
+    return headers, pairs
+
+
+def merge_range(sequence):
+    # 隣接しないように 3 ページ間隔で 2 ページずつの範囲を割り当てる
+    start = 1 + sequence * 3
+    return start, start + 1
+
+
+def run_worker(app, headers, worker, operations, workers, pairs):
+    """1 ワーカー分の操作を実行し、結果のリストを返す。"""
+    client = app.test_client()
+    results = []
+    for i in range(operations):
+        sequence = i * workers + worker
+        workbook_id, assignment_id = pairs[sequence % len(pairs)]
+        if i % 2 == 0:
+            start, end = merge_range(sequence)
+            kind = 'merge_assignment'
+            tag = f'w{worker}-{i}'
+            request = ('/merge_assignment', {
+                'workbook_id': workbook_id, 'merge_target_assignment_id': assignment_id,
+                'supplementary': tag, 'assignment_page_ranges': [{'start': start, 'end': end}],
+            })
+        else:
+            start = end = 50000 + sequence
+            shared = SHARED_PAGE_START + i % SHARED_PAGES
+            kind = 'add_completed_page_ranges'
+            tag = None
+            request = ('/add_completed_page_ranges', {
+                'workbook_id': workbook_id, 'completed_ranges': [[start, end], [shared, shared]],
+            })
+
+        started_at = time.time()
+        started = time.perf_counter()
+        response = client.post(request[0], json=request[1], headers=headers)
+        elapsed = time.perf_counter() - started
+        body = response.get_json(silent=True) or {}
+        results.append({
+            'kind': kind, 'status': response.status_code, 'started_at': started_at, 'elapsed': elapsed,
+            'error': body.get('error') if isinstance(body, dict) else None,
+            'workbook_id': workbook_id, 'assignment_id': assignment_id,
+            'range': [start, end], 'tag': tag,
+        })
+    return results
+
+
+def run_process_worker(database_path, headers, worker, operations, workers, pairs):
+    return run_worker(create_stress_app(database_path), headers, worker, operations, workers, pairs)
+
+
+def check_invariants(app, results):
+    from ..models.page_model import Page
+    from ..models.assignment_model import Assignment
+    from ..utils.model_util import decode_page_ranges
+
+    violations = []
+    with app.app_context():
+        duplicates = db.session.execute(
+            select(Page.workbook_id, Page.number, func.count())
+            .group_by(Page.workbook_id, Page.number).having(func.count() > 1)
+        ).all()
+        for workbook_id, number, count in duplicates:
+            violations.append(f'duplicate page: workbook {workbook_id} page {number} x{count}')
+
+        assignments = {assignment.id: assignment for assignment in Assignment.query.all()}
+        completed = {(workbook_id, number) for workbook_id, number in db.session.execute(
+            select(Page.workbook_id, Page.number).where(Page.completed == True)
+        )}
+
+        for result in results:
+            if result['status'] != 200:
+                continue
+            start, end = result['range']
+            if result['kind'] == 'merge_assignment':
+                assignment = assignments[result['assignment_id']]
+                ranges = decode_page_ranges(assignment.page_ranges)
+                if not any(range_start <= start and end <= range_end for range_start, range_end in ranges):
+                    violations.append(f'lost range {start}-{end} on assignment {assignment.id}')
+                if result['tag'] not in (assignment.supplementary or '').split('\n'):
+                    violations.append(f'lost supplementary {result["tag"]} on assignment {assignment.id}')
+            elif (result['workbook_id'], start) not in completed:
+                violations.append(f'lost completed page {start} on workbook {result["workbook_id"]}')
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('threads', 'processes'), default='threads')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=50, help='ワーカーあたりのリクエスト数')
+    parser.add_argument('--targets', type=int, default=1, help='書き込み先のワークブック（課題）の数')
+    parser.add_argument('--output', help='結果を保存する JSON ファイル')
+    args = parser.parse_args()
+
+    database_path = os.path.join(tempfile.mkdtemp(prefix='allocaide_stress_'), 'stress.sqlite')
+    headers, pairs = prepare(database_path, args.targets)
+    app = create_stress_app(database_path)
+
+    if args.mode == 'threads':
+        with ThreadPoolExecutor(args.workers) as executor:
+            futures = [executor.submit(run_worker, app, headers, worker, args.operations, args.workers, pairs)
+                       for worker in range(args.workers)]
+    else:
+        with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(run_process_worker, database_path, headers, worker, args.operations, args.workers, pairs)
+                       for worker in range(args.workers)]
+    results = [result for future in futures for result in future.result()]
+    # プロセスの起動時間を含めないよう、最初のリクエストから最後の応答までを計測時間とする
+    elapsed = max(result['started_at'] + result['elapsed'] for result in results) - min(result['started_at'] for result in results)
+
+    report = {'mode': args.mode, 'workers': args.workers, 'operations': args.operations,
+              'targets': args.targets, 'elapsed_seconds': elapsed, 'endpoints': {}}
+    for kind in ('merge_assignment', 'add_completed_page_ranges'):
+        kind_results = [result for result in results if result['kind'] == kind]
+        summary = summarize([result['elapsed'] for result in kind_results])
+        summary['throughput_rps'] = len(kind_results) / elapsed if elapsed else 0.0
+        summary['statuses'] = dict(Counter(str(result['status']) for result in kind_results))
+        summary['errors'] = dict(Counter(result['error'] for result in kind_results if result['status'] != 200))
+        summary['locked'] = sum('locked' in (result['error'] or '') for result in kind_results)
+        report['endpoints'][kind] = summary
+        print(f"{kind:<28} n={summary['count']:<5} p50={summary['p50_ms']:8.3f}ms p95={summary['p95_ms']:8.3f}ms "
+              f"p99={summary['p99_ms']:8.3f}ms {summary['throughput_rps']:8.1f} req/s statuses={summary['statuses']}")
+        for error, count in summary['errors'].items():
+            print(f'    {count:>5} x {error}')
+
+    violations = check_invariants(app, results)
+    report['violations'] = violations
+    print(f'{len(violations)} invariant violations')
+    for violation in violations[:20]:
+        print('    ' + violation)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
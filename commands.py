@@ -0,0 +1,131 @@
+# commands.py
+
+import click
+from sqlalchemy import inspect
+
+from .extensions import db
+from .utils.util import remove_range_duplicates
+from .utils.model_util import encode_page_ranges
+
+
+def register_commands(app):
+    # Register CLI commands here
+    app.cli.add_command(backfill_page_ranges_command)
+    app.cli.add_command(seed_data_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(archive_rows_command)
+    app.cli.add_command(restore_rows_command)
+    # アーカイブテーブルを db.create_all の対象に含める
+    from .models import archive_model  # noqa: F401
+
+
+@click.command('backfill-page-ranges')
+@click.option('--batch-size', default=500, show_default=True, help='1バッチで処理する課題の数')
+def backfill_page_ranges_command(batch_size):
+    """assignment_page_range_link の範囲を Assignment.page_ranges にバックフィルする。"""
+    if 'page_ranges' not in [column['name'] for column in inspect(db.engine).get_columns('assignment')]:
+        raise click.ClickException('The page_ranges column does not exist. Run "flask db upgrade" first.')
+    total = backfill_page_ranges(batch_size)
+    click.echo(f'Backfilled page ranges for {total} assignments.')
+
+
+@click.command('seed-data')
+@click.option('--users', default=10, show_default=True)
+@click.option('--workbooks', 'workbooks_per_user', default=5, show_default=True, help='ユーザーあたりのワークブック数')
+@click.option('--pages', 'pages_per_workbook', default=100, show_default=True, help='ワークブックあたりのページ数')
+@click.option('--completed-ratio', default=0.4, show_default=True, help='完了済みにするページの割合')
+@click.option('--assignments', 'assignments_per_workbook', default=3, show_default=True, help='ワークブックあたりの課題数')
+@click.option('--ranges', 'ranges_per_assignment', default=4, show_default=True, help='課題あたりのページ範囲数')
+@click.option('--tasks', 'tasks_per_user', default=20, show_default=True, help='ユーザーあたりのタスク数')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--base-date', default=None, help='締め切りの基準日（YYYY-MM-DD、省略時は今日）')
+def seed_data_command(**options):
+    """ベンチマーク用の合成データを作成する。"""
+    from .bench.seed import SeedConfig, seed_database
+
+    counts = seed_database(SeedConfig(**options))
+    click.echo('Seeded ' + ', '.join(f'{count} {name}' for name, count in counts.items()) + '.')
+
+
+@click.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """全文検索のインデックスとトリガーを作り直し、既存の行を登録し直す。"""
+    from .models.search_model import create_search_index
+
+    with db.engine.begin() as connection:
+        created = create_search_index(connection, rebuild=True)
+    click.echo('Rebuilt the search index.' if created else 'Full-text search requires SQLite.')
+
+
+@click.command('archive-rows')
+@click.option('--batch-size', default=500, show_default=True, help='1バッチで移す行の数')
+@click.option('--expired-days', default=365, show_default=True, help='締め切りからこの日数を過ぎた課題もアーカイブする')
+@click.option('--max-batches', default=None, type=int, help='種類ごとに処理するバッチ数の上限（省略時は無制限）')
+def archive_rows_command(batch_size, expired_days, max_batches):
+    """論理削除された行と締め切りを大きく過ぎた課題を archived_* テーブルへ移す。"""
+    from .models.archive_model import archive_rows
+
+    counts = archive_rows(batch_size, expired_days, max_batches)
+    click.echo('Archived ' + ', '.join(f'{count} {kind}' for kind, count in counts.items()) + '.')
+
+
+@click.command('restore-rows')
+@click.option('--type', 'kind', type=click.Choice(['task', 'assignment', 'page', 'page_range']), required=True)
+@click.option('--id', 'ids', type=int, multiple=True, required=True, help='戻す行の ID（複数指定可）')
+def restore_rows_command(kind, ids):
+    """アーカイブした行を元のテーブルに戻す。"""
+    from .models.archive_model import restore_rows
+
+    restored, conflicts = restore_rows(kind, list(ids))
+    click.echo(f'Restored {len(restored)} {kind} rows.')
+    if conflicts:
+        click.echo(f'Not restored (a row with the same key already exists): {", ".join(map(str, conflicts))}.')
+    missing = sorted(set(ids) - set(restored) - set(conflicts))
+    if missing:
+        click.echo(f'Not found in the archive: {", ".join(map(str, missing))}.')
+
+
+def backfill_page_ranges(batch_size=500):
+    """
+    中間テーブルのページ範囲を課題ごとにまとめ、page_ranges カラムに書き込む。
+    課題IDのキーセットで分割し、バッチごとにコミットする。
+    既にインラインの範囲を持つ課題は上書きしない。
+    """
+    from .models.assignment_model import Assignment, PageRange, assignment_page_range_link
+
+    last_id = 0
+    total = 0
+    while True:
+        assignment_ids = [row.id for row in db.session.query(Assignment.id)
+                          .filter(Assignment.id > last_id)
+                          .order_by(Assignment.id)
+                          .limit(batch_size)]
+        if not assignment_ids:
+            break
+        last_id = assignment_ids[-1]
+
+        # バッチ内の課題の範囲を 1 クエリで取得する
+        rows = db.session.query(
+            assignment_page_range_link.c.assignment_id, PageRange.start, PageRange.end
+        ).join(
+            PageRange, PageRange.id == assignment_page_range_link.c.page_range_id
+        ).filter(
+            assignment_page_range_link.c.assignment_id.in_(assignment_ids),
+            PageRange.is_deleted.isnot(True),
+        ).all()
+
+        ranges_by_assignment = {}
+        for assignment_id, start, end in rows:
+            ranges_by_assignment.setdefault(assignment_id, []).append([start, end])
+
+        for assignment_id, ranges in ranges_by_assignment.items():
+            db.session.query(Assignment).filter(
+                Assignment.id == assignment_id,
+                Assignment.page_ranges.in_(['', '[]']),
+            ).update({'page_ranges': encode_page_ranges(remove_range_duplicates(ranges))},
+                     synchronize_session=False)
+
+        db.session.commit()
+        total += len(ranges_by_assignment)
+
+    return total
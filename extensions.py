@@ -3,9 +3,23 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
+from .utils.response_cache import ResponseCache
+from .utils.invalidation_bus import InvalidationBus
+from .utils.async_db import AsyncDatabase
+from .utils.metrics import Metrics
+from .utils.tracing import Tracer
+from .utils.slow_query_log import SlowQueryLog
+from .utils.reminders import ReminderScheduler
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 migrate = Migrate()
+async_db = AsyncDatabase()
+invalidation_bus = InvalidationBus()
+response_cache = ResponseCache()
+metrics = Metrics()
+tracer = Tracer()
+slow_query_log = SlowQueryLog()
+reminders = ReminderScheduler()
 
 login_manager.login_view = 'auth.login'  # ログインページのエンドポイントを指定
\ No newline at end of file
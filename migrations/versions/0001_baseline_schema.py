@@ -0,0 +1,103 @@
+"""baseline schema
+
+ユーザー・ワークブック・ページ・タスク・課題の最初のスキーマ。
+マイグレーションを使う前に db.create_all などで作成したデータベースでは、既存のテーブルを作成せずに進みます。
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('user'):
+        op.create_table('user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=80), nullable=False),
+            sa.Column('password', sa.String(length=120), nullable=False),
+            sa.Column('is_deleted', sa.Boolean(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('username'),
+        )
+    if not inspector.has_table('workbook'):
+        op.create_table('workbook',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=100), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('is_deleted', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if not inspector.has_table('page'):
+        op.create_table('page',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('workbook_id', sa.Integer(), nullable=False),
+            sa.Column('number', sa.Integer(), nullable=False),
+            sa.Column('completed', sa.Boolean(), nullable=True),
+            sa.Column('is_deleted', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['workbook_id'], ['workbook.id'], ondelete='CASCADE', onupdate='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('number', 'workbook_id', name='_number_workbook_uc'),
+        )
+    if not inspector.has_table('page_range'):
+        op.create_table('page_range',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('start', sa.Integer(), nullable=False),
+            sa.Column('end', sa.Integer(), nullable=False),
+            sa.Column('is_deleted', sa.Boolean(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if not inspector.has_table('task'):
+        op.create_table('task',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=255), nullable=False),
+            sa.Column('supplementary', sa.Text(), nullable=True),
+            sa.Column('deadline', sa.DateTime(), nullable=True),
+            sa.Column('completed', sa.Boolean(), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('is_deleted', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if not inspector.has_table('assignment'):
+        op.create_table('assignment',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('workbook_id', sa.Integer(), nullable=False),
+            sa.Column('deadline', sa.DateTime(), nullable=True),
+            sa.Column('supplementary', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('is_deleted', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['workbook_id'], ['workbook.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if not inspector.has_table('assignment_page_range_link'):
+        op.create_table('assignment_page_range_link',
+            sa.Column('assignment_id', sa.Integer(), nullable=False),
+            sa.Column('page_range_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['assignment_id'], ['assignment.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['page_range_id'], ['page_range.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('assignment_id', 'page_range_id'),
+        )
+
+
+def downgrade():
+    op.drop_table('assignment_page_range_link')
+    op.drop_table('assignment')
+    op.drop_table('task')
+    op.drop_table('page_range')
+    op.drop_table('page')
+    op.drop_table('workbook')
+    op.drop_table('user')
@@ -0,0 +1,30 @@
+"""assignment page ranges
+
+課題のページ範囲を assignment.page_ranges に JSON 配列として持つ。
+既存の範囲は flask backfill-page-ranges で中間テーブルから書き込みます。
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'page_ranges' not in {column['name'] for column in inspector.get_columns('assignment')}:
+        op.add_column('assignment', sa.Column('page_ranges', sa.Text(), nullable=False, server_default='[]'))
+
+
+def downgrade():
+    with op.batch_alter_table('assignment') as batch_op:
+        batch_op.drop_column('page_ranges')
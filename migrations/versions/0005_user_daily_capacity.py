@@ -0,0 +1,29 @@
+"""user daily capacity
+
+学習計画で 1 日に割り当てるページ数。
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'daily_capacity' not in {column['name'] for column in inspector.get_columns('user')}:
+        op.add_column('user', sa.Column('daily_capacity', sa.Integer(), nullable=False, server_default='20'))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('daily_capacity')
@@ -0,0 +1,74 @@
+"""study plan
+
+保存した学習計画と、割り当て直しが必要な課題の通知。
+通知のテーブルが user_id だけのインデックスで作成済みの場合は、重複した通知を 1 行に減らして一意インデックスに置き換えます。
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('study_plan'):
+        op.create_table('study_plan',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('start_date', sa.Date(), nullable=False),
+            sa.Column('daily_capacity', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('user_id'),
+        )
+    if not inspector.has_table('study_plan_allocation'):
+        op.create_table('study_plan_allocation',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('assignment_id', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('pages', sa.Integer(), nullable=False),
+            sa.Column('page_ranges', sa.Text(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['assignment_id'], ['assignment.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_study_plan_allocation_user_day', 'study_plan_allocation', ['user_id', 'day'])
+
+    if not inspector.has_table('study_plan_dirty'):
+        op.create_table('study_plan_dirty',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('assignment_id', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        indexes = set()
+    else:
+        indexes = {index['name'] for index in inspector.get_indexes('study_plan_dirty')}
+    if 'ux_study_plan_dirty_user_assignment' not in indexes:
+        op.execute(
+            'DELETE FROM study_plan_dirty WHERE id NOT IN '
+            '(SELECT min(id) FROM study_plan_dirty GROUP BY user_id, assignment_id)'
+        )
+        op.create_index('ux_study_plan_dirty_user_assignment', 'study_plan_dirty', ['user_id', 'assignment_id'], unique=True)
+    if 'ix_study_plan_dirty_user_id' in indexes:
+        op.drop_index('ix_study_plan_dirty_user_id', table_name='study_plan_dirty')
+
+
+def downgrade():
+    op.drop_index('ux_study_plan_dirty_user_assignment', table_name='study_plan_dirty')
+    op.drop_table('study_plan_dirty')
+    op.drop_index('ix_study_plan_allocation_user_day', table_name='study_plan_allocation')
+    op.drop_table('study_plan_allocation')
+    op.drop_table('study_plan')
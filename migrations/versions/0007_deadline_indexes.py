@@ -0,0 +1,40 @@
+"""deadline indexes
+
+カレンダーの締め切り順の範囲検索用のインデックス。0010 で削除済みの行を含まない部分インデックスに置き換えます。
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# (インデックス名, テーブル, カラム, 置き換え後のインデックス名)
+INDEXES = [
+    ('ix_task_user_deadline', 'task', ['user_id', 'deadline'], 'ix_task_active_user_deadline'),
+    ('ix_assignment_workbook_deadline', 'assignment', ['workbook_id', 'deadline'], 'ix_assignment_active_workbook_deadline'),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns, replacement in INDEXES:
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        # 部分インデックスに置き換え済みのデータベースには作成しない
+        if name not in existing and replacement not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, _, _ in INDEXES:
+        if name in {index['name'] for index in inspector.get_indexes(table)}:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,41 @@
+"""reminder event
+
+REMINDER_SINK = 'events' のときに書き込むリマインダー通知。
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('reminder_event'):
+        op.create_table('reminder_event',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('kind', sa.String(length=20), nullable=False),
+            sa.Column('item_type', sa.String(length=20), nullable=False),
+            sa.Column('item_id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=255), nullable=True),
+            sa.Column('deadline', sa.DateTime(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_reminder_event_user_id', 'reminder_event', ['user_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_reminder_event_user_id', table_name='reminder_event')
+    op.drop_table('reminder_event')
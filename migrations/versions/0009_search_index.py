@@ -0,0 +1,42 @@
+"""search index
+
+タスク・ワークブック・課題の全文検索インデックス（SQLite の FTS5）と同期用のトリガー。
+作成はアプリの create_search_index に任せ、作成済みの場合は何もしません。SQLite 以外では作成しません。
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 00:00:00
+
+"""
+import importlib
+
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def search_model():
+    # マイグレーションはパッケージの外から読み込まれるため、アプリのパッケージ名から取得する
+    return importlib.import_module(current_app.import_name + '.models.search_model')
+
+
+def upgrade():
+    search_model().create_search_index(op.get_bind())
+
+
+def downgrade():
+    model = search_model()
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, *_ in model.INDEXED_TABLES:
+        for trigger in model.trigger_names(table):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute(f'DROP TABLE IF EXISTS {model.OWNER_TABLE}')
+    op.execute(f'DROP TABLE IF EXISTS {model.SEARCH_TABLE}')
@@ -0,0 +1,97 @@
+"""archive tables
+
+論理削除・締め切り切れの行を移す archived_* テーブルと、復元した行の記録。
+アーカイブで小さくなったテーブルの読み込み用インデックスは、削除済みの行を含まない部分インデックスに置き換えます。
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+# アーカイブテーブルのカラムは元のテーブルと同じで、制約と既定値は引き継がない
+ARCHIVED_COLUMNS = {
+    'archived_task': [
+        ('id', sa.Integer()), ('title', sa.String(length=255)), ('supplementary', sa.Text()),
+        ('deadline', sa.DateTime()), ('completed', sa.Boolean()), ('user_id', sa.Integer()),
+        ('is_deleted', sa.Boolean()), ('version', sa.Integer()),
+    ],
+    'archived_assignment': [
+        ('id', sa.Integer()), ('workbook_id', sa.Integer()), ('deadline', sa.DateTime()),
+        ('supplementary', sa.Text()), ('page_ranges', sa.Text()), ('created_at', sa.DateTime()),
+        ('updated_at', sa.DateTime()), ('is_deleted', sa.Boolean()), ('version', sa.Integer()),
+    ],
+    'archived_page': [
+        ('id', sa.Integer()), ('workbook_id', sa.Integer()), ('number', sa.Integer()),
+        ('completed', sa.Boolean()), ('is_deleted', sa.Boolean()),
+    ],
+    'archived_page_range': [
+        ('id', sa.Integer()), ('start', sa.Integer()), ('end', sa.Integer()), ('is_deleted', sa.Boolean()),
+    ],
+}
+
+# (インデックス名, テーブル, カラム, SQLite の条件, PostgreSQL の条件)
+PARTIAL_INDEXES = [
+    ('ix_task_active_user_deadline', 'task', ['user_id', 'deadline'], 'is_deleted = 0', 'is_deleted = false'),
+    ('ix_assignment_active_workbook_deadline', 'assignment', ['workbook_id', 'deadline'], 'is_deleted = 0', 'is_deleted = false'),
+    ('ix_page_completed_workbook_number', 'page', ['workbook_id', 'number'], 'completed = 1', 'completed = true'),
+    ('ix_workbook_active_user', 'workbook', ['user_id'], 'is_deleted = 0', 'is_deleted = false'),
+]
+
+# 部分インデックスに置き換えたインデックス: (テーブル, インデックス名, カラム)
+REPLACED_INDEXES = [
+    ('task', 'ix_task_user_deadline', ['user_id', 'deadline']),
+    ('assignment', 'ix_assignment_workbook_deadline', ['workbook_id', 'deadline']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    for table, columns in ARCHIVED_COLUMNS.items():
+        if not inspector.has_table(table):
+            op.create_table(table,
+                *[sa.Column(name, type_, primary_key=name == 'id', autoincrement=False) for name, type_ in columns],
+                sa.Column('archived_at', sa.DateTime(), nullable=False),
+            )
+    if not inspector.has_table('archived_assignment_page_range_link'):
+        op.create_table('archived_assignment_page_range_link',
+            sa.Column('assignment_id', sa.Integer(), nullable=False, autoincrement=False),
+            sa.Column('page_range_id', sa.Integer(), nullable=False, autoincrement=False),
+            sa.Column('archived_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('assignment_id', 'page_range_id'),
+        )
+    if not inspector.has_table('archive_exemption'):
+        op.create_table('archive_exemption',
+            sa.Column('kind', sa.String(length=20), nullable=False),
+            sa.Column('row_id', sa.Integer(), nullable=False),
+            sa.Column('restored_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('kind', 'row_id'),
+        )
+
+    for name, table, columns, sqlite_where, postgresql_where in PARTIAL_INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, sqlite_where=sa.text(sqlite_where), postgresql_where=sa.text(postgresql_where))
+    for table, name, _ in REPLACED_INDEXES:
+        if name in {index['name'] for index in inspector.get_indexes(table)}:
+            op.drop_index(name, table_name=table)
+
+
+def downgrade():
+    for table, name, columns in REPLACED_INDEXES:
+        op.create_index(name, table, columns)
+    for name, table, *_ in PARTIAL_INDEXES:
+        op.drop_index(name, table_name=table)
+    op.drop_table('archive_exemption')
+    op.drop_table('archived_assignment_page_range_link')
+    for table in ARCHIVED_COLUMNS:
+        op.drop_table(table)
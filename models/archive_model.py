@@ -0,0 +1,234 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import UniqueConstraint, and_, delete, func, insert, literal, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db, response_cache, reminders
+from ..utils.util import get_now_tokyo_time
+from ..models.task_model import Task
+from ..models.workbook_model import Workbook
+from ..models.assignment_model import Assignment, PageRange, assignment_page_range_link
+from ..models.page_model import Page
+from ..models.study_plan_model import mark_plan_stale
+
+DEFAULT_BATCH_SIZE = 500
+# 締め切りからこの日数を過ぎた課題は、削除されていなくてもアーカイブする
+DEFAULT_EXPIRED_DAYS = 365
+
+
+def make_archive_table(source):
+    """source と同じカラムに archived_at を加えたアーカイブテーブルを定義する。制約と既定値は引き継ぎません。"""
+    columns = [db.Column(column.name, column.type, primary_key=column.primary_key, autoincrement=False) for column in source.columns]
+    return db.Table(f'archived_{source.name}', db.metadata, *columns, db.Column('archived_at', db.DateTime, nullable=False))
+
+
+archived_task = make_archive_table(Task.__table__)
+archived_assignment = make_archive_table(Assignment.__table__)
+archived_page = make_archive_table(Page.__table__)
+archived_page_range = make_archive_table(PageRange.__table__)
+archived_assignment_page_range_link = make_archive_table(assignment_page_range_link)
+
+class ArchiveExemption(db.Model):
+    """restore_rows で戻した行。削除済みや締め切り切れのままでも、以降の archive_rows ではアーカイブしません。"""
+    kind = db.Column(db.String(20), primary_key=True)
+    row_id = db.Column(db.Integer, primary_key=True)
+    restored_at = db.Column(db.DateTime, nullable=False)
+
+
+# 種類ごとの (元のテーブル, アーカイブテーブル)
+ARCHIVES = {
+    'task': (Task.__table__, archived_task),
+    'assignment': (Assignment.__table__, archived_assignment),
+    'page': (Page.__table__, archived_page),
+    'page_range': (PageRange.__table__, archived_page_range),
+}
+
+
+def move_rows(source, target, condition, archived_at=None):
+    """condition に一致する行を source から target へ移す。archived_at を渡すとアーカイブ日時として付け加えます。"""
+    columns = [column.name for column in source.columns]
+    values = [source.c[name] for name in columns]
+    if archived_at is not None:
+        columns.append('archived_at')
+        values.append(literal(archived_at, db.DateTime))
+    db.session.execute(insert(target).from_select(columns, select(*values).where(condition)))
+    db.session.execute(delete(source).where(condition))
+
+
+def archive_condition(kind, expired_before):
+    source = ARCHIVES[kind][0]
+    condition = source.c.is_deleted == True
+    if kind == 'assignment':
+        condition = or_(condition, source.c.deadline < expired_before)
+    restored = select(ArchiveExemption.row_id).where(ArchiveExemption.kind == kind)
+    return and_(condition, source.c.id.notin_(restored))
+
+
+def mark_assignments_changed(assignment_ids):
+    """アーカイブ・復元した課題を、所有者の学習計画と課題一覧のキャッシュに反映させる。"""
+    owners = db.session.execute(
+        select(Workbook.user_id, Assignment.id)
+        .join(Workbook, Workbook.id == Assignment.workbook_id)
+        .where(Assignment.id.in_(assignment_ids))
+    ).all()
+    ids_by_user = {}
+    for user_id, assignment_id in owners:
+        ids_by_user.setdefault(user_id, []).append(assignment_id)
+    for user_id, ids in ids_by_user.items():
+        mark_plan_stale(user_id, ids)
+    return set(ids_by_user)
+
+
+def archive_batch(kind, expired_before, after_id, batch_size):
+    """
+    kind の次のバッチをアーカイブし、(移した行の ID のリスト, 影響を受けたユーザー) を返す。
+    各テーブルの ID が最大の行は残します。SQLite は AUTOINCREMENT の無いテーブルで最大の ID + 1 を採番するため、
+    最新の行を残しておけばアーカイブした ID が再利用されず、復元時に衝突しません。
+    """
+    source, archive = ARCHIVES[kind]
+    max_id = db.session.scalar(select(func.max(source.c.id)))
+    if max_id is None:
+        return [], set()
+    ids = db.session.scalars(
+        select(source.c.id)
+        .where(archive_condition(kind, expired_before), source.c.id > after_id, source.c.id < max_id)
+        .order_by(source.c.id)
+        .limit(batch_size)
+    ).all()
+    if not ids:
+        return [], set()
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    users = set()
+    if kind == 'assignment':
+        # 課題一覧から消えるため、アーカイブ前に所有者を控えて計画を再計算させる
+        users = mark_assignments_changed(ids)
+        move_rows(assignment_page_range_link, archived_assignment_page_range_link, assignment_page_range_link.c.assignment_id.in_(ids), now)
+    elif kind == 'page_range':
+        move_rows(assignment_page_range_link, archived_assignment_page_range_link, assignment_page_range_link.c.page_range_id.in_(ids), now)
+    move_rows(source, archive, source.c.id.in_(ids), now)
+    return ids, users
+
+
+def archive_rows(batch_size=DEFAULT_BATCH_SIZE, expired_days=DEFAULT_EXPIRED_DAYS, max_batches=None):
+    """
+    論理削除された行と、締め切りから expired_days 日を過ぎた課題をアーカイブテーブルへ移す。
+    batch_size 件ずつ ID のキーセットで進め、バッチごとにコミットします。
+    max_batches を渡すと、1 回の実行で処理するバッチ数を種類ごとに制限します。
+    種類ごとの移した件数を返す。
+    """
+    # 課題の締め切りは東京時間で保存されている
+    expired_before = (get_now_tokyo_time() - timedelta(days=expired_days)).replace(tzinfo=None)
+    counts = {}
+    for kind in ARCHIVES:
+        counts[kind] = 0
+        after_id = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            ids, users = archive_batch(kind, expired_before, after_id, batch_size)
+            if not ids:
+                break
+            db.session.commit()
+            for user_id in users:
+                response_cache.invalidate(user_id, 'get_all_assignment')
+                reminders.user_changed(user_id)
+            counts[kind] += len(ids)
+            after_id = ids[-1]
+            batches += 1
+    return counts
+
+
+def unique_keys(source):
+    """source の主キーと一意制約のカラム名のタプルのリスト。"""
+    keys = [tuple(column.name for column in source.primary_key.columns)]
+    keys += [tuple(column.name for column in constraint.columns) for constraint in source.constraints if isinstance(constraint, UniqueConstraint)]
+    return keys
+
+
+def find_restore_conflicts(source, archive, ids):
+    """
+    アーカイブの ids のうち、元のテーブルの行か、先に戻す他のアーカイブの行と主キー・一意制約が重なる ID を返す。
+    アーカイブ内で重なる場合は ID の大きい（新しい）行を戻します。
+    """
+    keys = unique_keys(source)
+    names = sorted({name for key in keys for name in key})
+    rows = db.session.execute(
+        select(*[archive.c[name] for name in names]).where(archive.c.id.in_(ids)).order_by(archive.c.id.desc())
+    ).mappings().all()
+
+    conflicts = set()
+    for key in keys:
+        existing = set(db.session.execute(
+            select(*[source.c[name] for name in key])
+            .join(archive, and_(*[source.c[name] == archive.c[name] for name in key]))
+            .where(archive.c.id.in_(ids))
+        ).all())
+        for row in rows:
+            value = tuple(row[name] for name in key)
+            if value in existing:
+                conflicts.add(row['id'])
+            else:
+                existing.add(value)
+    return conflicts
+
+
+def restore_rows(kind, ids):
+    """
+    アーカイブした kind の行を元のテーブルに戻し、(戻した ID のリスト, 戻せなかった ID のリスト) を返す。
+    元のテーブルに主キーや一意制約（ページの番号とワークブックなど）が重なる行がある場合は、その行を戻さずにアーカイブに残します。
+    戻した行は ArchiveExemption に記録し、次回以降の archive_rows で再びアーカイブされないようにします。
+    """
+    if kind not in ARCHIVES:
+        raise ValueError(f'Unknown kind: {kind}')
+    source, archive = ARCHIVES[kind]
+    columns = [column.name for column in source.columns]
+    ids = db.session.scalars(select(archive.c.id).where(archive.c.id.in_(ids)).order_by(archive.c.id)).all()
+    conflicts = find_restore_conflicts(source, archive, ids) if ids else set()
+    ids = [row_id for row_id in ids if row_id not in conflicts]
+    if not ids:
+        return [], sorted(conflicts)
+
+    try:
+        users = restore_batch(kind, source, archive, columns, ids)
+        db.session.commit()
+    except IntegrityError as e:
+        # 確認後に他の書き込みが同じキーの行を追加した
+        db.session.rollback()
+        print(f'models.archive_model.restore_rows Error: {e}')
+        return [], sorted(conflicts.union(ids))
+
+    for user_id in users:
+        response_cache.invalidate(user_id, 'get_all_assignment')
+        reminders.user_changed(user_id)
+    return ids, sorted(conflicts)
+
+
+def restore_batch(kind, source, archive, columns, ids):
+    """ids の行を元のテーブルへ戻し、影響を受けたユーザーを返す。コミットは呼び出し元で行います。"""
+    db.session.execute(insert(source).from_select(columns, select(*[archive.c[name] for name in columns]).where(archive.c.id.in_(ids))))
+    db.session.execute(delete(archive).where(archive.c.id.in_(ids)))
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    db.session.execute(
+        insert(ArchiveExemption).prefix_with('OR IGNORE', dialect='sqlite'),
+        [{'kind': kind, 'row_id': row_id, 'restored_at': now} for row_id in ids],
+    )
+
+    # 中間テーブルの行は、両端が元のテーブルにそろったものだけを戻す
+    if kind in ('assignment', 'page_range'):
+        link = archived_assignment_page_range_link
+        link_key = link.c.assignment_id if kind == 'assignment' else link.c.page_range_id
+        condition = and_(
+            link_key.in_(ids),
+            link.c.assignment_id.in_(select(Assignment.id)),
+            link.c.page_range_id.in_(select(PageRange.id)),
+        )
+        db.session.execute(insert(assignment_page_range_link).from_select(
+            ['assignment_id', 'page_range_id'], select(link.c.assignment_id, link.c.page_range_id).where(condition)
+        ))
+        db.session.execute(delete(link).where(condition))
+
+    if kind == 'assignment':
+        return mark_assignments_changed(ids)
+    if kind == 'task':
+        return set(db.session.scalars(select(Task.user_id).where(Task.id.in_(ids))))
+    return set()
@@ -1,11 +1,13 @@
 import json
 from datetime import datetime
 
+from sqlalchemy import select, text
 from sqlalchemy.sql import func
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.orm.exc import NoResultFound, StaleDataError
 
-from ..extensions import db
+from ..extensions import db, response_cache, reminders
+from ..utils.tracing import traced, span
 from ..utils.util import (
     remove_range_duplicates, 
     convert_to_isoformat, 
@@ -15,22 +17,28 @@ from ..utils.util import (
 )
 from ..utils.model_util import (
     validate_range_format,
-    ranges_data_to_ranges_list,
-    dict_to_range_list
+    dict_to_range_list,
+    encode_page_ranges,
+    decode_page_ranges,
+    get_optimistic_retry_limit,
+    parse_expected_version,
+    version_conflict_response,
 )
 from ..models.workbook_model import (
+    Workbook,
     validate_id, 
-    get_workbook_matching_user_id, 
-    get_workbook_for_user,
-    get_assignments,
 )
 from ..models.page_model import (
     get_completed_page_percentage,
-    get_incomplete_page_ranges
+    get_incomplete_page_ranges,
+    load_completed_pages
 )
+from ..models.study_plan_model import mark_plan_stale
 
 
 # 課題-ページ範囲間の中間テーブルのモデル
+# 範囲は Assignment.page_ranges にインラインで保持するため、
+# このテーブルは旧データのバックフィル用にのみ残している
 assignment_page_range_link = db.Table('assignment_page_range_link',
     db.Column('assignment_id', db.Integer, db.ForeignKey('assignment.id', ondelete='CASCADE'), primary_key=True),
     db.Column('page_range_id', db.Integer, db.ForeignKey('page_range.id', ondelete='CASCADE'), primary_key=True)
@@ -48,12 +56,26 @@ class Assignment(db.Model):
     workbook_id = db.Column(db.Integer, db.ForeignKey('workbook.id', ondelete='CASCADE'), nullable=False)
     deadline = db.Column(db.DateTime)
     supplementary = db.Column(db.Text)
-    assignment_page_ranges = db.relationship('PageRange', secondary=assignment_page_range_link, lazy='subquery', cascade='all, delete', backref=db.backref('assignments', lazy=True))
+    # [[start, end], ...] を JSON 配列としてエンコードしたページ範囲
+    page_ranges = db.Column(db.Text, nullable=False, default='[]', server_default='[]')
+    assignment_page_ranges = db.relationship('PageRange', secondary=assignment_page_range_link, lazy=True, cascade='all, delete', backref=db.backref('assignments', lazy=True))
     created_at = db.Column(db.DateTime, default=func.now())
     updated_at = db.Column(db.DateTime)
     is_deleted = db.Column(db.Boolean, default=False)
+    # 楽観的ロック用。UPDATE 時に WHERE version = ? で競合を検出する
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
+    __mapper_args__ = {'version_id_col': version}
+    __table_args__ = (
+        # 締め切り順の範囲検索用。削除済みの行は含めない
+        db.Index(
+            'ix_assignment_active_workbook_deadline', 'workbook_id', 'deadline',
+            sqlite_where=text('is_deleted = 0'), postgresql_where=text('is_deleted = false'),
+        ),
+    )
 
+
+@traced
 def add_assignment_with_confirmation(user_id, data):
     try:
         # ワークブックIDを取得
@@ -101,6 +123,7 @@ def add_assignment_with_confirmation(user_id, data):
         return {'error': str(e)}, 500
 
 
+@traced
 def add_assignment(user_id, workbook_id, deadline, data):
     try:
         error_response, status_code = validate_id(user_id, workbook_id)
@@ -110,11 +133,20 @@ def add_assignment(user_id, workbook_id, deadline, data):
         supplementary = data.get('supplementary')
 
         new_assignment = Assignment(workbook_id=workbook_id, deadline=deadline, supplementary=supplementary)
-        db.session.add(new_assignment)
-        db.session.commit()
 
+        # ページ範囲が不正な場合は課題も追加しない
         range_data = data.get('assignment_page_ranges', [])
-        update_page_range_with_old_range(user_id, workbook_id, new_assignment, range_data)
+        error_response, status_code = update_page_range_with_old_range(user_id, workbook_id, new_assignment, range_data)
+        if status_code != 200:
+            return error_response, status_code
+
+        # 課題の追加と学習計画への通知を同じトランザクションでコミットする
+        db.session.add(new_assignment)
+        db.session.flush()
+        mark_plan_stale(user_id, [new_assignment.id])
+        db.session.commit()
+        response_cache.invalidate(user_id, 'get_all_assignment')
+        reminders.user_changed(user_id)
 
         return {'message': 'Assignment added successfully.'}, 200
     except SQLAlchemyError as e:
@@ -122,6 +154,7 @@ def add_assignment(user_id, workbook_id, deadline, data):
         return {'error': str(e)}, 500
 
     
+@traced
 def merge_assignment_data(user_id, data):
     try:
         workbook_id = data.get('workbook_id')
@@ -137,26 +170,52 @@ def merge_assignment_data(user_id, data):
         if error_response:
             return error_response, status_code
 
-        existing_assignment = get_existing_assignment(merge_target_assignment_id)
-
-        if not existing_assignment:
-            return {'error': 'Merge target assignment not found.'}, 404
+        try:
+            expected_version = parse_expected_version(data.get('version'))
+        except ValueError as e:
+            return {'error': str(e)}, 400
 
         new_supplementary = data.get('supplementary', '')
         new_assignment_page_ranges = data.get('assignment_page_ranges', [])
 
-        merged_supplementary = merge_supplementary(existing_assignment.supplementary, new_supplementary)
-        merged_ranges = merge_assignment_page_ranges(existing_assignment.assignment_page_ranges, new_assignment_page_ranges)
+        # ロックは取らずに読み込み・マージ・保存を行い、保存時に version が変わっていれば
+        # 最新の値を読み直してマージをやり直す
+        for _ in range(get_optimistic_retry_limit() + 1):
+            existing_assignment = get_existing_assignment(workbook_id, merge_target_assignment_id)
 
-        existing_assignment.supplementary = merged_supplementary
+            if not existing_assignment:
+                return {'error': 'Merge target assignment not found.'}, 404
 
-        # 更新日時をアップデート
-        now_time = get_now_tokyo_time()
-        existing_assignment.updated_at = now_time
+            # クライアントが見ていた版から変わっている場合は、マージせずに現在の状態を返す
+            if expected_version is not None and existing_assignment.version != expected_version:
+                return version_conflict_response('Assignment', assignment_to_dict(existing_assignment))
 
-        db.session.commit()
+            merged_supplementary = merge_supplementary(existing_assignment.supplementary, new_supplementary)
+            merged_ranges = merge_assignment_page_ranges(existing_assignment.page_ranges, new_assignment_page_ranges)
 
-        update_page_range_by_array(existing_assignment, merged_ranges, True)
+            existing_assignment.supplementary = merged_supplementary
+            existing_assignment.page_ranges = encode_page_ranges(merged_ranges)
+
+            # 更新日時をアップデート
+            now_time = get_now_tokyo_time()
+            existing_assignment.updated_at = now_time
+
+            try:
+                # 通知の INSERT で課題の UPDATE もフラッシュされるため、競合の検出はここで行う
+                mark_plan_stale(user_id, [existing_assignment.id])
+                db.session.commit()
+                break
+            except StaleDataError:
+                # 他のリクエストが先に更新した。ロールバックで読み込み済みの値は破棄される
+                db.session.rollback()
+        else:
+            current_assignment = get_existing_assignment(workbook_id, merge_target_assignment_id)
+            if not current_assignment:
+                return {'error': 'Merge target assignment not found.'}, 404
+            return version_conflict_response('Assignment', assignment_to_dict(current_assignment))
+
+        response_cache.invalidate(user_id, 'get_all_assignment')
+        reminders.user_changed(user_id)
 
         return {'message': 'Assignment merged successfully.'}, 200
 
@@ -165,13 +224,34 @@ def merge_assignment_data(user_id, data):
         return {'error': str(e)}, 500
 
 
-def get_existing_assignment(merge_target_assignment_id):
+def get_existing_assignment(workbook_id, merge_target_assignment_id):
+    # 所有を確認済みのワークブックの課題だけを対象にし、他のユーザーの課題は存在しないものとして扱う
     try:
-        existing_assignment = Assignment.query.filter_by(id=merge_target_assignment_id, is_deleted=False).one()
+        existing_assignment = Assignment.query.filter_by(
+            id=merge_target_assignment_id, workbook_id=workbook_id, is_deleted=False,
+        ).one()
         return existing_assignment
     except NoResultFound:
         return None
 
+
+def assignment_to_dict(assignment):
+    """競合時のレスポンス用に、課題の保存されている状態を辞書にする。"""
+    if assignment is None:
+        return None
+    return {
+        'id': assignment.id,
+        'type': 'assignment',
+        'workbook_id': assignment.workbook_id,
+        'deadline': convert_to_isoformat(assignment.deadline),
+        'supplementary': assignment.supplementary,
+        'assignment_page_ranges': get_active_page_ranges(assignment),
+        'is_deleted': assignment.is_deleted,
+        'updated_at': convert_to_isoformat(assignment.updated_at),
+        'version': assignment.version,
+    }
+
+
 def merge_supplementary(existing_supplementary_text, new_supplementary_text):
     """
     既存の補足情報と新しい補足情報をマージする関数。
@@ -185,8 +265,8 @@ def merge_supplementary(existing_supplementary_text, new_supplementary_text):
     else:
         return existing_supplementary_text + new_supplementary_text
 
-def merge_assignment_page_ranges(existing_ranges_data, new_ranges):
-    existing_ranges_array = ranges_data_to_ranges_list(existing_ranges_data)
+def merge_assignment_page_ranges(existing_encoded_ranges, new_ranges):
+    existing_ranges_array = decode_page_ranges(existing_encoded_ranges)
     new_ranges_array = dict_to_range_list(new_ranges)
     return remove_range_duplicates(existing_ranges_array + new_ranges_array)
 
@@ -198,151 +278,103 @@ def get_assignment_id_duplicate(workbook_id, deadline):
     return existing_assignment_ids
 
 
+@traced
+@response_cache.cached('get_all_assignment')
 def get_all_assignment(user_id):
-    # ユーザーが所有するすべてのワークブックを取得
+    # ユーザーが所有するワークブックの課題を、ワークブック名と合わせて行タプルで一括取得する
+    rows = db.session.execute(
+        select(
+            Assignment.id, Assignment.workbook_id, Assignment.deadline, Assignment.supplementary,
+            Assignment.page_ranges, Assignment.created_at, Assignment.updated_at, Assignment.version,
+            Workbook.title.label('workbook_title'),
+        )
+        .join(Workbook, Workbook.id == Assignment.workbook_id)
+        .where(Workbook.user_id == user_id, Workbook.is_deleted == False, Assignment.is_deleted == False)
+        .order_by(Workbook.id, Assignment.id)
+    ).all()
+
+    # 全ワークブックの完了済みページを 1 クエリで取得する
+    completed_pages = load_completed_pages({assignment.workbook_id for assignment in rows})
 
-    workbooks_id = get_workbook_matching_user_id(user_id)
     assignments = []
-    for workbook_id in workbooks_id:
-        # ワークブックに関連するすべての課題を取得
-        workbook = get_workbook_for_user(user_id, workbook_id)
-        workbook_title = workbook.title
-        workbook_assignments = get_assignments(user_id, workbook_id)
-
-        for assignment in workbook_assignments:
-            if assignment.is_deleted == True:
-                continue
-
-            # 課題ごとに完了したページの割合を計算し、データに追加
-            active_page_ranges_data = get_active_page_ranges(assignment)
-            assignment_page_ranges = ranges_data_to_ranges_list(active_page_ranges_data)
-            incomplete_page_ranges = get_incomplete_page_ranges(assignment)
-            completion_percentage = get_completed_page_percentage(assignment)
-            completed_fraction = get_completed_fraction(incomplete_page_ranges, assignment_page_ranges)
-
-            assignment_data = {
-                'id': assignment.id,
-                'type': 'assignment',
-                'workbook_id': assignment.workbook_id,
-                'workbook_title': workbook_title,
-                'deadline': convert_to_isoformat(assignment.deadline),
-                'supplementary': assignment.supplementary,
-                'assignment_page_ranges': assignment_page_ranges,
-                'incomplete_page_ranges': incomplete_page_ranges,
-                'completion_percentage': completion_percentage,
-                'completed_fraction': completed_fraction,
-                'created_at': convert_to_isoformat(assignment.created_at),
-                'updated_at': convert_to_isoformat(assignment.updated_at),
-            }
-            assignments.append(assignment_data)
-
-    return json.dumps(assignments), 200
-
-
-def update_page_range_by_array(assignment, page_ranges_array, delete_existing_ranges=False):
-    try:
-        # page_ranges_array の形式を確認
-        if not isinstance(page_ranges_array, list):
-            return {'error': 'Page ranges must be provided as a list.'}, 400
-
-        new_page_ranges = []
-        for page_range in page_ranges_array:
-            # 各ページ範囲の形式を確認
-            if not isinstance(page_range, list) or len(page_range) != 2:
-                return {'error': 'Each page range must be provided as a list containing start and end values.'}, 400
-            
-            new_page_range = PageRange(start=page_range[0], end=page_range[1])
-            new_page_ranges.append(new_page_range)
-
-        db.session.add_all(new_page_ranges)
-        db.session.commit()
-
-        if delete_existing_ranges:
-            # 既存のページ範囲を削除
-            assignment.assignment_page_ranges.clear()
-        
-        assignment.assignment_page_ranges.extend(new_page_ranges)
-        db.session.commit()
-
-        return {'message': 'Page ranges added successfully.'}, 200
-    except SQLAlchemyError as e:
-        db.session.rollback()
-        return {'error': str(e)}, 500
+    for assignment in rows:
+        # 課題ごとに完了したページの割合を計算し、データに追加
+        assignment_page_ranges = get_active_page_ranges(assignment)
+        incomplete_page_ranges = get_incomplete_page_ranges(assignment, assignment_page_ranges, completed_pages)
+        completion_percentage = get_completed_page_percentage(assignment, assignment_page_ranges, completed_pages)
+        completed_fraction = get_completed_fraction(incomplete_page_ranges, assignment_page_ranges)
+
+        assignment_data = {
+            'id': assignment.id,
+            'type': 'assignment',
+            'workbook_id': assignment.workbook_id,
+            'workbook_title': assignment.workbook_title,
+            'deadline': convert_to_isoformat(assignment.deadline),
+            'supplementary': assignment.supplementary,
+            'assignment_page_ranges': assignment_page_ranges,
+            'incomplete_page_ranges': incomplete_page_ranges,
+            'completion_percentage': completion_percentage,
+            'completed_fraction': completed_fraction,
+            'created_at': convert_to_isoformat(assignment.created_at),
+            'updated_at': convert_to_isoformat(assignment.updated_at),
+            'version': assignment.version,
+        }
+        assignments.append(assignment_data)
+
+    with span('serialize'):
+        return json.dumps(assignments), 200
 
 
 def get_active_page_ranges(assignment):
     """
-    論理削除されていないページ範囲のデータを取得する関数
+    課題のページ範囲を [[start, end], ...] のリストとして取得する関数
 
     Args:
         assignment: Assignment オブジェクトまたはそれに類似するオブジェクト
 
     Returns:
-        list: 論理削除されていない PageRange オブジェクトのリスト
+        list: デコードされたページ範囲のリスト
     """
-    active_page_ranges = []
+    return decode_page_ranges(getattr(assignment, 'page_ranges', None))
 
-    # assignment オブジェクトの存在と属性の確認
-    if hasattr(assignment, 'assignment_page_ranges'):
-        # is_deleted が False の要素だけを取得
-        active_page_ranges = [r for r in assignment.assignment_page_ranges if hasattr(r, 'is_deleted') and not r.is_deleted]
 
-    return active_page_ranges
+@traced
+def update_page_range_with_old_range(user_id, workbook_id, target_assignment, range_data):
+    """
+    ターゲットの課題のページ範囲に range_data を追加する。
+    コミットはしないため、呼び出し元が他の変更と合わせてコミットします。
+    """
+    # レンジデータの形式を検証
+    error_response, status_code = validate_range_format(range_data)
+    if error_response:
+        return error_response, status_code
 
+    # ユーザーIDとワークブックIDを検証
+    error_response, status_code = validate_id(user_id, workbook_id)
+    if error_response:
+        return error_response, status_code
 
-def update_page_range_with_old_range(user_id, workbook_id, target_assignment, range_data):
-    try:
-        # レンジデータの形式を検証
-        error_response, status_code = validate_range_format(range_data)
-        if error_response:
-            return error_response, status_code
-        
-        # ユーザーIDとワークブックIDを検証
-        error_response, status_code = validate_id(user_id, workbook_id)
-        if error_response:
-            return error_response, status_code
-        
-        # ターゲットの課題が存在することを確認
-        if not target_assignment:
-            error_message = 'Target assignment not found'
-            return {'error': error_message}, 404
-        
-        # 既存の範囲データを取得
-        existing_ranges = target_assignment.assignment_page_ranges
-        existing_range_array = ranges_data_to_ranges_list(existing_ranges)
+    # ターゲットの課題が存在することを確認
+    if not target_assignment:
+        error_message = 'Target assignment not found'
+        return {'error': error_message}, 404
 
-        page_range_array = dict_to_range_list(range_data)
-        
-        # 範囲の重複を取り除く
-        combined_ranges = remove_range_duplicates(page_range_array + existing_range_array)
-
-        # 新しい範囲をデータベースに追加
-        page_ranges = []
-        for start, end in combined_ranges:
-            new_range = PageRange(start=start, end=end)
-            db.session.add(new_range)
-            page_ranges.append(new_range)
-
-        # ターゲットの課題に範囲を追加
-        target_assignment.assignment_page_ranges.extend(page_ranges)
-        db.session.commit()
+    # 既存の範囲データを取得
+    existing_range_array = decode_page_ranges(target_assignment.page_ranges)
 
-        return {'message': 'Page ranges updated successfully'}, 200
+    page_range_array = dict_to_range_list(range_data)
 
-    except SQLAlchemyError as e:
-        # データベーストランザクションのロールバック
-        db.session.rollback()
-        error_message = 'Database error occurred'
-        return {'error': error_message}, 500
+    # 範囲の重複を取り除く
+    combined_ranges = remove_range_duplicates(page_range_array + existing_range_array)
 
-    except Exception as e:
-        # その他のエラーの場合もトランザクションをロールバック
-        db.session.rollback()
-        error_message = 'An unexpected error occurred'
-        return {'error': error_message}, 500
+    # ターゲットの課題の範囲を更新
+    target_assignment.page_ranges = encode_page_ranges(combined_ranges)
+
+    return {'message': 'Page ranges updated successfully'}, 200
     
 
-def db_delete_assignment(user_id, assignment_id):
+@traced
+def db_delete_assignment(user_id, assignment_id, version=None):
     assignment_to_delete = Assignment.query.filter_by(id=assignment_id, is_deleted=False).first()
 
     if not assignment_to_delete:
@@ -355,14 +387,23 @@ def db_delete_assignment(user_id, assignment_id):
         return error_response, status_code
 
     try:
-        assignment_to_delete.is_deleted = True
-
-        ranges = assignment_to_delete.assignment_page_ranges
-        for r in ranges:
-            r.is_deleted = True
+        expected_version = parse_expected_version(version)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    if expected_version is not None and assignment_to_delete.version != expected_version:
+        return version_conflict_response('Assignment', assignment_to_dict(assignment_to_delete))
 
+    try:
+        # ページ範囲は課題の行にインラインで保持されているため、課題の論理削除のみでよい
+        assignment_to_delete.is_deleted = True
+        mark_plan_stale(user_id, [assignment_id])
         db.session.commit()
+        response_cache.invalidate(user_id, 'get_all_assignment')
+        reminders.user_changed(user_id)
         return {'message': 'assignment deleted successfully.'}, 200
+    except StaleDataError:
+        db.session.rollback()
+        return version_conflict_response('Assignment', assignment_to_dict(Assignment.query.get(assignment_id)))
     except Exception as e:
         db.session.rollback()
         return {'error': f"Failed to delete assignment: {str(e)}"}, 500
@@ -0,0 +1,253 @@
+import heapq
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+
+import pytz
+from sqlalchemy import and_, func, literal, null, or_, select, union_all
+
+from ..extensions import db
+from ..utils.tracing import traced
+from ..utils.util import convert_to_isoformat, get_completed_fraction
+from ..utils.model_util import decode_page_ranges
+from ..models.task_model import Task, task_to_dict
+from ..models.workbook_model import Workbook
+from ..models.assignment_model import Assignment
+from ..models.page_model import Page, get_completed_page_percentage, get_incomplete_page_ranges, load_completed_pages
+
+DEFAULT_TIME_ZONE = 'Asia/Tokyo'
+# 課題の締め切りはタイムゾーンを変換せずに保存されており、東京時間として扱う
+ASSIGNMENT_TIME_ZONE = pytz.timezone('Asia/Tokyo')
+DEFAULT_CALENDAR_DAYS = 31
+MAX_CALENDAR_DAYS = 366
+DEFAULT_UPCOMING_LIMIT = 10
+MAX_UPCOMING_LIMIT = 100
+
+
+def parse_calendar_range(from_str, to_str, tz_name):
+    """
+    クエリパラメータを (開始日, 終了日, タイムゾーン) に変換する。
+    開始日の既定値はタイムゾーンでの今日、終了日の既定値は開始日から DEFAULT_CALENDAR_DAYS 日分です。
+    """
+    try:
+        tz = pytz.timezone(tz_name or DEFAULT_TIME_ZONE)
+    except pytz.UnknownTimeZoneError:
+        return None, {'error': 'Unknown time zone.'}, 400
+
+    try:
+        start = date.fromisoformat(from_str) if from_str else datetime.now(tz).date()
+        end = date.fromisoformat(to_str) if to_str else start + timedelta(days=DEFAULT_CALENDAR_DAYS - 1)
+    except ValueError:
+        return None, {'error': 'Invalid date format. Please provide dates as YYYY-MM-DD.'}, 400
+
+    if end < start:
+        return None, {'error': '"to" must not be earlier than "from".'}, 400
+    if (end - start).days + 1 > MAX_CALENDAR_DAYS:
+        return None, {'error': f'The range must not exceed {MAX_CALENDAR_DAYS} days.'}, 400
+
+    return (start, end, tz), None, None
+
+
+def day_boundaries(start, days, tz, stored_tz):
+    """
+    tz での各日の 0 時を、締め切りの保存形式（stored_tz のタイムゾーンなし日時）に変換したリスト。
+    days + 1 個の境界を返し、i 日目は boundaries[i] 以上 boundaries[i + 1] 未満です。
+    """
+    return [
+        tz.localize(datetime.combine(start + timedelta(days=day), time.min)).astimezone(stored_tz).replace(tzinfo=None)
+        for day in range(days + 1)
+    ]
+
+
+def remaining_page_count(page_ranges, completed_pages):
+    return sum(end - start + 1 - completed_pages.count_active_in_range(start, end) for start, end in page_ranges)
+
+
+@traced
+def get_calendar(user_id, from_str=None, to_str=None, tz_name=None):
+    """
+    タスクと課題の締め切りを日ごとにまとめたカレンダーを返す。
+    タイムゾーンの変換は日の境界を求めるときに 1 回だけ行い、各締め切りは境界の二分探索で日に振り分けます。
+    締め切りのない日は含めません。
+    """
+    calendar_range, error_response, status_code = parse_calendar_range(from_str, to_str, tz_name)
+    if error_response:
+        return error_response, status_code
+    start, end, tz = calendar_range
+    days = (end - start).days + 1
+
+    # タスクの締め切りは UTC、課題の締め切りは東京時間で保存されている
+    boundaries = {
+        'task': day_boundaries(start, days, tz, pytz.utc),
+        'assignment': day_boundaries(start, days, tz, ASSIGNMENT_TIME_ZONE),
+    }
+
+    tasks = (
+        select(
+            literal('task').label('type'), Task.id, Task.title, Task.deadline, Task.completed,
+            null().label('workbook_id'), null().label('page_ranges'),
+        )
+        .where(
+            Task.user_id == user_id, Task.is_deleted == False,
+            Task.deadline >= boundaries['task'][0], Task.deadline < boundaries['task'][-1],
+        )
+    )
+    assignments = (
+        select(
+            literal('assignment').label('type'), Assignment.id, Workbook.title, Assignment.deadline, null().label('completed'),
+            Assignment.workbook_id, Assignment.page_ranges,
+        )
+        .join(Workbook, Workbook.id == Assignment.workbook_id)
+        .where(
+            Workbook.user_id == user_id, Workbook.is_deleted == False, Assignment.is_deleted == False,
+            Assignment.deadline >= boundaries['assignment'][0], Assignment.deadline < boundaries['assignment'][-1],
+        )
+    )
+    union = union_all(tasks, assignments).subquery()
+    rows = db.session.execute(select(union).order_by(union.c.deadline, union.c.type, union.c.id)).all()
+
+    completed_pages = load_completed_pages({row.workbook_id for row in rows if row.type == 'assignment'})
+
+    buckets = {}
+    for row in rows:
+        day_boundaries_for_type = boundaries[row.type]
+        day = bisect_right(day_boundaries_for_type, row.deadline) - 1
+        bucket = buckets.setdefault(day, {'task_count': 0, 'assignment_count': 0, 'remaining_pages': 0, 'items': []})
+        # 同じ日の中では、その日の 0 時からの経過時間で並べる
+        offset = row.deadline - day_boundaries_for_type[day]
+        if row.type == 'task':
+            bucket['task_count'] += 1
+            item = {'type': 'task', 'id': row.id, 'title': row.title, 'deadline': convert_to_isoformat(row.deadline), 'completed': row.completed}
+        else:
+            remaining_pages = remaining_page_count(decode_page_ranges(row.page_ranges), completed_pages[row.workbook_id])
+            bucket['assignment_count'] += 1
+            bucket['remaining_pages'] += remaining_pages
+            item = {
+                'type': 'assignment', 'id': row.id, 'workbook_id': row.workbook_id, 'workbook_title': row.title,
+                'deadline': convert_to_isoformat(row.deadline), 'remaining_pages': remaining_pages,
+            }
+        bucket['items'].append((offset, item))
+
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'tz': tz.zone,
+        'days': [
+            {
+                'date': (start + timedelta(days=day)).isoformat(),
+                'task_count': bucket['task_count'],
+                'assignment_count': bucket['assignment_count'],
+                'remaining_pages': bucket['remaining_pages'],
+                'items': [item for _, item in sorted(bucket['items'], key=lambda entry: entry[0])],
+            }
+            for day, bucket in sorted(buckets.items())
+        ],
+    }, 200
+
+
+def upcoming_tasks(user_id, now, limit):
+    """締め切りが now 以降の未完了タスクを、締め切り順に (締め切り, 辞書) で最大 limit 件返す。"""
+    rows = db.session.execute(
+        select(Task.id, Task.title, Task.supplementary, Task.deadline, Task.completed, Task.version)
+        .where(
+            Task.user_id == user_id, Task.is_deleted == False, Task.completed.isnot(True),
+            Task.deadline >= now.astimezone(pytz.utc).replace(tzinfo=None),
+        )
+        .order_by(Task.deadline, Task.id)
+        .limit(limit)
+    ).all()
+    for row in rows:
+        yield pytz.utc.localize(row.deadline), task_to_dict(row)
+
+
+def has_incomplete_pages():
+    """
+    課題の範囲のページ数が、範囲内の完了済みページ数より多いことを表す SQLite の条件式。
+    範囲が重なる課題では未完了と判定されることがあるため、最終的な判定は Python 側で行います。
+    """
+    page_range = func.json_each(Assignment.page_ranges).table_valued('value').alias('page_range')
+    start = func.json_extract(page_range.c.value, '$[0]')
+    end = func.json_extract(page_range.c.value, '$[1]')
+    total_pages = select(func.coalesce(func.sum(end - start + 1), 0)).select_from(page_range).scalar_subquery()
+    completed_pages = (
+        select(func.count(Page.number.distinct()))
+        .select_from(page_range)
+        .join(Page, and_(
+            Page.workbook_id == Assignment.workbook_id, Page.completed == True, Page.is_deleted == False,
+            Page.number.between(start, end),
+        ))
+        .scalar_subquery()
+    )
+    return total_pages > completed_pages
+
+
+def upcoming_assignments(user_id, now, limit):
+    """
+    締め切りが now 以降で未完了のページが残る課題を、締め切り順に (締め切り, 辞書) で返す。
+    SQLite では完了済みの課題を SQL で除くため、通常は limit 件の 1 回の読み込みで済みます。
+    それでも足りない場合に限り、締め切りと ID のキーセットで残りをまとめて 1 回で読みます。
+    完了済みページはワークブックごとに 1 回だけ読みます。
+    """
+    query = (
+        select(
+            Assignment.id, Assignment.workbook_id, Assignment.deadline, Assignment.supplementary,
+            Assignment.page_ranges, Assignment.version, Workbook.title.label('workbook_title'),
+        )
+        .join(Workbook, Workbook.id == Assignment.workbook_id)
+        .where(
+            Workbook.user_id == user_id, Workbook.is_deleted == False, Assignment.is_deleted == False,
+            Assignment.deadline >= now.astimezone(ASSIGNMENT_TIME_ZONE).replace(tzinfo=None),
+        )
+        .order_by(Assignment.deadline, Assignment.id)
+    )
+    if db.engine.dialect.name == 'sqlite':
+        query = query.where(has_incomplete_pages())
+
+    completed_pages = {}
+    rows = db.session.execute(query.limit(limit)).all()
+    while rows:
+        completed_pages.update(load_completed_pages({row.workbook_id for row in rows} - completed_pages.keys()))
+        for row in rows:
+            page_ranges = decode_page_ranges(row.page_ranges)
+            incomplete_page_ranges = get_incomplete_page_ranges(row, page_ranges, completed_pages)
+            if not incomplete_page_ranges:
+                continue
+            yield ASSIGNMENT_TIME_ZONE.localize(row.deadline), {
+                'id': row.id,
+                'type': 'assignment',
+                'workbook_id': row.workbook_id,
+                'workbook_title': row.workbook_title,
+                'deadline': convert_to_isoformat(row.deadline),
+                'supplementary': row.supplementary,
+                'assignment_page_ranges': page_ranges,
+                'incomplete_page_ranges': incomplete_page_ranges,
+                'completion_percentage': get_completed_page_percentage(row, page_ranges, completed_pages),
+                'completed_fraction': get_completed_fraction(incomplete_page_ranges, page_ranges),
+                'version': row.version,
+            }
+
+        if len(rows) < limit:
+            return
+        # 完了済みと判定し直した課題があり、件数が足りない。残りは LIMIT を付けずに 1 回で読む
+        last = rows[-1]
+        rows = db.session.execute(query.where(or_(
+            Assignment.deadline > last.deadline,
+            and_(Assignment.deadline == last.deadline, Assignment.id > last.id),
+        ))).all()
+        limit = len(rows) + 1  # この読み込みで最後にする
+
+
+@traced
+def get_upcoming(user_id, limit=None):
+    """
+    締め切りが近い順に、未完了のタスクと課題を合わせて limit 件返す。
+    タスクと課題はそれぞれ締め切り順に LIMIT 付きで読み、ヒープでマージします。
+    """
+    if limit is None:
+        limit = DEFAULT_UPCOMING_LIMIT
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= MAX_UPCOMING_LIMIT:
+        return {'error': f'Limit must be an integer between 1 and {MAX_UPCOMING_LIMIT}.'}, 400
+
+    now = datetime.now(pytz.utc)
+    merged = heapq.merge(upcoming_tasks(user_id, now, limit), upcoming_assignments(user_id, now, limit), key=lambda entry: entry[0])
+    return [item for _, item in islice(merged, limit)], 200
@@ -1,8 +1,13 @@
 from ..utils.util import range_to_list, ranges_to_number_list, remove_range_duplicates
 from ..utils.util import numbers_to_ranges
-from ..models.workbook_model import validate_id, register_pages
-from ..extensions import db
-from sqlalchemy.exc import SQLAlchemyError
+from ..utils.model_util import decode_page_ranges, get_optimistic_retry_limit
+from ..models.workbook_model import validate_id
+from ..models.study_plan_model import mark_plan_stale
+from ..extensions import db, response_cache, reminders
+from ..utils.tracing import traced
+from bisect import bisect_left, bisect_right
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 
 class Page(db.Model):
@@ -14,9 +19,55 @@ class Page(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('number', 'workbook_id', name='_number_workbook_uc'),
+        # 完了済みページの読み込み用。未完了のページは含めない
+        db.Index(
+            'ix_page_completed_workbook_number', 'workbook_id', 'number',
+            sqlite_where=text('completed = 1'), postgresql_where=text('completed = true'),
+        ),
     )
 
 
+# SQLite のホストパラメータ数の上限（古い版では 999）を超えないよう、IN 句に渡すページ番号の件数
+PAGE_NUMBER_CHUNK_SIZE = 500
+
+
+def chunked(values, size=PAGE_NUMBER_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def write_completed_pages(workbook_id, numbers):
+    # 既存のページを取得し、更新と追加をまとめて行う。ページ番号は上限を超えないよう分けて渡す
+    existing_numbers = set()
+    for chunk in chunked(numbers):
+        existing_numbers.update(db.session.scalars(
+            select(Page.number).where(
+                Page.workbook_id == workbook_id,
+                Page.number.in_(chunk),
+                Page.is_deleted == False,
+            )
+        ))
+
+    for chunk in chunked(sorted(existing_numbers)):
+        db.session.execute(
+            update(Page)
+            .where(Page.workbook_id == workbook_id, Page.number.in_(chunk), Page.is_deleted == False)
+            .values(completed=True)
+        )
+
+    # ページは workbook_id 付きで作成されるため、ワークブック側への登録は不要
+    new_pages = [
+        {'number': number, 'completed': True, 'workbook_id': workbook_id, 'is_deleted': False}
+        for number in numbers if number not in existing_numbers
+    ]
+    if new_pages:
+        db.session.execute(insert(Page), new_pages)
+
+    db.session.commit()
+
+
+@traced
 def set_completed_state_by_ranges(user_id, workbook_id, ranges_data):
     try:
         error_response, status_code = validate_id(user_id, workbook_id)
@@ -26,19 +77,21 @@ def set_completed_state_by_ranges(user_id, workbook_id, ranges_data):
         combined_ranges = remove_range_duplicates(ranges_data)
         numbers = ranges_to_number_list(combined_ranges)
         
-        new_pages = []
-        for number in numbers:
-            page = Page.query.filter_by(number=number, workbook_id=workbook_id, is_deleted=False).first()
-            if page:
-                page.completed = True
-            else:
-                new_page = Page(number=number, completed=True, workbook_id=workbook_id)
-                new_pages.append(new_page)
-                db.session.add(new_page)
-        
-        db.session.commit()
-
-        register_pages(workbook_id, new_pages)
+        # 同じページを同時に追加しようとした場合は一意制約で失敗するため、読み直してやり直す
+        for _ in range(get_optimistic_retry_limit() + 1):
+            try:
+                # ワークブックの課題の学習計画を、ページの書き込みと同じトランザクションで無効にする
+                mark_plan_stale(user_id, workbook_id=workbook_id)
+                write_completed_pages(workbook_id, numbers)
+                break
+            except IntegrityError:
+                db.session.rollback()
+        else:
+            return {'error': 'Pages were modified by another request.'}, 409
+
+        response_cache.invalidate(user_id, 'get_all_workbooks', 'get_all_assignment')
+        # 課題のページをすべて終えた場合は通知を取り消す
+        reminders.user_changed(user_id)
 
         return {'message': 'Page set completed successfully.'}, 200
     except SQLAlchemyError as e:
@@ -52,59 +105,113 @@ def set_completed_state_by_ranges(user_id, workbook_id, ranges_data):
 
     
 
-def get_completed_page_percentage(assignment):
+class CompletedPages:
+    """
+    ワークブックの完了済みページ番号の昇順リスト。
+    all_numbers は削除済みのページを含み、active_numbers は含みません。
+    """
+    __slots__ = ('all_numbers', 'active_numbers')
+
+    def __init__(self):
+        self.all_numbers = []
+        self.active_numbers = []
+
+    def count_in_range(self, start, end):
+        return bisect_right(self.all_numbers, end) - bisect_left(self.all_numbers, start)
+
+    def count_active_in_range(self, start, end):
+        return bisect_right(self.active_numbers, end) - bisect_left(self.active_numbers, start)
+
+
+def load_completed_pages(workbook_ids, number_range=None):
+    """
+    複数のワークブックの完了済みページを 1 クエリで取得し、{workbook_id: CompletedPages} を返す。
+    number_range に (start, end) を渡すと、その範囲のページ番号だけを取得します。
+    """
+    completed_pages = {workbook_id: CompletedPages() for workbook_id in workbook_ids}
+    if not completed_pages:
+        return completed_pages
+
+    query = (
+        select(Page.workbook_id, Page.number, Page.is_deleted)
+        .where(Page.workbook_id.in_(list(completed_pages)), Page.completed == True)
+        .order_by(Page.workbook_id, Page.number)
+    )
+    if number_range is not None:
+        query = query.where(Page.number >= number_range[0], Page.number <= number_range[1])
+
+    for workbook_id, number, is_deleted in db.session.execute(query):
+        pages = completed_pages[workbook_id]
+        pages.all_numbers.append(number)
+        if not is_deleted:
+            pages.active_numbers.append(number)
+    return completed_pages
+
+
+def _completed_pages_for(assignment, page_ranges, completed_pages):
+    if completed_pages is not None:
+        return completed_pages.get(assignment.workbook_id) or CompletedPages()
+    number_range = (min(start for start, _ in page_ranges), max(end for _, end in page_ranges))
+    return load_completed_pages([assignment.workbook_id], number_range)[assignment.workbook_id]
+
+
+@traced
+def get_completed_page_percentage(assignment, page_ranges=None, completed_pages=None):
     """
     Calculate the percentage of completed pages among the assignment's page ranges.
+    page_ranges にデコード済みの範囲リストを渡すと、再デコードを省略します。
+    completed_pages に load_completed_pages の結果を渡すと、ページの取得を省略します。
     """
+    if page_ranges is None:
+        page_ranges = decode_page_ranges(assignment.page_ranges)
+
     total_pages = 0
-    completed_pages = 0
+    completed_pages_count = 0
+    if page_ranges:
+        pages = _completed_pages_for(assignment, page_ranges, completed_pages)
 
-    for page_range in assignment.assignment_page_ranges:
+    for start, end in page_ranges:
         # ページ範囲内の全ページ数を計算
-        if page_range.is_deleted == True:
-            continue
-
-        total_pages += page_range.end - page_range.start + 1
+        total_pages += end - start + 1
         
         # ページ範囲内の完了したページ数を計算
-        completed_pages += Page.query.filter(
-            Page.number >= page_range.start,
-            Page.number <= page_range.end,
-            Page.workbook_id == assignment.workbook_id,
-            Page.completed == True,  # 完了したページのみをカウント
-        ).count()
+        completed_pages_count += pages.count_in_range(start, end)
 
     if total_pages == 0:
         return 0  # ゼロ割を防ぐためにガード節を追加
     
     # 完了したページの割合を計算して返す
-    return (completed_pages / total_pages) * 100
+    return (completed_pages_count / total_pages) * 100
 
 
-def get_incomplete_page_ranges(assignment):
+@traced
+def get_incomplete_page_ranges(assignment, page_ranges=None, completed_pages=None):
     """
     課題範囲のうち、未完了のページの範囲リストを作成します。
     具体的には未完了ページが連続している、開始番号と終了番号の組み合わせのリストです。
     課題範囲外では連続が途切れます。
+    page_ranges にデコード済みの範囲リストを渡すと、再デコードを省略します。
+    completed_pages に load_completed_pages の結果を渡すと、ページの取得を省略します。
     """
     # もし課題が存在しない場合や課題範囲が空の場合は空リストを返す
-    
-    if not assignment or not assignment.assignment_page_ranges:
+    if not assignment:
         return []
 
-    # 課題に関連するすべてのページ範囲を取得し、開始番号で昇順に並べ替える
-    page_ranges = sorted(assignment.assignment_page_ranges, key=lambda x: x.start)
+    if page_ranges is None:
+        page_ranges = decode_page_ranges(assignment.page_ranges)
 
-    incomplete_numbers = []
+    if not page_ranges:
+        return []
 
-    for page_range in page_ranges:
-        if page_range.is_deleted == True:
-            continue
+    # ページ範囲を開始番号で昇順に並べ替える
+    page_ranges = sorted(page_ranges, key=lambda x: x[0])
+
+    completed_numbers = set(_completed_pages_for(assignment, page_ranges, completed_pages).active_numbers)
+    incomplete_numbers = []
 
-        for page_number in range(page_range.start, page_range.end + 1):
-            page = Page.query.filter_by(number=page_number, workbook_id=assignment.workbook_id, is_deleted=False).first()
-            is_incomplete = page is None or not page.completed
-            if is_incomplete:
+    for start, end in page_ranges:
+        for page_number in range(start, end + 1):
+            if page_number not in completed_numbers:
                 incomplete_numbers.append(page_number)
 
     incomplete_ranges = numbers_to_ranges(incomplete_numbers)
@@ -0,0 +1,294 @@
+from datetime import timedelta
+
+from sqlalchemy import delete, insert, or_, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
+
+from ..extensions import db
+from ..utils.tracing import traced
+from ..utils.util import get_now_tokyo_time, convert_to_isoformat
+from ..utils.model_util import decode_page_ranges, encode_page_ranges
+from ..utils.planner import allocate, allocate_within, count_pages, split_ranges, subtract_ranges
+from ..models.user_model import User, DEFAULT_DAILY_CAPACITY
+from ..models.workbook_model import Workbook
+from ..models.assignment_model import Assignment
+from ..models.page_model import get_incomplete_page_ranges, load_completed_pages
+from ..models.study_plan_model import StudyPlan, StudyPlanAllocation, StudyPlanDirty
+
+# 1 日に割り当てられるページ数の上限
+MAX_DAILY_CAPACITY = 1000
+
+
+def last_study_day(deadline, today):
+    """
+    締め切り前の最終学習日を、今日を 0 とした日数で返す。
+    0 時ちょうどの締め切りは前日までに終える必要があるとみなします。
+    """
+    return ((deadline - timedelta(microseconds=1)).date() - today).days
+
+
+def validate_capacity(capacity):
+    if isinstance(capacity, bool) or not isinstance(capacity, int):
+        return {'error': 'Daily capacity must be an integer.'}, 400
+    if not 1 <= capacity <= MAX_DAILY_CAPACITY:
+        return {'error': f'Daily capacity must be between 1 and {MAX_DAILY_CAPACITY}.'}, 400
+    return None, None
+
+
+def get_daily_capacity(user_id):
+    capacity = db.session.scalar(select(User.daily_capacity).where(User.id == user_id))
+    return capacity or DEFAULT_DAILY_CAPACITY
+
+
+@traced
+def set_daily_capacity(user_id, capacity):
+    error_response, status_code = validate_capacity(capacity)
+    if error_response:
+        return error_response, status_code
+
+    try:
+        user = db.session.get(User, user_id)
+        if not user or user.is_deleted:
+            return {'error': 'User not found.'}, 404
+        user.daily_capacity = capacity
+        db.session.commit()
+        return {'message': 'Daily capacity updated successfully.'}, 200
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return {'error': str(e)}, 500
+
+
+def load_plan_items(user_id, today, assignment_ids=None):
+    """
+    ユーザーの締め切りのある有効な課題から、(課題の行, 未完了の範囲, 最終学習日) のリストを作る。
+    完了済みページは全ワークブック分を 1 クエリで取得します。
+    assignment_ids を渡すと、その課題だけを対象にします。
+    """
+    query = (
+        select(
+            Assignment.id, Assignment.workbook_id, Assignment.deadline, Assignment.page_ranges,
+            Workbook.title.label('workbook_title'),
+        )
+        .join(Workbook, Workbook.id == Assignment.workbook_id)
+        .where(
+            Workbook.user_id == user_id, Workbook.is_deleted == False,
+            Assignment.is_deleted == False, Assignment.deadline.isnot(None),
+        )
+        .order_by(Assignment.deadline, Assignment.id)
+    )
+    if assignment_ids is not None:
+        query = query.where(Assignment.id.in_(assignment_ids))
+    rows = db.session.execute(query).all()
+
+    completed_pages = load_completed_pages({row.workbook_id for row in rows})
+    items = []
+    for row in rows:
+        incomplete_page_ranges = get_incomplete_page_ranges(row, decode_page_ranges(row.page_ranges), completed_pages)
+        if incomplete_page_ranges:
+            items.append((row, incomplete_page_ranges, last_study_day(row.deadline, today)))
+    return items
+
+
+def plan_item_to_dict(row, pages, page_ranges, today):
+    return {
+        'assignment_id': row.id,
+        'workbook_id': row.workbook_id,
+        'workbook_title': row.workbook_title,
+        'deadline': convert_to_isoformat(row.deadline),
+        'overdue': last_study_day(row.deadline, today) < 0,
+        'pages': pages,
+        'page_ranges': page_ranges,
+    }
+
+
+def plan_to_dict(today, capacity, days, totals):
+    """days は日ごとの [(課題の行, ページ数, page_ranges), ...]、totals は日ごとの合計ページ数。"""
+    return {
+        'start_date': today.isoformat(),
+        'daily_capacity': capacity,
+        # 容量を超える日が残る場合は、締め切りまでに終わらない量がある
+        'feasible': all(total <= capacity for total in totals),
+        'days': [
+            {
+                'date': (today + timedelta(days=day)).isoformat(),
+                'total_pages': total,
+                'over_capacity': total > capacity,
+                'assignments': [plan_item_to_dict(row, pages, page_ranges, today) for row, pages, page_ranges in allocations],
+            }
+            for day, (allocations, total) in enumerate(zip(days, totals))
+        ],
+    }
+
+
+def compute_daily_plan(user_id, today, capacity):
+    """保存した計画を使わずに、全課題から計画を計算する。"""
+    days, totals = allocate(load_plan_items(user_id, today), capacity)
+    return plan_to_dict(today, capacity, days, totals)
+
+
+def allocation_rows(user_id, today, assignment_id, day_offset, counts, chunks):
+    return [
+        {
+            'user_id': user_id, 'assignment_id': assignment_id, 'day': today + timedelta(days=day_offset + day),
+            'pages': count, 'page_ranges': encode_page_ranges(chunk),
+        }
+        for day, (count, chunk) in enumerate(zip(counts, chunks)) if count
+    ]
+
+
+def rebuild_study_plan(user_id, today, capacity):
+    """全課題を割り当て直し、保存した計画を置き換える。"""
+    days, _ = allocate(load_plan_items(user_id, today), capacity)
+    rows = [
+        {
+            'user_id': user_id, 'assignment_id': row.id, 'day': today + timedelta(days=day),
+            'pages': pages, 'page_ranges': encode_page_ranges(page_ranges),
+        }
+        for day, allocations in enumerate(days) for row, pages, page_ranges in allocations
+    ]
+    db.session.execute(delete(StudyPlanAllocation).where(StudyPlanAllocation.user_id == user_id))
+    if rows:
+        db.session.execute(insert(StudyPlanAllocation), rows)
+
+
+def update_study_plan(user_id, today, capacity, assignment_ids):
+    """
+    変更のあった課題だけを、他の課題が使っていない容量に割り当て直す。
+    今日の割り当ては変えずに残し、明日以降の分だけを作り直します。
+    空き容量が足りない場合や容量を超える日が残る場合は False を返し、呼び出し元で全体を作り直します。
+    """
+    stored = db.session.execute(
+        select(StudyPlanAllocation.assignment_id, StudyPlanAllocation.day, StudyPlanAllocation.pages, StudyPlanAllocation.page_ranges)
+        .where(StudyPlanAllocation.user_id == user_id, StudyPlanAllocation.day >= today)
+    ).all()
+
+    # 変更のない課題の日ごとの使用量と、変更のあった課題の今日の割り当て
+    loads = {}
+    today_ranges = {}
+    for assignment_id, day, pages, page_ranges in stored:
+        if assignment_id not in assignment_ids:
+            offset = (day - today).days
+            loads[offset] = loads.get(offset, 0) + pages
+        elif day == today:
+            today_ranges[assignment_id] = decode_page_ranges(page_ranges)
+
+    rows = []
+    kept = []
+    for row, incomplete_page_ranges, last_day in load_plan_items(user_id, today, assignment_ids):
+        if row.id in today_ranges:
+            kept.append(row.id)
+            loads[0] = loads.get(0, 0) + count_pages(today_ranges[row.id])
+            first_day = 1
+        else:
+            first_day = 0
+
+        remaining_ranges = subtract_ranges(incomplete_page_ranges, today_ranges.get(row.id, []))
+        if not remaining_ranges:
+            continue
+
+        days = range(first_day, max(last_day, first_day) + 1)
+        counts = allocate_within(count_pages(remaining_ranges), [max(capacity - loads.get(day, 0), 0) for day in days])
+        if counts is None:
+            return False
+        for day, count in zip(days, counts):
+            loads[day] = loads.get(day, 0) + count
+        rows.extend(allocation_rows(user_id, today, row.id, first_day, counts, split_ranges(remaining_ranges, counts)))
+
+    # 以前から容量を超えている日が残る計画は、全体を作り直して解消できるか確かめる
+    if any(load > capacity for load in loads.values()):
+        return False
+
+    # 削除・完了した課題は今日の分も含めて外し、残る課題は明日以降の分を置き換える
+    db.session.execute(
+        delete(StudyPlanAllocation).where(
+            StudyPlanAllocation.user_id == user_id,
+            StudyPlanAllocation.assignment_id.in_(assignment_ids),
+            or_(StudyPlanAllocation.day > today, StudyPlanAllocation.assignment_id.notin_(kept)),
+        )
+    )
+    if rows:
+        db.session.execute(insert(StudyPlanAllocation), rows)
+    return True
+
+
+def load_study_plan(user_id, today, capacity):
+    """保存した計画を読み出し、日ごとにまとめる。"""
+    rows = db.session.execute(
+        select(
+            StudyPlanAllocation.day, StudyPlanAllocation.pages, StudyPlanAllocation.page_ranges,
+            Assignment.id, Assignment.workbook_id, Assignment.deadline, Workbook.title.label('workbook_title'),
+        )
+        .join(Assignment, Assignment.id == StudyPlanAllocation.assignment_id)
+        .join(Workbook, Workbook.id == Assignment.workbook_id)
+        .where(StudyPlanAllocation.user_id == user_id, StudyPlanAllocation.day >= today)
+        .order_by(StudyPlanAllocation.day, Assignment.deadline, Assignment.id)
+    ).all()
+
+    # allocate と同じく、最も遅い最終学習日までの日を並べる
+    horizon = max((max(last_study_day(row.deadline, today), (row.day - today).days) + 1 for row in rows), default=0)
+    days = [[] for _ in range(horizon)]
+    totals = [0] * horizon
+    for row in rows:
+        day = (row.day - today).days
+        days[day].append((row, row.pages, decode_page_ranges(row.page_ranges)))
+        totals[day] += row.pages
+    return plan_to_dict(today, capacity, days, totals)
+
+
+def refresh_study_plan(user_id, today, capacity):
+    """
+    保存した計画を最新にする。日付か容量が変わった場合は全体を作り直し、
+    それ以外は書き込みで通知された課題だけを割り当て直します。
+    """
+    plan = db.session.get(StudyPlan, user_id)
+    dirty = db.session.execute(
+        select(StudyPlanDirty.id, StudyPlanDirty.assignment_id).where(StudyPlanDirty.user_id == user_id)
+    ).all()
+
+    if plan is not None and plan.start_date == today and plan.daily_capacity == capacity:
+        if not dirty:
+            return
+        if not update_study_plan(user_id, today, capacity, {row.assignment_id for row in dirty}):
+            rebuild_study_plan(user_id, today, capacity)
+    else:
+        rebuild_study_plan(user_id, today, capacity)
+
+    if dirty:
+        # 読み込み後に追加された通知は次回に処理する
+        db.session.execute(
+            delete(StudyPlanDirty).where(StudyPlanDirty.user_id == user_id, StudyPlanDirty.id <= max(row.id for row in dirty))
+        )
+    if plan is None:
+        plan = StudyPlan(user_id=user_id)
+        db.session.add(plan)
+    plan.start_date = today
+    plan.daily_capacity = capacity
+    plan.updated_at = get_now_tokyo_time()
+    db.session.commit()
+
+
+@traced
+def get_daily_plan(user_id, capacity=None):
+    """
+    未完了のページを締め切りまでの各日に割り当てた、日ごとの学習計画を返す。
+    capacity を省略した場合はユーザーの 1 日の容量を使い、保存した計画から返します。
+    それ以外の容量を指定した場合は、保存した計画を変えずにその場で計算します。
+    """
+    stored_capacity = get_daily_capacity(user_id)
+    if capacity is not None:
+        error_response, status_code = validate_capacity(capacity)
+        if error_response:
+            return error_response, status_code
+
+    today = get_now_tokyo_time().date()
+    if capacity is not None and capacity != stored_capacity:
+        return compute_daily_plan(user_id, today, capacity), 200
+
+    try:
+        refresh_study_plan(user_id, today, stored_capacity)
+    except (IntegrityError, StaleDataError):
+        # 同時に別のリクエストが計画を更新した。保存はそちらに任せ、この応答はその場で計算する
+        db.session.rollback()
+        return compute_daily_plan(user_id, today, stored_capacity), 200
+
+    return load_study_plan(user_id, today, stored_capacity), 200
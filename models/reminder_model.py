@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from ..extensions import db
+from ..utils.tracing import traced
+from ..utils.util import convert_to_isoformat
+from ..models.task_model import Task
+from ..models.workbook_model import Workbook
+from ..models.assignment_model import Assignment
+from ..models.page_model import get_incomplete_page_ranges, load_completed_pages
+from ..models.calendar_model import ASSIGNMENT_TIME_ZONE
+from ..utils.model_util import decode_page_ranges
+
+DEFAULT_EVENT_LIMIT = 100
+MAX_EVENT_LIMIT = 500
+
+
+class ReminderEvent(db.Model):
+    """REMINDER_SINK = 'events' のときに書き込まれるリマインダー通知。"""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    item_type = db.Column(db.String(20), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(255))
+    # UTC
+    deadline = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_reminder_event_user_id', 'user_id', 'id'),
+    )
+
+
+def load_reminder_items(since, user_ids=None):
+    """
+    締め切りが since より後の未完了のタスクと課題を、締め切りを UTC の aware な datetime にして返す。
+    user_ids を渡すと、そのユーザーの項目だけを読みます。
+    """
+    tasks_query = (
+        select(Task.id, Task.user_id, Task.title, Task.deadline)
+        .where(Task.is_deleted == False, Task.completed.isnot(True), Task.deadline > since.astimezone(timezone.utc).replace(tzinfo=None))
+    )
+    assignments_query = (
+        select(Assignment.id, Assignment.workbook_id, Assignment.deadline, Assignment.page_ranges, Workbook.user_id, Workbook.title)
+        .join(Workbook, Workbook.id == Assignment.workbook_id)
+        .where(
+            Workbook.is_deleted == False, Assignment.is_deleted == False,
+            Assignment.deadline > since.astimezone(ASSIGNMENT_TIME_ZONE).replace(tzinfo=None),
+        )
+    )
+    if user_ids is not None:
+        tasks_query = tasks_query.where(Task.user_id.in_(user_ids))
+        assignments_query = assignments_query.where(Workbook.user_id.in_(user_ids))
+
+    items = [
+        {'type': 'task', 'id': row.id, 'user_id': row.user_id, 'title': row.title, 'deadline': row.deadline.replace(tzinfo=timezone.utc)}
+        for row in db.session.execute(tasks_query)
+    ]
+
+    rows = db.session.execute(assignments_query).all()
+    completed_pages = load_completed_pages({row.workbook_id for row in rows})
+    for row in rows:
+        # 全ページを終えた課題には通知しない
+        if not get_incomplete_page_ranges(row, decode_page_ranges(row.page_ranges), completed_pages):
+            continue
+        items.append({
+            'type': 'assignment', 'id': row.id, 'user_id': row.user_id, 'title': row.title,
+            'deadline': ASSIGNMENT_TIME_ZONE.localize(row.deadline).astimezone(timezone.utc),
+        })
+    return items
+
+
+def record_reminder_event(notification):
+    db.session.add(ReminderEvent(
+        user_id=notification['user_id'],
+        kind=notification['kind'],
+        item_type=notification['type'],
+        item_id=notification['id'],
+        title=notification['title'],
+        deadline=datetime.fromisoformat(notification['deadline']).astimezone(timezone.utc).replace(tzinfo=None),
+        created_at=datetime.now(timezone.utc).replace(tzinfo=None),
+    ))
+    db.session.commit()
+
+
+@traced
+def get_reminder_events(user_id, after_id=None, limit=None):
+    """after_id より後のリマインダー通知を古い順に返す。クライアントは最後の id を次の after に渡して読み進めます。"""
+    if limit is None:
+        limit = DEFAULT_EVENT_LIMIT
+    if not 1 <= limit <= MAX_EVENT_LIMIT:
+        return {'error': f'Limit must be between 1 and {MAX_EVENT_LIMIT}.'}, 400
+
+    rows = db.session.execute(
+        select(
+            ReminderEvent.id, ReminderEvent.kind, ReminderEvent.item_type, ReminderEvent.item_id,
+            ReminderEvent.title, ReminderEvent.deadline, ReminderEvent.created_at,
+        )
+        .where(ReminderEvent.user_id == user_id, ReminderEvent.id > (after_id or 0))
+        .order_by(ReminderEvent.id)
+        .limit(limit)
+    ).all()
+    return [
+        {
+            'id': row.id,
+            'kind': row.kind,
+            'type': row.item_type,
+            'item_id': row.item_id,
+            'title': row.title,
+            'deadline': convert_to_isoformat(row.deadline),
+            'created_at': convert_to_isoformat(row.created_at),
+        }
+        for row in rows
+    ], 200
@@ -0,0 +1,153 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..extensions import db, invalidation_bus
+from ..utils.bloom_filter import BloomFilter
+
+# ブルームフィルタの想定件数と偽陽性率
+REVOCATION_BLOOM_CAPACITY = 100000
+REVOCATION_BLOOM_ERROR_RATE = 0.001
+# 期限切れの失効トークンを削除する間隔（秒）
+REVOCATION_PRUNE_INTERVAL = 60 * 60
+
+# 無効化バスで他のワーカーに失効を通知するときのエンドポイント名
+REVOKED_TOKEN_ENDPOINT = 'revoked_token'
+
+
+class RevokedToken(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    jti = db.Column(db.String(64), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class RevocationFilter:
+    """
+    失効済み jti のブルームフィルタと、その読み込み状況をアプリごとに保持する。
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.last_loaded_id = 0
+        self.last_pruned = 0.0
+        self.loaded = False
+        self.stale = False
+        self.lock = threading.Lock()
+
+
+def get_revocation_filter():
+    revocation_filter = current_app.extensions.get('revocation_filter')
+    if revocation_filter is None:
+        revocation_filter = current_app.extensions['revocation_filter'] = RevocationFilter(
+            current_app.config.get('REVOCATION_BLOOM_CAPACITY', REVOCATION_BLOOM_CAPACITY),
+            current_app.config.get('REVOCATION_BLOOM_ERROR_RATE', REVOCATION_BLOOM_ERROR_RATE),
+        )
+    return revocation_filter
+
+
+def on_invalidation(user_id, endpoint):
+    # 他のワーカーでトークンが失効した場合、次の確認時に追加分を読み込む
+    if endpoint != REVOKED_TOKEN_ENDPOINT:
+        return
+    revocation_filter = current_app.extensions.get('revocation_filter')
+    if revocation_filter is not None:
+        revocation_filter.stale = True
+
+
+def is_token_revoked(jti):
+    """
+    jti が失効済みかを返す。
+    ブルームフィルタに含まれない場合はデータベースを参照しない。
+    他のワーカーでの失効は無効化バスで伝わるため、バスが無効な場合はフィルタを使わずに毎回データベースを参照します。
+    """
+    if not jti:
+        return False
+    if not invalidation_bus.enabled:
+        return db.session.query(RevokedToken.id).filter_by(jti=jti).first() is not None
+
+    revocation_filter = get_revocation_filter()
+    if not revocation_filter.loaded or revocation_filter.stale:
+        load_revoked_tokens(revocation_filter)
+    elif time.monotonic() - revocation_filter.last_pruned > current_app.config.get('REVOCATION_PRUNE_INTERVAL', REVOCATION_PRUNE_INTERVAL):
+        prune_revoked_tokens()
+
+    if not revocation_filter.bloom.might_contain(jti):
+        return False
+
+    # 偽陽性の可能性があるため、データベースで確認する
+    return db.session.query(RevokedToken.id).filter_by(jti=jti).first() is not None
+
+
+def load_revoked_tokens(revocation_filter):
+    """前回の読み込み以降に追加された失効トークンをブルームフィルタに追加する。"""
+    with revocation_filter.lock:
+        revocation_filter.stale = False
+        rows = db.session.query(RevokedToken.id, RevokedToken.jti).filter(
+            RevokedToken.id > revocation_filter.last_loaded_id
+        ).order_by(RevokedToken.id).all()
+
+        for row_id, jti in rows:
+            revocation_filter.bloom.add(jti)
+            revocation_filter.last_loaded_id = row_id
+
+        if not revocation_filter.loaded:
+            revocation_filter.loaded = True
+            revocation_filter.last_pruned = time.monotonic()
+
+
+def revoke_token(payload):
+    """
+    トークンのペイロードの jti を失効させる。
+    jti を持たない古いトークンは失効できないため何もしない。
+    """
+    jti = payload.get('jti') if payload else None
+    if not jti:
+        return {'error': 'Token cannot be revoked.'}, 400
+
+    exp = payload.get('exp')
+    if exp is None:
+        expires_at = datetime.utcnow()
+    else:
+        expires_at = datetime.fromtimestamp(exp, timezone.utc).replace(tzinfo=None)
+
+    try:
+        if not RevokedToken.query.filter_by(jti=jti).first():
+            db.session.add(RevokedToken(jti=jti, user_id=payload.get('user_id'), expires_at=expires_at))
+            db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return {'error': str(e)}, 500
+
+    get_revocation_filter().bloom.add(jti)
+    invalidation_bus.publish(payload.get('user_id'), REVOKED_TOKEN_ENDPOINT)
+    return {'message': 'Token revoked successfully.'}, 200
+
+
+def prune_revoked_tokens():
+    """
+    期限切れの失効トークンを削除し、ブルームフィルタを作り直す。
+    期限切れのトークンは jwt.decode の exp 検証で拒否されるため、失効記録は不要になる。
+    """
+    revocation_filter = get_revocation_filter()
+    try:
+        RevokedToken.query.filter(RevokedToken.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        print(f'models.revoked_token_model.prune_revoked_tokens Error: {e}')
+        return
+
+    rebuilt = RevocationFilter(revocation_filter.capacity, revocation_filter.error_rate)
+    load_revoked_tokens(rebuilt)
+    current_app.extensions['revocation_filter'] = rebuilt
+    # 作り直しの間に追加された失効を取りこぼさないよう、次回の確認で追加分を読み込む
+    rebuilt.stale = True
+
+
+invalidation_bus.subscribe(on_invalidation)
@@ -0,0 +1,219 @@
+from sqlalchemy import event, select, text
+
+from ..extensions import db
+from ..utils.tracing import traced
+from ..utils.util import convert_to_isoformat
+from ..models.task_model import Task
+from ..models.workbook_model import Workbook
+from ..models.assignment_model import Assignment
+
+SEARCH_TABLE = 'search_index'
+# FTS5 の UNINDEXED 列では絞り込めないため、ユーザーごとの rowid を通常のテーブルとインデックスで持つ
+OWNER_TABLE = 'search_index_owner'
+# 検索インデックスの rowid は id * 4 + 種類のコードにして、トリガーからの削除を rowid で行う
+TYPE_CODES = {'task': 1, 'workbook': 2, 'assignment': 3}
+# trigram トークナイザは 3 文字未満の語に MATCH できないため、短い語は LIKE で絞り込む
+MIN_MATCH_LENGTH = 3
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+MAX_QUERY_LENGTH = 200
+
+# 日本語は単語の区切りが無いため trigram で分割する
+CREATE_TABLE_SQL = f'''
+CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+    title, body, item_type UNINDEXED, item_id UNINDEXED, user_id UNINDEXED,
+    tokenize = 'trigram'
+)
+'''
+
+# user_id のインデックスは暗黙に rowid を含むため、(user_id, rowid) の順で読める
+CREATE_OWNER_TABLE_SQL = [
+    f'CREATE TABLE {OWNER_TABLE} (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL)',
+    f'CREATE INDEX ix_{OWNER_TABLE}_user_id ON {OWNER_TABLE} (user_id)',
+]
+
+# (テーブル, 種類, 監視するカラム, title の式, body の式, user_id の式)
+INDEXED_TABLES = [
+    ('task', 'task', 'title, supplementary, user_id, is_deleted',
+     'new.title', "coalesce(new.supplementary, '')", 'new.user_id'),
+    ('workbook', 'workbook', 'title, user_id, is_deleted',
+     'new.title', "''", 'new.user_id'),
+    ('assignment', 'assignment', 'supplementary, workbook_id, is_deleted',
+     "''", "coalesce(new.supplementary, '')", '(SELECT user_id FROM workbook WHERE workbook.id = new.workbook_id)'),
+]
+
+
+def trigger_names(table):
+    return [f'{SEARCH_TABLE}_{table}_{event_name}' for event_name in ('insert', 'update', 'delete')]
+
+
+def trigger_statements(table, item_type, columns, title, body, user_id):
+    rowid = f'{{row}}.id * 4 + {TYPE_CODES[item_type]}'
+    insert = (
+        f"INSERT INTO {SEARCH_TABLE} (rowid, title, body, item_type, item_id, user_id) "
+        f"SELECT {rowid.format(row='new')}, {title}, {body}, '{item_type}', new.id, {user_id} "
+        f"WHERE coalesce(new.is_deleted, 0) = 0; "
+        f"INSERT INTO {OWNER_TABLE} (id, user_id) "
+        f"SELECT {rowid.format(row='new')}, {user_id} WHERE coalesce(new.is_deleted, 0) = 0;"
+    )
+    delete = (
+        f"DELETE FROM {SEARCH_TABLE} WHERE rowid = {rowid.format(row='old')}; "
+        f"DELETE FROM {OWNER_TABLE} WHERE id = {rowid.format(row='old')};"
+    )
+    insert_trigger, update_trigger, delete_trigger = trigger_names(table)
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {insert_trigger} AFTER INSERT ON "{table}" BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {update_trigger} AFTER UPDATE OF {columns} ON "{table}" BEGIN {delete} {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {delete_trigger} AFTER DELETE ON "{table}" BEGIN {delete} END',
+    ]
+
+
+def backfill_statements(table, item_type, title, body, user_id):
+    # トリガーの new を対象テーブルの行に置き換えて、既存の行をまとめて登録する
+    row = lambda expression: expression.replace('new.', f'"{table}".')
+    rowid = f'"{table}".id * 4 + {TYPE_CODES[item_type]}'
+    where = f'FROM "{table}" WHERE coalesce("{table}".is_deleted, 0) = 0'
+    return [
+        f"INSERT INTO {SEARCH_TABLE} (rowid, title, body, item_type, item_id, user_id) "
+        f"SELECT {rowid}, {row(title)}, {row(body)}, '{item_type}', \"{table}\".id, {row(user_id)} {where}",
+        f"INSERT INTO {OWNER_TABLE} (id, user_id) SELECT {rowid}, {row(user_id)} {where}",
+    ]
+
+
+def create_search_index(connection, rebuild=False):
+    """
+    検索インデックスと同期用のトリガーを作成し、既存の行を登録する。
+    作成済みの場合は何もしません。rebuild=True の場合や、ユーザーごとの rowid のテーブルが無い
+    古いインデックスの場合は作り直します。
+    SQLite 以外のデータベースでは何もせず False を返します。
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+
+    existing = set(connection.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (:search, :owner)"),
+        {'search': SEARCH_TABLE, 'owner': OWNER_TABLE},
+    ).scalars())
+    if existing == {SEARCH_TABLE, OWNER_TABLE} and not rebuild:
+        return False
+    for table, *_ in INDEXED_TABLES:
+        for trigger in trigger_names(table):
+            connection.execute(text(f'DROP TRIGGER IF EXISTS {trigger}'))
+    for table in existing:
+        connection.execute(text(f'DROP TABLE {table}'))
+
+    connection.execute(text(CREATE_TABLE_SQL))
+    for statement in CREATE_OWNER_TABLE_SQL:
+        connection.execute(text(statement))
+    for table, item_type, columns, title, body, user_id in INDEXED_TABLES:
+        for statement in trigger_statements(table, item_type, columns, title, body, user_id):
+            connection.execute(text(statement))
+        for statement in backfill_statements(table, item_type, title, body, user_id):
+            connection.execute(text(statement))
+    return True
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index_after_create(target, connection, **kw):
+    create_search_index(connection)
+
+
+def build_search_query(terms):
+    """
+    検索語を FTS5 の MATCH 式と、短い語用の LIKE 条件に分ける。
+    各語はフレーズとして引用し、入力中の FTS5 の演算子は解釈しません。
+    """
+    match_terms = ['"' + term.replace('"', '""') + '"' for term in terms if len(term) >= MIN_MATCH_LENGTH]
+    like_terms = [term for term in terms if len(term) < MIN_MATCH_LENGTH]
+    return ' '.join(match_terms), like_terms
+
+
+def load_search_details(user_id, ids_by_type):
+    """検索結果の項目を種類ごとに 1 クエリで読み、所有者と削除状態を確認した上で {(種類, id): 辞書} を返す。"""
+    details = {}
+    if ids_by_type.get('task'):
+        for row in db.session.execute(
+            select(Task.id, Task.title, Task.deadline, Task.completed)
+            .where(Task.id.in_(ids_by_type['task']), Task.user_id == user_id, Task.is_deleted == False)
+        ):
+            details['task', row.id] = {
+                'title': row.title, 'deadline': convert_to_isoformat(row.deadline), 'completed': row.completed,
+            }
+    if ids_by_type.get('workbook'):
+        for row in db.session.execute(
+            select(Workbook.id, Workbook.title)
+            .where(Workbook.id.in_(ids_by_type['workbook']), Workbook.user_id == user_id, Workbook.is_deleted == False)
+        ):
+            details['workbook', row.id] = {'title': row.title}
+    if ids_by_type.get('assignment'):
+        for row in db.session.execute(
+            select(Assignment.id, Assignment.workbook_id, Assignment.deadline, Workbook.title)
+            .join(Workbook, Workbook.id == Assignment.workbook_id)
+            .where(
+                Assignment.id.in_(ids_by_type['assignment']), Workbook.user_id == user_id,
+                Workbook.is_deleted == False, Assignment.is_deleted == False,
+            )
+        ):
+            details['assignment', row.id] = {
+                'workbook_id': row.workbook_id, 'workbook_title': row.title, 'deadline': convert_to_isoformat(row.deadline),
+            }
+    return details
+
+
+@traced
+def search(user_id, query, page=1, per_page=DEFAULT_PER_PAGE):
+    """
+    タスクのタイトルと補足、ワークブックのタイトル、課題の補足を全文検索する。
+    空白で区切った語をすべて含む項目を関連度（bm25、タイトルを 2 倍に重み付け）の順に返します。
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return {'error': 'Search is not available.'}, 501
+
+    terms = (query or '').split()
+    if not terms:
+        return {'error': 'Query is required.'}, 400
+    if len(query) > MAX_QUERY_LENGTH:
+        return {'error': f'Query must be at most {MAX_QUERY_LENGTH} characters.'}, 400
+    if page < 1 or not 1 <= per_page <= MAX_PER_PAGE:
+        return {'error': f'page must be at least 1 and per_page between 1 and {MAX_PER_PAGE}.'}, 400
+
+    match, like_terms = build_search_query(terms)
+    conditions = []
+    parameters = {'user_id': user_id, 'limit': per_page + 1, 'offset': (page - 1) * per_page}
+    for i, term in enumerate(like_terms):
+        conditions.append(f"(title || ' ' || body) LIKE :like{i} ESCAPE '\\'")
+        parameters[f'like{i}'] = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+    if match:
+        source = SEARCH_TABLE
+        conditions += [f'{SEARCH_TABLE}.user_id = :user_id', f'{SEARCH_TABLE} MATCH :match']
+        parameters['match'] = match
+        columns = f"snippet({SEARCH_TABLE}, -1, '', '', '…', 16) AS snippet"
+        order = f'bm25({SEARCH_TABLE}, 2.0, 1.0)'
+    else:
+        # 短い語だけの検索は全文検索の索引を使えないため、ユーザーの行だけを新しい順に読んで LIKE で絞り込む
+        source = f'{OWNER_TABLE} JOIN {SEARCH_TABLE} ON {SEARCH_TABLE}.rowid = {OWNER_TABLE}.id'
+        conditions.append(f'{OWNER_TABLE}.user_id = :user_id')
+        columns = "substr(CASE WHEN body = '' THEN title ELSE body END, 1, 64) AS snippet"
+        order = f'{OWNER_TABLE}.id DESC'
+
+    rows = db.session.execute(text(
+        f'SELECT item_type, item_id, {columns} FROM {source} '
+        f'WHERE {" AND ".join(conditions)} ORDER BY {order} LIMIT :limit OFFSET :offset'
+    ), parameters).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    ids_by_type = {}
+    for row in rows:
+        ids_by_type.setdefault(row.item_type, []).append(row.item_id)
+    details = load_search_details(user_id, ids_by_type)
+
+    results = []
+    for row in rows:
+        detail = details.get((row.item_type, row.item_id))
+        if detail is None:
+            continue
+        results.append({'type': row.item_type, 'id': row.item_id, 'snippet': row.snippet, **detail})
+
+    return {'results': results, 'page': page, 'per_page': per_page, 'has_more': has_more}, 200
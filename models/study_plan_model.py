@@ -0,0 +1,70 @@
+from sqlalchemy import exists, insert, literal, select
+
+from ..extensions import db
+
+
+class StudyPlan(db.Model):
+    """ユーザーごとに保存した学習計画。作成日と容量が変わった場合は作り直します。"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    start_date = db.Column(db.Date, nullable=False)
+    daily_capacity = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime)
+    # 同時に計画を更新したリクエストを検出する
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+
+
+class StudyPlanAllocation(db.Model):
+    """保存した学習計画の、課題ごと・日ごとの割り当て。"""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    pages = db.Column(db.Integer, nullable=False)
+    # [[start, end], ...] を JSON 配列としてエンコードしたページ範囲
+    page_ranges = db.Column(db.Text, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_study_plan_allocation_user_day', 'user_id', 'day'),
+    )
+
+
+class StudyPlanDirty(db.Model):
+    """
+    保存した計画から外れた課題。課題やページの書き込みと同じトランザクションで追加し、
+    次に計画を読むときに該当する課題だけを割り当て直して削除します。
+    """
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    assignment_id = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        # 同じ課題の通知は 1 行にまとめる
+        db.Index('ux_study_plan_dirty_user_assignment', 'user_id', 'assignment_id', unique=True),
+    )
+
+
+def mark_plan_stale(user_id, assignment_ids=None, workbook_id=None):
+    """
+    課題の変更を学習計画に通知する。assignment_ids か、ワークブックの未削除の全課題を対象にする workbook_id を渡します。
+    計画を保存していないユーザーには通知せず、通知済みの課題は重複して追加しません。
+    コミットは呼び出し元の書き込みと合わせて行います。
+    """
+    from .assignment_model import Assignment
+
+    if workbook_id is not None:
+        condition = (Assignment.workbook_id == workbook_id) & (Assignment.is_deleted == False)
+    elif assignment_ids:
+        condition = Assignment.id.in_(assignment_ids)
+    else:
+        return
+
+    db.session.execute(
+        insert(StudyPlanDirty).prefix_with('OR IGNORE', dialect='sqlite').from_select(
+            ['user_id', 'assignment_id'],
+            select(literal(user_id), Assignment.id).where(
+                condition, exists().where(StudyPlan.user_id == user_id),
+            ),
+        )
+    )
@@ -1,6 +1,12 @@
 import json
 from datetime import datetime, timezone
-from ..extensions import db
+from sqlalchemy import select, bindparam, text
+from sqlalchemy.orm.exc import StaleDataError
+from ..extensions import db, reminders
+from ..utils.tracing import traced
+from ..utils.request_cache import cached_lookup, invalidate_lookup
+from ..utils.query_registry import register_query, fetch_first
+from ..utils.model_util import parse_expected_version, version_conflict_response
 
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -10,31 +16,68 @@ class Task(db.Model):
     completed = db.Column(db.Boolean, default=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)  # 外部キー制約をCASCADEに変更
     is_deleted = db.Column(db.Boolean, default=False)
+    # 楽観的ロック用。UPDATE 時に WHERE version = ? で競合を検出する
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
+    __mapper_args__ = {'version_id_col': version}
+    __table_args__ = (
+        # 締め切り順の範囲検索用。削除済みの行は含めない
+        db.Index(
+            'ix_task_active_user_deadline', 'user_id', 'deadline',
+            sqlite_where=text('is_deleted = 0'), postgresql_where=text('is_deleted = false'),
+        ),
+    )
+
+
+TASK_FOR_USER_QUERY = register_query('task_for_user', select(Task).where(
+    Task.id == bindparam('task_id'),
+    Task.user_id == bindparam('user_id'),
+    Task.is_deleted == False,
+).limit(1))
+
+
+@traced
 def get_all_tasks(user_id):
-    # データベースからすべてのタスクを取得
-    tasks = Task.query.filter_by(user_id=user_id, is_deleted=False).all()
+    # データベースからすべてのタスクを取得（ORM オブジェクトではなく行タプルで取得する）
+    tasks = db.session.execute(
+        select(Task.id, Task.title, Task.supplementary, Task.deadline, Task.completed, Task.version)
+        .filter_by(user_id=user_id, is_deleted=False)
+    ).all()
     
     if not tasks:
         return [], 404
     
     # タスクを辞書に変換
-    tasks_list = []
-    for task in tasks:
-        task_data = {
-            'id': task.id,
-            'type': 'task',
-            'title': task.title,
-            'supplementary': task.supplementary,
-            'deadline': task.deadline.isoformat() if task.deadline else None,  # Noneの場合はISO 8601形式の文字列に変換しない
-            'completed': task.completed,
-        }
-        tasks_list.append(task_data)
+    tasks_list = [task_to_dict(task) for task in tasks]
     
     # 辞書をJSON文字列に変換
     return json.dumps(tasks_list), 200
 
 
+async def get_all_tasks_async(session, user_id):
+    # ASGI モード用: AsyncSession で get_all_tasks と同じ結果を返す
+    result = await session.execute(select(Task).filter_by(user_id=user_id, is_deleted=False))
+    tasks = result.scalars().all()
+
+    if not tasks:
+        return [], 404
+
+    return json.dumps([task_to_dict(task) for task in tasks]), 200
+
+
+def task_to_dict(task):
+    return {
+        'id': task.id,
+        'type': 'task',
+        'title': task.title,
+        'supplementary': task.supplementary,
+        'deadline': task.deadline.isoformat() if task.deadline else None,  # Noneの場合はISO 8601形式の文字列に変換しない
+        'completed': task.completed,
+        'version': task.version,
+    }
+
+
+@traced
 def add_task(user_id, data):
     if not user_id:
         return {'error': 'id is empty.'}, 400
@@ -60,12 +103,14 @@ def add_task(user_id, data):
     new_task = Task(title=title, supplementary=supplementary, deadline=deadline, completed=completed, user_id=user_id)
     db.session.add(new_task)
     db.session.commit()
+    reminders.user_changed(user_id)
 
     # タスクの追加が成功したことを示すメッセージを返す
     return {'message': 'Task added successfully.'}, 200
 
 
-def set_finish_state(use_id, id, state):
+@traced
+def set_finish_state(use_id, id, state, version=None):
     error_response, status_code = validate_id(use_id, id)
     if error_response:
         return error_response, status_code
@@ -73,14 +118,27 @@ def set_finish_state(use_id, id, state):
     task = Task.query.get(id)
     
     if task:
-        task.completed = state
-        db.session.commit()
+        try:
+            expected_version = parse_expected_version(version)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if expected_version is not None and task.version != expected_version:
+            return version_conflict_response('Task', task_to_dict(task))
+
+        try:
+            task.completed = state
+            db.session.commit()
+            reminders.user_changed(use_id)
+        except StaleDataError:
+            db.session.rollback()
+            return version_conflict_response('Task', task_to_dict(Task.query.get(id)))
         return {'message': 'Task finish state updated successfully'}, 200
     else:
         return {'error': 'Task not found'}, 404
 
 
-def db_delete_task(user_id, task_id):
+@traced
+def db_delete_task(user_id, task_id, version=None):
     task_to_delete = Task.query.filter_by(id=task_id, is_deleted=False).first()
     if not task_to_delete:
         return {'error': 'task not found.'}, 404
@@ -93,10 +151,23 @@ def db_delete_task(user_id, task_id):
     if error_response:
         return error_response, status_code
 
+    try:
+        expected_version = parse_expected_version(version)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    if expected_version is not None and task_to_delete.version != expected_version:
+        return version_conflict_response('Task', task_to_dict(task_to_delete))
+
     try:
         task_to_delete.is_deleted = True
         db.session.commit()
+        invalidate_lookup(user_id, 'task', task_id)
+        reminders.user_changed(user_id)
         return {'message': 'task deleted successfully.'}, 200
+    except StaleDataError:
+        db.session.rollback()
+        invalidate_lookup(user_id, 'task', task_id)
+        return version_conflict_response('Task', task_to_dict(Task.query.get(task_id)))
     except Exception as e:
         db.session.rollback()
         return {'error': f"Failed to delete task: {str(e)}"}, 500
@@ -107,6 +178,7 @@ def db_delete_task(user_id, task_id):
     if error_response:
         return error_response, status_code
 '''
+@traced
 def validate_id(user_id, task_id):
     if not user_id:
         return {'error': 'User ID is empty.'}, 400
@@ -114,8 +186,16 @@ def validate_id(user_id, task_id):
     if not task_id:
         return {'error': 'task ID is empty.'}, 400
     
-    task = Task.query.filter_by(id=task_id, user_id=user_id, is_deleted=False).first()
+    task = get_task_for_user(user_id, task_id)
     if not task:
         return {'error': 'User ID and task ID do not match.'}, 400
 
-    return None, None
\ No newline at end of file
+    return None, None
+
+
+def get_task_for_user(user_id, task_id):
+    # 同じリクエスト内では 1 回だけクエリを発行する
+    return cached_lookup(
+        user_id, 'task', task_id,
+        lambda: fetch_first(TASK_FOR_USER_QUERY, task_id=task_id, user_id=user_id)
+    )
\ No newline at end of file
@@ -1,12 +1,18 @@
 #models/user.py
 
-import hashlib
+from sqlalchemy import select, bindparam
 from ..extensions import db
+from ..utils.tracing import traced
 from ..utils.model_util import validate_password
+from ..utils.query_registry import register_query, fetch_first
+from ..utils.password import hash_password, verify_password, needs_rehash, PasswordHasherBusy
 
 
 USERNAME_LENGTH = 100
 PASSWORD_LENGTH = 100
+BUSY_MESSAGE = 'The server is busy. Please try again later.'
+# 学習計画で 1 日に割り当てるページ数の既定値
+DEFAULT_DAILY_CAPACITY = 20
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -14,11 +20,19 @@ class User(db.Model):
     password = db.Column(db.String(120), nullable=False)
     tasks = db.relationship('Task', backref='user', lazy=True)
     is_deleted = db.Column(db.Boolean, default=False)
+    daily_capacity = db.Column(db.Integer, nullable=False, default=DEFAULT_DAILY_CAPACITY, server_default=str(DEFAULT_DAILY_CAPACITY))
 
     def __repr__(self):
         return '<User %r>' % self.username
 
 
+ACTIVE_USER_BY_USERNAME_QUERY = register_query('active_user_by_username', select(User).where(
+    User.username == bindparam('username'),
+    User.is_deleted == False,
+).limit(1))
+
+
+@traced
 def add_user(username, password):
     # ユーザー名とパスワードがどちらも提供されていることを確認する
     if not username or not password:
@@ -30,15 +44,18 @@ def add_user(username, password):
         return {'error': 'Password is too long.'}, 400, None
     
     # ユーザー名の重複をチェックする
-    if User.query.filter_by(username=username, is_deleted=False).first():
+    if fetch_first(ACTIVE_USER_BY_USERNAME_QUERY, username=username):
         return {'error': 'Username already exists.'}, 409, None
     
     valid, message, error_code = validate_password(password)
     if not valid:
         return {'error': f'Invalid password.{message}'}, error_code, None
     
-    # パスワードをハッシュ化する
-    hashed_password = hashlib.sha256(password.encode()).hexdigest()
+    # パスワードをハッシュ化する（scrypt をハッシュ用スレッドプールで実行）
+    try:
+        hashed_password = hash_password(password)
+    except PasswordHasherBusy:
+        return {'error': BUSY_MESSAGE}, 503, None
     
     new_user = User(username=username, password=hashed_password)
     db.session.add(new_user)
@@ -47,42 +64,70 @@ def add_user(username, password):
     return {'message': 'User created successfully.'}, 200, new_user
 
 
+@traced
 def verify_user(username, password):
     # ユーザー名とパスワードがどちらも提供されていることを確認する
     if not username or not password:
         return {'error': 'Username and password are required.'}, 400, None
     
     # ユーザーが存在するかを確認する
-    user = User.query.filter_by(username=username, is_deleted=False).first()
+    user = fetch_first(ACTIVE_USER_BY_USERNAME_QUERY, username=username)
     not_match_message = 'The login information does not match the account information in the system.'
     if not user:
         return {'error': not_match_message}, 404, None
     
-    # 入力されたパスワードをハッシュ化してデータベース内のハッシュと比較する
-    hashed_input_password = hashlib.sha256(password.encode()).hexdigest()
-    if user.password != hashed_input_password:
-        return {'error': not_match_message}, 404, None
+    # 入力されたパスワードをデータベース内のハッシュと比較する
+    try:
+        if not verify_password(password, user.password):
+            return {'error': not_match_message}, 404, None
+    except PasswordHasherBusy:
+        return {'error': BUSY_MESSAGE}, 503, None
+
+    # 旧形式（SHA-256）やコスト設定が古いハッシュはログイン時に作り直す
+    # 混雑時は作り直しを見送り、次回のログインで再度試みる
+    if needs_rehash(user.password):
+        try:
+            user.password = hash_password(password)
+            db.session.commit()
+        except PasswordHasherBusy:
+            db.session.rollback()
     
     # ユーザーが認証された場合は、成功メッセージを返す
     return {'message': 'User authenticated successfully.'}, 200, user
 
 
 
+@traced
 def get_user_by_id(id):
     if not id:
         return {'error': 'ID is required.'}, 400
 
-    user = User.query.get(id)
+    user = db.session.execute(select(User.id, User.username).filter_by(id=id)).first()
     if not user:
         return {'error': 'User not found.'}, 404
     
-    # ユーザーオブジェクトの属性を辞書に変換して返す
-    user_data = {
+    # ユーザーの属性を辞書に変換して返す
+    return user_to_dict(user), 200
+
+
+async def get_user_by_id_async(session, id):
+    # ASGI モード用: AsyncSession で get_user_by_id と同じ結果を返す
+    if not id:
+        return {'error': 'ID is required.'}, 400
+
+    user = (await session.execute(select(User).filter_by(id=id))).scalar_one_or_none()
+    if not user:
+        return {'error': 'User not found.'}, 404
+
+    return user_to_dict(user), 200
+
+
+def user_to_dict(user):
+    return {
         'id': user.id,
         'username': user.username,
         # 必要に応じて他の属性も追加
     }
-    return user_data, 200
 
 
 
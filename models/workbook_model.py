@@ -1,5 +1,13 @@
 import json
-from ..extensions import db
+from sqlalchemy import select, update, bindparam, text
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from ..extensions import db, response_cache, reminders
+from ..utils.tracing import traced
+from ..utils.request_cache import cached_lookup, invalidate_lookup
+from ..utils.query_registry import register_query, fetch_first
+from ..utils.model_util import parse_expected_version, version_conflict_response
+from .study_plan_model import mark_plan_stale
 
 
 class Workbook(db.Model):
@@ -9,7 +17,26 @@ class Workbook(db.Model):
     pages = db.relationship('Page', backref='workbook', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     assignments = db.relationship('Assignment', backref='workbook', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     is_deleted = db.Column(db.Boolean, default=False)
+    # 楽観的ロック用。UPDATE 時に WHERE version = ? で競合を検出する
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
+    __mapper_args__ = {'version_id_col': version}
+    __table_args__ = (
+        # ユーザーのワークブックを結合する読み込み用。削除済みの行は含めない
+        db.Index(
+            'ix_workbook_active_user', 'user_id',
+            sqlite_where=text('is_deleted = 0'), postgresql_where=text('is_deleted = false'),
+        ),
+    )
+
+
+WORKBOOK_FOR_USER_QUERY = register_query('workbook_for_user', select(Workbook).where(
+    Workbook.id == bindparam('workbook_id'),
+    Workbook.user_id == bindparam('user_id'),
+).limit(1))
+
+
+@traced
 def add_workbook(user_id, data):
     if user_id is None:
         return {'error': 'User ID is required.'}, 400
@@ -25,12 +52,14 @@ def add_workbook(user_id, data):
         new_workbook = Workbook(title=title, user_id=user_id)
         db.session.add(new_workbook)
         db.session.commit()
+        response_cache.invalidate(user_id, 'get_all_workbooks')
         return {'message': 'Workbook added successfully.'}, 200
     except Exception as e:
         db.session.rollback()
         return {'error': str(e)}, 500
     
 
+@traced
 def register_pages(workbook_id, pages):
     try:
         workbook = Workbook.query.get(workbook_id, is_deleted=False)
@@ -42,28 +71,62 @@ def register_pages(workbook_id, pages):
         return {'error': 'Internal server error.'}, 500
 
 
+@traced
+@response_cache.cached('get_all_workbooks')
 def get_all_workbooks(user_id):
-    workbooks = Workbook.query.filter_by(user_id=user_id).all()
+    from .page_model import Page
+
+    # ORM オブジェクトではなく行タプルで取得する
+    workbooks = db.session.execute(
+        select(Workbook.id, Workbook.title, Workbook.is_deleted, Workbook.version).filter_by(user_id=user_id)
+    ).all()
     if not workbooks:
         return [], 404
 
-    workbooks_list = []
-    for workbook in workbooks:
-        if workbook.is_deleted == True:
-            continue
-
-        completed_page_ranges = get_completed_page_ranges(workbook.pages)
-        workbook_data = {
-            'id': workbook.id,
-            'type': 'workbook',
-            'title': workbook.title,
-            'completed_page_ranges': completed_page_ranges,
-        }
-        workbooks_list.append(workbook_data)
+    # 全ワークブックのページを 1 クエリで取得し、ワークブックごとにまとめる
+    pages_by_workbook = {}
+    page_rows = db.session.execute(
+        select(Page.workbook_id, Page.number, Page.completed)
+        .where(Page.workbook_id.in_([workbook.id for workbook in workbooks]))
+    )
+    for page in page_rows:
+        pages_by_workbook.setdefault(page.workbook_id, []).append(page)
+
+    workbooks_list = [
+        workbook_to_dict(workbook, pages_by_workbook.get(workbook.id, []))
+        for workbook in workbooks if workbook.is_deleted != True
+    ]
     
     return json.dumps(workbooks_list), 200
 
 
+async def get_all_workbooks_async(session, user_id):
+    # ASGI モード用: AsyncSession で get_all_workbooks と同じ結果を返す
+    # 非同期セッションでは遅延読み込みができないため、ページをまとめて読み込む
+    result = await session.execute(
+        select(Workbook).filter_by(user_id=user_id).options(selectinload(Workbook.pages))
+    )
+    workbooks = result.scalars().all()
+    if not workbooks:
+        return [], 404
+
+    workbooks_list = [workbook_to_dict(workbook) for workbook in workbooks if workbook.is_deleted != True]
+
+    return json.dumps(workbooks_list), 200
+
+
+def workbook_to_dict(workbook, pages=None):
+    if pages is None:
+        pages = workbook.pages
+    return {
+        'id': workbook.id,
+        'type': 'workbook',
+        'title': workbook.title,
+        'completed_page_ranges': get_completed_page_ranges(pages),
+        'version': workbook.version,
+    }
+
+
 def get_completed_page_ranges(pages):
     if not pages:
         return []
@@ -113,9 +176,15 @@ def get_workbook_matching_user_id(user_id):
     return workbook_id
 
 
+@traced
 def get_workbook_for_user(user_id, workbook_id):
-    workbook = Workbook.query.filter_by(id=workbook_id, user_id=user_id).first()
-    if workbook.is_deleted == True:
+    # 同じリクエスト内では 1 回だけクエリを発行する
+    return cached_lookup(user_id, 'workbook', workbook_id, lambda: load_workbook_for_user(user_id, workbook_id))
+
+
+def load_workbook_for_user(user_id, workbook_id):
+    workbook = fetch_first(WORKBOOK_FOR_USER_QUERY, workbook_id=workbook_id, user_id=user_id)
+    if not workbook or workbook.is_deleted == True:
         return None
     
     return workbook
@@ -131,29 +200,53 @@ def get_assignments(user_id, workbook_id):
     return assignments
 
 
-def db_delete_workbook(user_id, workbook_id):
+@traced
+def db_delete_workbook(user_id, workbook_id, version=None):
     workbook_to_delete = get_workbook_for_user(user_id, workbook_id)
 
     if not workbook_to_delete:
         return {'error': 'Workbook not found.'}, 404
 
     try:
-        assignments = get_assignments(user_id, workbook_id)
+        expected_version = parse_expected_version(version)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    if expected_version is not None and workbook_to_delete.version != expected_version:
+        return version_conflict_response('Workbook', workbook_to_dict(workbook_to_delete))
 
-        for assignment in assignments:
-            assignments.is_deleted = True
-            ranges = assignment.assignment_page_ranges
-            for r in ranges:
-                r.is_deleted = True
-        
-        pages = workbook_to_delete.pages
-        for page in pages:
-            page.is_deleted = True
+    try:
+        from .assignment_model import Assignment
+        from .page_model import Page
+
+        # 通知は未削除の課題が対象なので、論理削除より前に追加する
+        mark_plan_stale(user_id, workbook_id=workbook_id)
+        # 課題とページは 1 文ずつで論理削除する。課題は version も進め、同時に実行中のマージに競合を検出させる
+        db.session.execute(
+            update(Assignment)
+            .where(Assignment.workbook_id == workbook_id, Assignment.is_deleted == False)
+            .values(is_deleted=True, version=Assignment.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            update(Page)
+            .where(Page.workbook_id == workbook_id, Page.is_deleted == False)
+            .values(is_deleted=True)
+            .execution_options(synchronize_session=False)
+        )
 
         workbook_to_delete.is_deleted = True
             
         db.session.commit()
+        invalidate_lookup(user_id, 'workbook', workbook_id)
+        response_cache.invalidate(user_id, 'get_all_workbooks', 'get_all_assignment')
+        reminders.user_changed(user_id)
         return {'message': 'Workbook deleted successfully.'}, 200
+    except StaleDataError:
+        # 課題またはワークブックが同時に更新された。削除は行わずに現在の状態を返す
+        db.session.rollback()
+        invalidate_lookup(user_id, 'workbook', workbook_id)
+        current = get_workbook_for_user(user_id, workbook_id)
+        return version_conflict_response('Workbook', workbook_to_dict(current) if current else None)
     except Exception as e:
         db.session.rollback()
         return {'error': f"Failed to delete workbook: {str(e)}"}, 500
@@ -164,6 +257,7 @@ def db_delete_workbook(user_id, workbook_id):
     if error_response:
         return error_response, status_code
 '''
+@traced
 def validate_id(user_id, workbook_id):
     if not user_id:
         return {'error': 'User ID is empty.'}, 400
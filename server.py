@@ -0,0 +1,232 @@
+# server.py
+"""
+Production launcher with preforked, pre-warmed workers.
+    python -m allocaide_backend.server --bind 0.0.0.0:8000 --workers 4
+
+The master process imports the package and calls create_app() once, binds the
+listening socket and forks the workers. Each worker opens its own database pool
+and runs warm_up() before it starts accepting connections, so the first
+requests after a deploy do not pay for mapper configuration, query compilation
+or cache loading.
+
+Signals sent to the master:
+    SIGHUP           graceful reload: start a new generation of workers and stop
+                     each old worker once a new one is ready
+    SIGTERM, SIGINT  graceful shutdown: workers finish in-flight requests and exit
+"""
+
+import argparse
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+
+from sqlalchemy.orm import configure_mappers
+from werkzeug.serving import make_server
+
+from . import create_app
+from .extensions import db
+from .utils.token import generate_access_token
+
+# ワーカーが停止するまでの猶予（秒）
+GRACEFUL_TIMEOUT = 30
+# ウォームアップで叩く GET エンドポイント
+WARM_UP_PATHS = ['/get_user_info', '/get_tasks', '/get_workbooks', '/get_all_assignments']
+# ウォームアップ用の存在しないユーザーID
+WARM_UP_USER_ID = -1
+WARM_UP_USERNAME = '__warm_up__'
+
+
+class ServerReadiness:
+    """ワーカー内の状態。/readyz が参照する。"""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.status = 'starting'
+        self.warm_up_seconds = None
+
+    def snapshot(self):
+        return {
+            'status': self.status,
+            'pid': os.getpid(),
+            'generation': self.generation,
+            'warm_up_seconds': self.warm_up_seconds,
+        }
+
+
+def warm_up(app):
+    """
+    ワーカーの初期化処理。
+    fork 前の接続を引き継がないようにプールを作り直し、接続を開き、マッパーを構成し、
+    主要な GET エンドポイントを一度ずつ実行してクエリのコンパイル結果やキャッシュを用意する。
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('SELECT 1')
+        configure_mappers()
+        token = generate_access_token(WARM_UP_USER_ID)
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    for path in WARM_UP_PATHS:
+        client.get(path, headers=headers)
+    # ログインのユーザー検索（パスワード検証の手前で終わる）
+    client.post('/login', json={'username': WARM_UP_USERNAME, 'password': WARM_UP_USERNAME})
+
+
+def run_worker(app, listener, generation, ready_pipe):
+    readiness = ServerReadiness(generation)
+    app.extensions['server_readiness'] = readiness
+
+    started = time.perf_counter()
+    warm_up(app)
+    readiness.warm_up_seconds = round(time.perf_counter() - started, 3)
+
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+    # 停止時に処理中のリクエストの完了を待つ
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    def shutdown(signum, frame):
+        readiness.status = 'draining'
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    readiness.status = 'ready'
+    os.write(ready_pipe, f'{os.getpid()}\n'.encode())
+    server.serve_forever()
+    server.server_close()
+
+
+class Master:
+    def __init__(self, app, listener, workers):
+        self.app = app
+        self.listener = listener
+        self.workers = workers
+        self.generation = 0
+        self.children = {}  # pid -> generation
+        self.ready_read, self.ready_write = os.pipe()
+        self.reload_requested = False
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            os.close(self.ready_read)
+            try:
+                run_worker(self.app, self.listener, self.generation, self.ready_write)
+            finally:
+                os._exit(0)
+        self.children[pid] = self.generation
+        return pid
+
+    def run(self):
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, 'reload_requested', True))
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, 'stopping', True))
+        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, 'stopping', True))
+
+        for _ in range(self.workers):
+            self.spawn()
+
+        buffer = b''
+        while not self.stopping:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+
+            try:
+                readable, _, _ = select.select([self.ready_read], [], [], 0.5)
+            except InterruptedError:
+                readable = []
+            if readable:
+                buffer += os.read(self.ready_read, 1024)
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    self.on_ready(int(line))
+
+            self.reap()
+
+        self.stop_all()
+
+    def reload(self):
+        self.generation += 1
+        print(f'[server] reloading: starting generation {self.generation}', file=sys.stderr)
+        for _ in range(self.workers):
+            self.spawn()
+
+    def on_ready(self, pid):
+        generation = self.children.get(pid)
+        print(f'[server] worker {pid} (generation {generation}) ready', file=sys.stderr)
+        # 新しい世代のワーカーが 1 つ準備できるたびに、古い世代のワーカーを 1 つ停止する
+        old_pids = [old_pid for old_pid, old_generation in self.children.items() if 0 <= old_generation < self.generation]
+        if generation == self.generation and old_pids:
+            self.terminate(old_pids[0])
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            generation = self.children.pop(pid, None)
+            # 現在の世代のワーカーが予期せず終了した場合は補充する
+            if generation == self.generation and not self.stopping:
+                print(f'[server] worker {pid} exited unexpectedly ({status}); respawning', file=sys.stderr)
+                self.spawn()
+
+    def terminate(self, pid):
+        self.children[pid] = -1
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def stop_all(self):
+        for pid in list(self.children):
+            self.terminate(pid)
+
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+
+        for pid in list(self.children):
+            os.kill(pid, signal.SIGKILL)
+        self.listener.close()
+
+
+def create_listener(host, port, backlog=2048):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    listener.set_inheritable(True)
+    return listener
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the service with preforked, pre-warmed workers.')
+    parser.add_argument('--bind', default='127.0.0.1:8000')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    host, _, port = args.bind.rpartition(':')
+    app = create_app()
+    listener = create_listener(host or '127.0.0.1', int(port))
+    print(f'[server] listening on {host}:{port} with {args.workers} workers', file=sys.stderr)
+    Master(app, listener, args.workers).run()
+
+
+if __name__ == '__main__':
+    main()
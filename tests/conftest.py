@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from .. import create_app
+from ..extensions import db
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """一時ディレクトリの SQLite データベースを使うアプリを作成し、テーブルを作成する関数を返す。"""
+    def factory(**config):
+        test_config = {
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp_path, 'test.sqlite'),
+            # レスポンスキャッシュが効くと SQL が発行されないため無効にする
+            'RESPONSE_CACHE_ENABLED': False,
+        }
+        test_config.update(config)
+        app = create_app(test_config)
+        with app.app_context():
+            db.create_all()
+        return app
+    return factory
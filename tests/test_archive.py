@@ -0,0 +1,86 @@
+import json
+
+from sqlalchemy import text
+
+from ..bench.common import signup
+from ..extensions import db
+from ..models.archive_model import archive_rows, restore_rows
+
+DEADLINE = '2030-01-01T00:00:00'
+
+
+def counts(app, *tables):
+    with app.app_context():
+        return [db.session.execute(text(f'SELECT count(*) FROM "{table}"')).scalar() for table in tables]
+
+
+def task_ids(client, headers):
+    return sorted(task['id'] for task in json.loads(client.get('/get_tasks', headers=headers).json))
+
+
+def assignment_ids(client, headers):
+    return sorted(assignment['id'] for assignment in json.loads(client.get('/get_all_assignments', headers=headers).json))
+
+
+def test_archive_and_restore_round_trip(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+    client.post('/create_workbook', json={'title': 'workbook'}, headers=headers)
+    for deadline in ('2020-01-01T00:00:00', DEADLINE, '2031-01-01T00:00:00'):
+        client.post('/add_assignment', json={
+            'workbook_id': 1, 'deadline': deadline, 'add_type': 'new',
+            'supplementary': 'review', 'assignment_page_ranges': [{'start': 1, 'end': 5}],
+        }, headers=headers)
+    for i in range(3):
+        client.post('/create_task', json={'title': f'task {i}', 'deadline': DEADLINE}, headers=headers)
+    client.post('/delete_task', json={'task_id': 1}, headers=headers)
+    client.post('/delete_assignment', json={'assignment_id': 2}, headers=headers)
+
+    with app.app_context():
+        # 締め切りを大きく過ぎた課題 1 と、削除した課題 2・タスク 1 を移す
+        assert archive_rows(batch_size=1) == {'task': 1, 'assignment': 2, 'page': 0, 'page_range': 0}
+    assert counts(app, 'task', 'archived_task', 'assignment', 'archived_assignment') == [2, 1, 1, 2]
+    assert assignment_ids(client, headers) == [3]
+    assert client.get('/search', query_string={'q': 'review'}, headers=headers).json['results'] == [
+        {'type': 'assignment', 'id': 3, 'snippet': 'review', 'workbook_id': 1, 'workbook_title': 'workbook', 'deadline': '2031-01-01T00:00:00'},
+    ]
+
+    with app.app_context():
+        assert restore_rows('assignment', [1, 99]) == ([1], [])
+        assert restore_rows('task', [1]) == ([1], [])
+        # 戻した行は、削除済みや締め切り切れのままでも再びアーカイブしない
+        assert archive_rows() == {'task': 0, 'assignment': 0, 'page': 0, 'page_range': 0}
+    assert counts(app, 'task', 'archived_task', 'assignment', 'archived_assignment') == [3, 0, 2, 1]
+    # 課題一覧のキャッシュと検索の索引にも戻る
+    assert assignment_ids(client, headers) == [1, 3]
+    assert sorted(result['id'] for result in client.get('/search', query_string={'q': 'review'}, headers=headers).json['results']) == [1, 3]
+    assert task_ids(client, headers) == [2, 3]
+
+
+def test_restore_skips_rows_that_conflict_with_existing_rows(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+    client.post('/create_workbook', json={'title': 'workbook'}, headers=headers)
+    client.post('/add_completed_page_ranges', json={'workbook_id': 1, 'completed_ranges': [[1, 4]]}, headers=headers)
+    with app.app_context():
+        db.session.execute(text('UPDATE page SET is_deleted = 1 WHERE number IN (2, 3)'))
+        db.session.commit()
+        assert archive_rows()['page'] == 2
+
+    # 同じ番号のページを作り直したため、ページ 2 は一意制約 (number, workbook_id) と重なる
+    client.post('/add_completed_page_ranges', json={'workbook_id': 1, 'completed_ranges': [[2, 2]]}, headers=headers)
+
+    # flask コマンドと同じく、アプリケーションコンテキストの中で実行する
+    with app.app_context():
+        result = app.test_cli_runner().invoke(args=['restore-rows', '--type', 'page', '--id', '2', '--id', '3', '--id', '99'])
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == [
+        'Restored 1 page rows.',
+        'Not restored (a row with the same key already exists): 2.',
+        'Not found in the archive: 99.',
+    ]
+    with app.app_context():
+        assert db.session.execute(text('SELECT id, number FROM page ORDER BY id')).all() == [(1, 1), (3, 3), (4, 4), (5, 2)]
+        assert db.session.execute(text('SELECT id FROM archived_page')).scalars().all() == [2]
@@ -0,0 +1,127 @@
+from sqlalchemy import update
+
+from ..bench.common import signup
+from ..extensions import db
+from ..models import assignment_model
+from ..models.assignment_model import Assignment
+
+DEADLINE = '2030-01-01T00:00:00'
+
+
+def create_assignment(client, headers, workbook_id=1):
+    client.post('/create_workbook', json={'title': 'workbook'}, headers=headers)
+    client.post('/add_assignment', json={
+        'workbook_id': workbook_id, 'deadline': DEADLINE, 'add_type': 'new',
+        'supplementary': 'first', 'assignment_page_ranges': [{'start': 1, 'end': 10}],
+    }, headers=headers)
+
+
+def update_concurrently(assignment_id, supplementary):
+    """別の接続で課題を更新し、他のリクエストが先にコミットした状態を作る。"""
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(Assignment)
+            .where(Assignment.id == assignment_id)
+            .values(supplementary=supplementary, version=Assignment.version + 1)
+        )
+
+
+def get_assignment(app, assignment_id):
+    with app.app_context():
+        assignment = db.session.get(Assignment, assignment_id)
+        return assignment.supplementary, assignment.page_ranges, assignment.version
+
+
+def test_merge_with_stale_version_returns_current_state(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+    create_assignment(client, headers)
+    version = get_assignment(app, 1)[2]
+
+    response = client.post('/merge_assignment', json={
+        'workbook_id': 1, 'merge_target_assignment_id': 1, 'supplementary': 'second',
+        'assignment_page_ranges': [{'start': 11, 'end': 20}], 'version': version,
+    }, headers=headers)
+    assert response.status_code == 200
+
+    response = client.post('/merge_assignment', json={
+        'workbook_id': 1, 'merge_target_assignment_id': 1, 'supplementary': 'stale', 'version': version,
+    }, headers=headers)
+    assert response.status_code == 409
+    assert response.json['current']['version'] == version + 1
+    assert response.json['current']['supplementary'] == 'first\nsecond'
+    assert get_assignment(app, 1)[0] == 'first\nsecond'
+
+
+def test_merge_retries_after_concurrent_update(make_app, monkeypatch):
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+    create_assignment(client, headers)
+    version = get_assignment(app, 1)[2]
+
+    mark_plan_stale = assignment_model.mark_plan_stale
+    calls = []
+
+    def interleaved_mark_plan_stale(user_id, assignment_ids=None, **kwargs):
+        # 1 回目の保存の直前にだけ、他のリクエストの更新を割り込ませる
+        if not calls:
+            update_concurrently(1, 'other')
+        calls.append(assignment_ids)
+        return mark_plan_stale(user_id, assignment_ids, **kwargs)
+
+    monkeypatch.setattr(assignment_model, 'mark_plan_stale', interleaved_mark_plan_stale)
+    response = client.post('/merge_assignment', json={
+        'workbook_id': 1, 'merge_target_assignment_id': 1, 'supplementary': 'merged',
+        'assignment_page_ranges': [{'start': 11, 'end': 20}],
+    }, headers=headers)
+
+    assert response.status_code == 200
+    assert len(calls) == 2
+    # 読み直した最新の値にマージされ、割り込んだ更新は失われない
+    assert get_assignment(app, 1) == ('other\nmerged', '[[1,20]]', version + 2)
+
+
+def test_merge_returns_conflict_when_retries_are_exhausted(make_app, monkeypatch):
+    app = make_app(OPTIMISTIC_RETRY_LIMIT=1)
+    client = app.test_client()
+    headers = signup(client)
+    create_assignment(client, headers)
+    version = get_assignment(app, 1)[2]
+
+    mark_plan_stale = assignment_model.mark_plan_stale
+
+    def always_interleaved_mark_plan_stale(user_id, assignment_ids=None, **kwargs):
+        update_concurrently(1, 'other')
+        return mark_plan_stale(user_id, assignment_ids, **kwargs)
+
+    monkeypatch.setattr(assignment_model, 'mark_plan_stale', always_interleaved_mark_plan_stale)
+    response = client.post('/merge_assignment', json={
+        'workbook_id': 1, 'merge_target_assignment_id': 1, 'supplementary': 'merged',
+    }, headers=headers)
+
+    assert response.status_code == 409
+    assert response.json['current']['id'] == 1
+    # 初回と 1 回のやり直しのどちらでも割り込まれた
+    assert response.json['current']['version'] == version + 2
+
+
+def test_merge_into_other_users_assignment_is_not_found(make_app):
+    app = make_app()
+    client = app.test_client()
+    owner_headers = signup(client, 'owner', 'Owner#123')
+    create_assignment(client, owner_headers)
+    before = get_assignment(app, 1)
+    other_headers = signup(client, 'other', 'Other#123')
+    client.post('/create_workbook', json={'title': 'other workbook'}, headers=other_headers)
+
+    # 自分のワークブックの ID と、他のユーザーの課題の ID を組み合わせる
+    response = client.post('/merge_assignment', json={
+        'workbook_id': 2, 'merge_target_assignment_id': 1, 'supplementary': 'injected',
+        'assignment_page_ranges': [{'start': 100, 'end': 200}],
+    }, headers=other_headers)
+
+    assert response.status_code == 404
+    assert 'current' not in response.json
+    assert get_assignment(app, 1) == before
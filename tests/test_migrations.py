@@ -0,0 +1,81 @@
+import os
+
+from flask_migrate import downgrade, upgrade
+from sqlalchemy import inspect, text
+
+from .. import create_app
+from ..extensions import db
+
+
+def make_unmigrated_app(tmp_path, name):
+    return create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp_path, name),
+        'RESPONSE_CACHE_ENABLED': False,
+    })
+
+
+def schema():
+    """テーブル・インデックス・トリガーと、各テーブルのカラムを返す。"""
+    objects = set(db.session.execute(text(
+        "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' AND name != 'alembic_version'"
+    )).all())
+    inspector = inspect(db.engine)
+    columns = {
+        # ALTER TABLE で追加したカラムは末尾に並ぶため、順序は比べない
+        table: sorted((column['name'], str(column['type']), column['nullable']) for column in inspector.get_columns(table))
+        for table in inspector.get_table_names() if table != 'alembic_version'
+    }
+    return objects, columns
+
+
+def test_upgrade_matches_models(tmp_path):
+    migrated = make_unmigrated_app(tmp_path, 'migrated.sqlite')
+    with migrated.app_context():
+        upgrade()
+        migrated_schema = schema()
+
+    created = make_unmigrated_app(tmp_path, 'created.sqlite')
+    with created.app_context():
+        db.create_all()
+        created_schema = schema()
+        # create_all で作成したデータベースにも、作成済みのものを飛ばして適用できる
+        upgrade()
+        assert schema() == created_schema
+
+    assert migrated_schema == created_schema
+
+
+def test_upgrade_keeps_baseline_data(tmp_path):
+    app = make_unmigrated_app(tmp_path, 'baseline.sqlite')
+    with app.app_context():
+        upgrade(revision='0001')
+        db.session.execute(text(
+            "INSERT INTO user (id, username, password, is_deleted) VALUES (1, 'alice', 'x', 0);"
+        ))
+        db.session.execute(text("INSERT INTO workbook (id, title, user_id, is_deleted) VALUES (1, 'English', 1, 0)"))
+        db.session.execute(text("INSERT INTO task (id, title, supplementary, user_id, is_deleted) VALUES (1, 'vocabulary', NULL, 1, 0)"))
+        db.session.execute(text("INSERT INTO assignment (id, workbook_id, supplementary, is_deleted) VALUES (1, 1, 'grammar', 0)"))
+        db.session.commit()
+
+        upgrade()
+        assert db.session.execute(text('SELECT page_ranges, version FROM assignment')).all() == [('[]', 1)]
+        assert db.session.execute(text('SELECT daily_capacity FROM user')).scalar() == 20
+        # 既存の行も検索インデックスに登録される
+        assert db.session.execute(text(
+            "SELECT item_type, item_id, user_id FROM search_index WHERE search_index MATCH 'vocabulary'"
+        )).all() == [('task', 1, 1)]
+
+    client = app.test_client()
+    response = client.post('/signup', json={'username': 'bob', 'password': 'Bench#123', 'checkPassword': 'Bench#123'})
+    assert response.status_code == 200
+
+
+def test_downgrade_to_base(tmp_path):
+    app = make_unmigrated_app(tmp_path, 'downgrade.sqlite')
+    with app.app_context():
+        upgrade()
+        downgrade(revision='base')
+        assert schema() == (set(), {})
+        upgrade()
+        assert inspect(db.engine).has_table('archive_exemption')
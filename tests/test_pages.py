@@ -0,0 +1,34 @@
+import sqlite3
+
+from sqlalchemy import event
+
+from ..bench.common import signup
+from ..extensions import db
+from ..models.page_model import Page
+
+
+def test_completed_pages_within_sqlite_parameter_limit(make_app):
+    app = make_app()
+    with app.app_context():
+        # 古い SQLite の既定値（999）に合わせて、接続ごとのホストパラメータ数の上限を下げる
+        def limit_variables(dbapi_connection, connection_record):
+            dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        event.listen(db.engine, 'connect', limit_variables)
+        db.engine.dispose()
+
+    client = app.test_client()
+    headers = signup(client)
+    client.post('/create_workbook', json={'title': 'workbook'}, headers=headers)
+
+    # 既存のページの更新と新しいページの追加が、どちらも上限を超える件数になる
+    response = client.post('/add_completed_page_ranges', json={
+        'workbook_id': 1, 'completed_ranges': [[1, 1500]],
+    }, headers=headers)
+    assert response.status_code == 200
+    response = client.post('/add_completed_page_ranges', json={
+        'workbook_id': 1, 'completed_ranges': [[1, 3000]],
+    }, headers=headers)
+    assert response.status_code == 200
+
+    with app.app_context():
+        assert db.session.query(Page).filter_by(workbook_id=1, completed=True).count() == 3000
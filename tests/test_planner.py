@@ -0,0 +1,81 @@
+from datetime import datetime, time, timedelta
+
+from ..bench.common import signup
+from ..utils.planner import allocate, allocate_within, split_ranges, subtract_ranges
+from ..utils.util import get_now_tokyo_time
+
+
+def test_split_ranges():
+    assert split_ranges([[1, 5], [8, 9]], [3, 4]) == [[[1, 3]], [[4, 5], [8, 9]]]
+    assert split_ranges([[1, 4]], [2, 0, 2]) == [[[1, 2]], [], [[3, 4]]]
+
+
+def test_subtract_ranges():
+    assert subtract_ranges([[1, 10]], [[3, 4], [8, 12]]) == [[1, 2], [5, 7]]
+    assert subtract_ranges([[1, 3], [5, 9]], [[1, 3]]) == [[5, 9]]
+    assert subtract_ranges([[1, 3]], []) == [[1, 3]]
+
+
+def test_allocate_within_levels_the_free_capacity():
+    assert allocate_within(10, [5, 5, 5]) == [4, 3, 3]
+    # 空きの少ない日は空きの分だけ使い、残りを他の日に均等に割り振る
+    assert allocate_within(10, [1, 10, 10]) == [1, 5, 4]
+    assert allocate_within(0, [3, 3]) == [0, 0]
+    assert allocate_within(7, [3, 3]) is None
+
+
+def test_allocate_spreads_pages_evenly_until_the_deadline():
+    days, totals = allocate([('a', [[1, 10]], 4)], capacity=100)
+    assert totals == [2, 2, 2, 2, 2]
+    assert days[0] == [('a', 2, [[1, 2]])]
+    assert days[4] == [('a', 2, [[9, 10]])]
+
+
+def test_allocate_moves_overflow_within_capacity():
+    # a は今日中に、b は 3 日で終える必要がある。今日の超過分は b の割り当てから翌日へ送る
+    days, totals = allocate([('a', [[1, 8]], 0), ('b', [[1, 6]], 2)], capacity=8)
+    assert totals == [8, 4, 2]
+    assert days[0] == [('a', 8, [[1, 8]])]
+    assert days[1] == [('b', 4, [[1, 4]])]
+
+    # 締め切りに余裕のある c の分は、容量を超える最終日から前の日へ前倒しする
+    days, totals = allocate([('c', [[1, 9]], 2), ('d', [[1, 6]], 2)], capacity=5)
+    assert totals == [5, 5, 5]
+    assert sum(pages for day in days for key, pages, _ in day if key == 'c') == 9
+
+
+def test_allocate_puts_overdue_pages_on_today():
+    days, totals = allocate([('late', [[1, 30]], -3)], capacity=10)
+    assert totals == [30]
+    assert days == [[('late', 30, [[1, 30]])]]
+
+
+def deadline_after(days):
+    today = get_now_tokyo_time().date()
+    return datetime.combine(today + timedelta(days=days), time()).isoformat()
+
+
+def test_daily_plan_endpoint(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+    client.post('/create_workbook', json={'title': 'workbook'}, headers=headers)
+    # 0 時の締め切りは前日までに終える。今日から 2 日間で 20 ページ
+    client.post('/add_assignment', json={
+        'workbook_id': 1, 'deadline': deadline_after(2), 'add_type': 'new',
+        'supplementary': '', 'assignment_page_ranges': [{'start': 1, 'end': 20}],
+    }, headers=headers)
+    client.post('/add_completed_page_ranges', json={'workbook_id': 1, 'completed_ranges': [[1, 4]]}, headers=headers)
+
+    plan = client.get('/get_daily_plan', headers=headers).json
+    assert plan['feasible']
+    assert [day['total_pages'] for day in plan['days']] == [8, 8]
+    assert plan['days'][0]['assignments'][0]['page_ranges'] == [[5, 12]]
+
+    # 保存した容量と異なる容量はその場で計算する
+    plan = client.get('/get_daily_plan', query_string={'capacity': 5}, headers=headers).json
+    assert not plan['feasible']
+    assert plan['daily_capacity'] == 5
+
+    assert client.get('/get_daily_plan', query_string={'capacity': 'many'}, headers=headers).status_code == 400
+    assert client.get('/get_daily_plan', query_string={'capacity': 0}, headers=headers).status_code == 400
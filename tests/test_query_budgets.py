@@ -0,0 +1,55 @@
+import pytest
+
+from ..bench.common import signup
+from ..bench.query_budgets import build_requests, seed
+from ..utils.query_budget import QueryBudgetExceeded, assert_query_budget
+
+# (ワークブック数, 課題あたりの範囲数, 完了済みの課題数)
+TIERS = {
+    'small': (2, 1, 0),
+    'large': (20, 5, 0),
+    # /upcoming が完了済みの課題を読み飛ばす場合
+    'many_completed_assignments': (4, 1, 40),
+}
+
+
+@pytest.mark.parametrize('tier', TIERS)
+def test_endpoints_stay_within_query_budget(make_app, tier):
+    workbooks, ranges_per_assignment, completed_assignments = TIERS[tier]
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+    seed(client, headers, workbooks, ranges_per_assignment, completed_assignments)
+
+    failures = []
+    for method, path, kwargs in build_requests(workbooks):
+        try:
+            response = assert_query_budget(client, method, path, headers=headers, **kwargs)
+        except QueryBudgetExceeded as e:
+            failures.append(str(e))
+            continue
+        assert response.status_code < 500, f'{method} {path} returned {response.status_code}'
+    assert not failures, '\n'.join(failures)
+
+
+def test_upcoming_skips_completed_assignments_within_budget(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+    seed(client, headers, 4, 1, 40)
+
+    for limit in (1, 2, 10):
+        response = assert_query_budget(client, 'GET', f'/upcoming?limit={limit}', headers=headers)
+        assignments = [item for item in response.json if item['type'] == 'assignment']
+        assert all(item['incomplete_page_ranges'] for item in assignments)
+        # 4 件のタスクと、ページが残る 4 件の課題
+        assert len(response.json) == min(limit, 8)
+
+
+def test_assert_query_budget_reports_exceeded_budget(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+
+    with pytest.raises(QueryBudgetExceeded):
+        assert_query_budget(client, 'GET', '/get_tasks', max_queries=0, headers=headers)
@@ -0,0 +1,177 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from ..bench.common import signup
+from ..extensions import reminders
+from ..models.revoked_token_model import REVOKED_TOKEN_ENDPOINT, get_revocation_filter
+from ..utils import reminders as reminders_module
+from ..utils.invalidation_bus import InvalidationBus
+from ..utils.reminders import REMINDER_CHANNEL
+
+TICK_SECONDS = 60
+# tick の境界から 30 秒ずらした時刻
+START = datetime(2029, 12, 1, 0, 0, 30, tzinfo=timezone.utc)
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """スケジューラが参照する現在時刻を固定し、テストから進められるようにする。"""
+    clock = Clock(START)
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock.now.astimezone(tz)
+
+    monkeypatch.setattr(reminders_module, 'time', SimpleNamespace(time=lambda: clock.now.timestamp()))
+    monkeypatch.setattr(reminders_module, 'datetime', FakeDatetime)
+    return clock
+
+
+@pytest.fixture
+def reminder_app(make_app, tmp_path):
+    notifications = []
+    app = make_app(
+        REMINDERS_ENABLED=True,
+        REMINDER_SINK=notifications.append,
+        REMINDER_TICK_SECONDS=TICK_SECONDS,
+        REMINDER_DUE_SOON_SECONDS=60 * 60,
+        REMINDER_LOCK_PATH=os.path.join(tmp_path, 'reminders.lock'),
+        INVALIDATION_BUS_PATH=os.path.join(tmp_path, 'invalidation.sqlite'),
+        INVALIDATION_BUS_POLL_INTERVAL=0,
+    )
+    yield app, notifications
+    # 最初のリクエストで起動したスレッドを止め、次のテストで状態を作り直す
+    reminders.stop()
+
+
+def create_task(client, headers, deadline):
+    client.post('/create_task', json={'title': 'report', 'deadline': deadline.isoformat()}, headers=headers)
+
+
+def kinds(notifications):
+    return [(notification['type'], notification['id'], notification['kind']) for notification in notifications]
+
+
+def test_reminders_fire_once_per_deadline(reminder_app, clock):
+    app, notifications = reminder_app
+    client = app.test_client()
+    headers = signup(client)
+    deadline = START + timedelta(hours=2)
+    create_task(client, headers, deadline)
+
+    reminders.tick()
+    assert notifications == []
+
+    clock.advance(hours=1, minutes=1)
+    reminders.tick()
+    assert kinds(notifications) == [('task', 1, 'due_soon')]
+
+    # 読み直しで同じ項目を登録し直しても、送った通知は再送しない
+    reminders.user_changed(1)
+    reminders.tick()
+    clock.advance(minutes=1)
+    reminders.tick()
+    assert kinds(notifications) == [('task', 1, 'due_soon')]
+
+    clock.now = deadline + timedelta(seconds=40)
+    reminders.tick()
+    assert kinds(notifications) == [('task', 1, 'due_soon'), ('task', 1, 'overdue')]
+
+    # 締め切り直後の読み直しは、直前の tick 以降に締め切りを過ぎた項目も読み込む
+    reminders.user_changed(1)
+    reminders.tick()
+    clock.advance(minutes=1)
+    reminders.tick()
+    assert kinds(notifications) == [('task', 1, 'due_soon'), ('task', 1, 'overdue')]
+
+
+def test_reopened_task_is_not_notified_again(reminder_app, clock):
+    app, notifications = reminder_app
+    client = app.test_client()
+    headers = signup(client)
+    deadline = START + timedelta(hours=2)
+    create_task(client, headers, deadline)
+
+    reminders.tick()
+    clock.advance(hours=1, minutes=1)
+    reminders.tick()
+    assert kinds(notifications) == [('task', 1, 'due_soon')]
+
+    # 完了にすると登録を取り消し、未完了に戻すと同じ締め切りで登録し直す
+    client.post('/set_task_finish_state', json={'task_id': 1, 'completed': True}, headers=headers)
+    reminders.tick()
+    client.post('/set_task_finish_state', json={'task_id': 1, 'completed': False}, headers=headers)
+    reminders.tick()
+    clock.advance(minutes=1)
+    reminders.tick()
+    assert kinds(notifications) == [('task', 1, 'due_soon')]
+
+    clock.now = deadline + timedelta(minutes=1)
+    reminders.tick()
+    assert kinds(notifications) == [('task', 1, 'due_soon'), ('task', 1, 'overdue')]
+
+
+def test_tick_polls_bus_within_app_context(reminder_app, clock):
+    app, notifications = reminder_app
+    client = app.test_client()
+    headers = signup(client)
+    with app.app_context():
+        revocation_filter = get_revocation_filter()
+        revocation_filter.stale = False
+    reminders.tick()
+
+    # 他のワーカーがトークンを失効させ、課題を変更した
+    create_task(client, headers, clock.now + timedelta(minutes=5))
+    connection = sqlite3.connect(app.config['INVALIDATION_BUS_PATH'])
+    with connection:
+        connection.executemany(
+            'INSERT INTO cache_version (user_id, endpoint, seq) VALUES (?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM cache_version))',
+            [(1, REVOKED_TOKEN_ENDPOINT), (1, REMINDER_CHANNEL)],
+        )
+    connection.close()
+
+    # バックグラウンドスレッドと同じく、アプリケーションコンテキストの外から呼ぶ
+    reminders.tick()
+    clock.advance(minutes=6)
+    reminders.tick()
+
+    assert revocation_filter.stale
+    assert ('task', 1, 'overdue') in kinds(notifications)
+
+
+def test_bus_poll_continues_after_failing_subscriber(make_app, tmp_path):
+    app = make_app()
+    bus = InvalidationBus()
+    app.config.update(INVALIDATION_BUS_PATH=os.path.join(tmp_path, 'bus.sqlite'), INVALIDATION_BUS_POLL_INTERVAL=0)
+    bus.init_app(app)
+    received = []
+
+    def failing(user_id, endpoint):
+        raise RuntimeError('subscriber failed')
+
+    bus.subscribe(failing)
+    bus.subscribe(lambda user_id, endpoint: received.append((user_id, endpoint)))
+
+    other_worker = InvalidationBus()
+    other_worker.init_app(app)
+    other_worker.publish(1, 'a', 'b')
+    other_worker.publish(2, 'a')
+
+    bus.poll()
+    assert sorted(received) == [(1, 'a'), (1, 'b'), (2, 'a')]
+    # 読み込んだ位置は進んでいるため、同じ通知を再び渡さない
+    bus.poll(force=True)
+    assert len(received) == 3
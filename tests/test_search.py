@@ -0,0 +1,83 @@
+from sqlalchemy import text
+
+from ..bench.common import signup
+from ..extensions import db
+from ..models.search_model import OWNER_TABLE, SEARCH_TABLE, create_search_index
+
+DEADLINE = '2030-01-01T00:00:00'
+
+
+def search(client, headers, q):
+    response = client.get('/search', query_string={'q': q}, headers=headers)
+    assert response.status_code == 200
+    return [(result['type'], result['id']) for result in response.json['results']]
+
+
+def index_rows(app):
+    with app.app_context():
+        return db.session.execute(text(
+            f'SELECT s.item_type, s.item_id, s.user_id, o.user_id FROM {SEARCH_TABLE} s '
+            f'JOIN {OWNER_TABLE} o ON o.id = s.rowid ORDER BY s.rowid'
+        )).all()
+
+
+def test_search_index_follows_writes(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+    client.post('/create_task', json={'title': 'Physics homework', 'deadline': DEADLINE}, headers=headers)
+    client.post('/create_workbook', json={'title': '数学ドリル'}, headers=headers)
+    client.post('/add_assignment', json={
+        'workbook_id': 1, 'deadline': DEADLINE, 'add_type': 'new',
+        'supplementary': 'chapter review', 'assignment_page_ranges': [{'start': 1, 'end': 5}],
+    }, headers=headers)
+
+    assert search(client, headers, 'homework') == [('task', 1)]
+    assert search(client, headers, 'ドリル') == [('workbook', 1)]
+    # trigram で MATCH できない 2 文字の語は LIKE で絞り込む
+    assert search(client, headers, '数学') == [('workbook', 1)]
+
+    # 補足の更新は古い本文を消して新しい本文を登録する
+    client.post('/merge_assignment', json={
+        'workbook_id': 1, 'merge_target_assignment_id': 1, 'supplementary': 'exam prep',
+    }, headers=headers)
+    assert search(client, headers, 'exam') == [('assignment', 1)]
+    assert search(client, headers, 'chapter exam') == [('assignment', 1)]
+
+    # 論理削除した行は索引から外れる
+    client.post('/delete_task', json={'task_id': 1}, headers=headers)
+    assert search(client, headers, 'homework') == []
+    assert {(item_type, item_id) for item_type, item_id, _, _ in index_rows(app)} == {('workbook', 1), ('assignment', 1)}
+
+
+def test_search_is_restricted_to_own_rows(make_app):
+    app = make_app()
+    client = app.test_client()
+    owner_headers = signup(client, 'owner', 'Owner#123')
+    other_headers = signup(client, 'other', 'Other#123')
+    client.post('/create_task', json={'title': 'shared plan 英語', 'deadline': DEADLINE}, headers=owner_headers)
+    client.post('/create_task', json={'title': 'shared plan 英語', 'deadline': DEADLINE}, headers=other_headers)
+
+    assert search(client, owner_headers, 'shared') == [('task', 1)]
+    assert search(client, other_headers, 'shared') == [('task', 2)]
+    assert search(client, owner_headers, '英語') == [('task', 1)]
+    assert search(client, other_headers, '英語') == [('task', 2)]
+    # 索引とユーザーごとの rowid のテーブルは同じ所有者を持つ
+    assert all(index_user == owner_user for _, _, index_user, owner_user in index_rows(app))
+
+
+def test_create_search_index_rebuilds_index_without_owner_table(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+    client.post('/create_task', json={'title': '英語 reading', 'deadline': DEADLINE}, headers=headers)
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text(f'DROP TABLE {OWNER_TABLE}'))
+            assert create_search_index(connection)
+            # 作成済みの場合は何もしない
+            assert not create_search_index(connection)
+
+    assert index_rows(app) == [('task', 1, 1, 1)]
+    assert search(client, headers, '英語') == [('task', 1)]
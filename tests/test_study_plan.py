@@ -0,0 +1,87 @@
+from datetime import datetime, time, timedelta
+
+from ..bench.common import signup
+from ..extensions import db
+from ..models import plan_model
+from ..models.assignment_model import Assignment
+from ..models.study_plan_model import StudyPlanDirty
+from ..utils.util import get_now_tokyo_time
+
+
+def deadline_after(days):
+    today = get_now_tokyo_time().date()
+    return datetime.combine(today + timedelta(days=days), time()).isoformat()
+
+
+def add_assignment(client, headers, days, ranges, workbook_id=1):
+    return client.post('/add_assignment', json={
+        'workbook_id': workbook_id, 'deadline': deadline_after(days), 'add_type': 'new',
+        'supplementary': '', 'assignment_page_ranges': ranges,
+    }, headers=headers)
+
+
+def plan_ranges(plan):
+    return [
+        [(item['assignment_id'], item['page_ranges']) for item in day['assignments']]
+        for day in plan['days']
+    ]
+
+
+def test_add_assignment_commits_once_and_rejects_invalid_ranges(make_app):
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+    client.post('/create_workbook', json={'title': 'workbook'}, headers=headers)
+
+    assert add_assignment(client, headers, 3, [{'start': 1, 'end': 10}]).status_code == 200
+    response = add_assignment(client, headers, 4, [{'start': 10, 'end': 1}])
+    assert response.status_code == 400
+
+    with app.app_context():
+        assignments = db.session.query(Assignment).all()
+        # 課題とページ範囲は 1 回の INSERT で保存され、範囲が不正な課題は追加されない
+        assert [(a.page_ranges, a.version) for a in assignments] == [('[[1,10]]', 1)]
+
+
+def test_plan_updates_only_changed_assignments(make_app, monkeypatch):
+    app = make_app()
+    client = app.test_client()
+    headers = signup(client)
+    client.post('/create_workbook', json={'title': 'workbook'}, headers=headers)
+    client.post('/create_workbook', json={'title': 'other workbook'}, headers=headers)
+    add_assignment(client, headers, 2, [{'start': 1, 'end': 10}])
+    add_assignment(client, headers, 3, [{'start': 101, 'end': 106}], workbook_id=2)
+
+    # 最初の読み込みで計画を保存する
+    plan = client.get('/get_daily_plan', headers=headers).json
+    assert plan_ranges(plan) == [
+        [(1, [[1, 5]]), (2, [[101, 102]])],
+        [(1, [[6, 10]]), (2, [[103, 104]])],
+        [(2, [[105, 106]])],
+    ]
+
+    rebuilds = []
+    rebuild_study_plan = plan_model.rebuild_study_plan
+    monkeypatch.setattr(plan_model, 'rebuild_study_plan', lambda *args: rebuilds.append(args) or rebuild_study_plan(*args))
+
+    # ワークブック 1 のページを終えると課題 1 だけが通知され、今日の割り当ては変えずに残りを割り当て直す
+    client.post('/add_completed_page_ranges', json={'workbook_id': 1, 'completed_ranges': [[6, 8]]}, headers=headers)
+    with app.app_context():
+        assert [row.assignment_id for row in db.session.query(StudyPlanDirty)] == [1]
+
+    plan = client.get('/get_daily_plan', headers=headers).json
+    assert plan_ranges(plan) == [
+        [(1, [[1, 5]]), (2, [[101, 102]])],
+        [(1, [[9, 10]]), (2, [[103, 104]])],
+        [(2, [[105, 106]])],
+    ]
+    assert not rebuilds
+    with app.app_context():
+        assert db.session.query(StudyPlanDirty).count() == 0
+
+    # 容量を変えた場合は全体を作り直す
+    client.post('/set_daily_capacity', json={'daily_capacity': 7}, headers=headers)
+    plan = client.get('/get_daily_plan', headers=headers).json
+    assert rebuilds
+    assert plan['feasible']
+    assert all(day['total_pages'] <= 7 for day in plan['days'])
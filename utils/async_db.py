@@ -0,0 +1,55 @@
+"""
+ASGI モード（asgi.py）で使う非同期データベースセッション。
+SQLALCHEMY_DATABASE_URI から非同期ドライバの URI（sqlite -> sqlite+aiosqlite）を導出し、
+最初に使われたときにエンジンを作成します。同期モードではドライバを読み込みません。
+"""
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+
+def get_async_database_uri(database_uri):
+    scheme, separator, rest = database_uri.partition('://')
+    driver = ASYNC_DRIVERS.get(scheme.split('+')[0])
+    if not separator or driver is None:
+        raise ValueError(f'No async driver is known for {scheme}.')
+    return f'{driver}://{rest}'
+
+
+class AsyncDatabase:
+    def __init__(self):
+        self.uri = None
+        self.engine_options = {}
+        self._engine = None
+        self._sessionmaker = None
+
+    def init_app(self, app):
+        self.uri = app.config.get('SQLALCHEMY_ASYNC_DATABASE_URI') or get_async_database_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+        self.engine_options = app.config.get('SQLALCHEMY_ASYNC_ENGINE_OPTIONS', {})
+        self._engine = None
+        self._sessionmaker = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            self._engine = create_async_engine(self.uri, **self.engine_options)
+        return self._engine
+
+    def session(self):
+        """
+        async with async_db.session() as session: の形で使う AsyncSession を返す。
+        """
+        if self._sessionmaker is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+            self._sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        return self._sessionmaker()
+
+    async def dispose(self):
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+            self._sessionmaker = None
@@ -0,0 +1,146 @@
+"""
+ワーカープロセス間のキャッシュ無効化バス。
+SQLite ファイル上のバージョンテーブルに (user_id, endpoint) ごとの世代番号を書き込み、
+各ワーカーはリクエストの前にそれをポーリングして、他のワーカーが行った書き込みを
+自身のキャッシュに反映します。
+ポーリングはまず PRAGMA data_version を確認し、他の接続からのコミットがあった場合にだけ
+テーブルを読むため、変更が無いときのコストは 1 ステートメントです。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_POLL_INTERVAL = 0.2
+
+CREATE_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS cache_version (
+    user_id INTEGER NOT NULL,
+    endpoint TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (user_id, endpoint)
+)
+'''
+CREATE_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS ix_cache_version_seq ON cache_version (seq)'
+
+
+class InvalidationBus:
+    def __init__(self):
+        self.path = None
+        self.enabled = False
+        self.poll_interval = DEFAULT_POLL_INTERVAL
+        self._subscribers = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self._last_poll = 0.0
+        self._own_seqs = set()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('INVALIDATION_BUS_ENABLED', True)
+        self.path = app.config.get('INVALIDATION_BUS_PATH') or os.path.join(app.instance_path, 'invalidation.sqlite')
+        self.poll_interval = app.config.get('INVALIDATION_BUS_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        self._local = threading.local()
+        self._own_seqs = set()
+
+        if not self.enabled:
+            return
+
+        connection = self._connection()
+        connection.execute(CREATE_TABLE_SQL)
+        connection.execute(CREATE_INDEX_SQL)
+
+        # 起動前の書き込みは反映済みとみなす
+        self._last_seq = self._max_seq(connection)
+        self._last_poll = time.monotonic()
+        app.before_request(self.poll)
+
+    def subscribe(self, callback):
+        """callback(user_id, *endpoints) を他のワーカーからの無効化通知の受け取り先として登録する。"""
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def publish(self, user_id, *endpoints):
+        """他のワーカーに (user_id, endpoint) の無効化を通知する。"""
+        if not self.enabled or not endpoints:
+            return
+
+        connection = self._connection()
+        try:
+            # seq の採番を直列化するため、書き込みロックを先に取る
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                seq = self._max_seq(connection) + 1
+                connection.executemany(
+                    'INSERT INTO cache_version (user_id, endpoint, seq) VALUES (?, ?, ?) '
+                    'ON CONFLICT (user_id, endpoint) DO UPDATE SET seq = excluded.seq',
+                    [(user_id, endpoint, seq) for endpoint in endpoints]
+                )
+                connection.execute('COMMIT')
+            except sqlite3.Error:
+                connection.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            print(f'utils.invalidation_bus.publish Error: {e}')
+            return
+
+        # 自分の通知はローカルで反映済みなので、ポーリング時に読み飛ばす
+        with self._lock:
+            self._own_seqs.add(seq)
+
+    def poll(self, force=False):
+        """
+        他のワーカーの書き込みを確認し、購読者に通知する。
+        poll_interval 未満の間隔での呼び出しは何もしない。
+        """
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+
+        connection = self._connection()
+        try:
+            data_version = connection.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == getattr(self._local, 'data_version', None):
+                return
+            self._local.data_version = data_version
+
+            with self._lock:
+                rows = connection.execute(
+                    'SELECT user_id, endpoint, seq FROM cache_version WHERE seq > ? ORDER BY seq',
+                    (self._last_seq,)
+                ).fetchall()
+                if rows:
+                    self._last_seq = rows[-1][2]
+                rows = [row for row in rows if row[2] not in self._own_seqs]
+                self._own_seqs = {seq for seq in self._own_seqs if seq > self._last_seq}
+        except sqlite3.Error as e:
+            print(f'utils.invalidation_bus.poll Error: {e}')
+            return
+
+        # 読み込んだ位置は進めてあるため、失敗した購読者があっても他の購読者と残りの通知は処理する
+        for user_id, endpoint, _ in rows:
+            for callback in self._subscribers:
+                try:
+                    callback(user_id, endpoint)
+                except Exception as e:
+                    print(f'utils.invalidation_bus.poll callback Error: {e}')
+
+    def _connection(self):
+        # 接続はスレッドごと・プロセスごとに作成する（fork 後に共有しない）
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.data_version = None
+        return connection
+
+    @staticmethod
+    def _max_seq(connection):
+        return connection.execute('SELECT COALESCE(MAX(seq), 0) FROM cache_version').fetchone()[0]
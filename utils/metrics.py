@@ -0,0 +1,218 @@
+"""
+エンドポイントごとのメトリクス。
+リクエスト数、レイテンシ、レスポンスサイズ、ステータスコード、および 1 リクエストあたりの
+SQL 文の数と合計時間（SQLAlchemy のエンジンイベントで収集）を記録し、
+/metrics で Prometheus のテキスト形式として出力します。
+
+カウンタはスレッドごとの辞書に記録し、記録時にはそのスレッド専用のロック（競合しない）だけを取ります。
+集計はスクレイプ時にだけ行い、各スレッドの値はそのロックの下でコピーしてから合算します。
+終了したスレッドの値はその時点で合算して破棄します。
+
+レジストリはプロセスごとに持ちます。server.py や uvicorn の --workers で複数のワーカーを
+起動した場合、/metrics はリクエストを受けたワーカー 1 つ分の値しか返しません。
+全体の値が必要な場合はワーカーを 1 つにするか、ワーカーごとにスクレイプして Prometheus 側で合算してください。
+"""
+
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+# 終了したスレッドのカウンタを合算する目安の件数
+MAX_SHARDS = 256
+
+METRIC_HELP = {
+    'allocaide_http_requests_total': ('counter', 'Requests by endpoint, method and status code.'),
+    'allocaide_http_request_duration_seconds': ('histogram', 'Request latency.'),
+    'allocaide_http_response_size_bytes': ('histogram', 'Response body size.'),
+    'allocaide_sql_statements_per_request': ('histogram', 'SQL statements executed per request.'),
+    'allocaide_sql_duration_seconds_per_request': ('histogram', 'Total SQL time per request.'),
+}
+
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        # (name, labels) -> [bucket counts..., sum, count]
+        self.histograms = {}
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self._local = threading.local()
+        self._shards = []  # (weakref(thread), _Shard)
+        self._retired = _Shard()
+        self._collect_lock = threading.Lock()
+        self._buckets = {}
+        self._extra_collectors = []
+
+    def init_app(self, app, db):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if not self.enabled:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def add_collector(self, collector):
+        """スクレイプ時に呼ばれ、(name, type, help, [(labels, value), ...]) のリストを返す関数を登録する。"""
+        if collector not in self._extra_collectors:
+            self._extra_collectors.append(collector)
+
+    def inc(self, name, labels, value=1):
+        shard = self._shard()
+        with shard.lock:
+            shard.counters[(name, labels)] += value
+
+    def observe(self, name, labels, value, buckets):
+        shard = self._shard()
+        key = (name, labels)
+        with shard.lock:
+            histogram = shard.histograms.get(key)
+            if histogram is None:
+                self._buckets[name] = buckets
+                histogram = shard.histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def render(self):
+        """全スレッドの値を合算し、Prometheus のテキスト形式で返す。"""
+        counters, histograms = self._collect()
+        lines = []
+        written_headers = set()
+
+        def header(name):
+            if name in written_headers:
+                return
+            written_headers.add(name)
+            metric_type, help_text = METRIC_HELP.get(name, ('untyped', name))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name)
+            lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+
+        for (name, labels), histogram in sorted(histograms.items()):
+            header(name)
+            cumulative = 0
+            for bound, count in zip(self._buckets[name], histogram):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", format_value(bound)),))} {cumulative}')
+            lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {histogram[-1]}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(histogram[-2])}')
+            lines.append(f'{name}_count{format_labels(labels)} {histogram[-1]}')
+
+        for collector in self._extra_collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            # list.append はアトミックなのでロックは不要
+            self._shards.append((weakref.ref(threading.current_thread()), shard))
+            if len(self._shards) > MAX_SHARDS:
+                self._collect()
+        return shard
+
+    def _collect(self):
+        with self._collect_lock:
+            counters = defaultdict(float, self._retired.counters)
+            histograms = {key: list(value) for key, value in self._retired.histograms.items()}
+
+            for entry in list(self._shards):
+                thread_ref, shard = entry
+                merge_shard(counters, histograms, shard)
+                thread = thread_ref()
+                if thread is None or not thread.is_alive():
+                    # 終了したスレッドの値は退避先に合算して破棄する
+                    merge_shard(self._retired.counters, self._retired.histograms, shard)
+                    self._shards.remove(entry)
+
+            return counters, histograms
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_sql_count = 0
+        g._metrics_sql_time = 0.0
+
+    def _after_request(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is None or request.endpoint is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint
+        labels = (('endpoint', endpoint),)
+        self.inc('allocaide_http_requests_total', labels + (('method', request.method), ('status', str(response.status_code))))
+        self.observe('allocaide_http_request_duration_seconds', labels, elapsed, LATENCY_BUCKETS)
+        self.observe('allocaide_http_response_size_bytes', labels, response.calculate_content_length() or 0, SIZE_BUCKETS)
+        self.observe('allocaide_sql_statements_per_request', labels, g.get('_metrics_sql_count', 0), SQL_COUNT_BUCKETS)
+        self.observe('allocaide_sql_duration_seconds_per_request', labels, g.get('_metrics_sql_time', 0.0), LATENCY_BUCKETS)
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started_stack = conn.info.get('_metrics_started')
+        if not started_stack:
+            return
+        elapsed = time.perf_counter() - started_stack.pop()
+        if has_request_context() and '_metrics_started' in g:
+            g._metrics_sql_count += 1
+            g._metrics_sql_time += elapsed
+
+
+def merge_shard(counters, histograms, shard):
+    # 記録中のスレッドが辞書に新しいキーを足したり、ヒストグラムを途中まで更新したりしている間に
+    # 読まないよう、シャードのロックの下でコピーしてから合算する
+    with shard.lock:
+        shard_counters = dict(shard.counters)
+        shard_histograms = {key: list(value) for key, value in shard.histograms.items()}
+    for key, value in shard_counters.items():
+        counters[key] += value
+    for key, histogram in shard_histograms.items():
+        merged = histograms.get(key)
+        if merged is None:
+            histograms[key] = list(histogram)
+        else:
+            histograms[key] = [a + b for a, b in zip(merged, histogram)]
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + escaped + '}'
+
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
@@ -1,4 +1,6 @@
 import re
+import json
+from flask import current_app
 
 
 def validate_password(password):
@@ -57,4 +59,55 @@ def dict_to_range_list(ranges_dict):
         return [[range_dict['start'], range_dict['end']] for range_dict in ranges_dict]
     except Exception as e:
         print(f'models.assignment_model.ranges_data_to_ranges_list Error: {e}')
-        return []
\ No newline at end of file
+        return []
+
+
+def encode_page_ranges(ranges_list):
+    """
+    [[start, end], ...] 形式の範囲リストを Assignment.page_ranges 用の
+    コンパクトな JSON 配列文字列にエンコードする。
+    """
+    try:
+        return json.dumps([[int(start), int(end)] for start, end in ranges_list], separators=(',', ':'))
+    except Exception as e:
+        print(f'utils.model_util.encode_page_ranges Error: {e}')
+        return '[]'
+
+
+def decode_page_ranges(encoded_ranges):
+    """
+    Assignment.page_ranges の JSON 配列文字列を [[start, end], ...] 形式のリストにデコードする。
+    """
+    if not encoded_ranges:
+        return []
+    try:
+        return [[start, end] for start, end in json.loads(encoded_ranges)]
+    except Exception as e:
+        print(f'utils.model_util.decode_page_ranges Error: {e}')
+        return []
+
+
+# 楽観的ロック（version 列）の競合時に自動で再試行する回数
+OPTIMISTIC_RETRY_LIMIT = 3
+
+
+def get_optimistic_retry_limit():
+    return current_app.config.get('OPTIMISTIC_RETRY_LIMIT', OPTIMISTIC_RETRY_LIMIT)
+
+
+def parse_expected_version(value):
+    """
+    クライアントが送った version を整数に変換する。省略された場合は None を返す。
+    None の場合は競合の検出を保存時の version の比較だけに任せます。
+    """
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Version must be an integer.')
+
+
+def version_conflict_response(entity_name, current):
+    """他のリクエストが先に更新していた場合の 409 レスポンスを、現在の状態と合わせて返す。"""
+    return {'error': f'{entity_name} was modified by another request.', 'current': current}, 409
@@ -0,0 +1,127 @@
+"""
+パスワードのハッシュ化と検証。
+scrypt は意図的に重い処理のため、リクエストスレッドで直接実行せず、
+上限付きのスレッドプールで実行します（hashlib.scrypt は実行中に GIL を解放します）。
+ハッシュは 'scrypt$n$r$p$salt$hash' 形式で保存し、旧形式（ソルト無しの SHA-256 の16進文字列）も検証できます。
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app
+
+# scrypt のコストパラメータ（n は 2 の累乗）
+PASSWORD_HASH_N = 2 ** 14
+PASSWORD_HASH_R = 8
+PASSWORD_HASH_P = 1
+# ハッシュ計算用のワーカー数と、待ち行列を含めた同時処理数の上限
+PASSWORD_HASH_WORKERS = 4
+PASSWORD_HASH_MAX_PENDING = 64
+PASSWORD_HASH_TIMEOUT = 10
+
+SALT_LENGTH = 16
+HASH_LENGTH = 32
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_pending = None
+
+
+def get_executor():
+    global _executor, _executor_pid, _pending
+    # fork 後の子プロセスでは親のスレッドプールを使えないため作り直す
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                workers = current_app.config.get('PASSWORD_HASH_WORKERS', PASSWORD_HASH_WORKERS)
+                max_pending = current_app.config.get('PASSWORD_HASH_MAX_PENDING', PASSWORD_HASH_MAX_PENDING)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+                _pending = threading.BoundedSemaphore(max_pending)
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def run_in_pool(func, *args):
+    """
+    func をハッシュ用スレッドプールで実行し、結果を待つ。
+    同時処理数の上限を超えた場合やタイムアウトした場合は PasswordHasherBusy を送出する。
+    """
+    executor = get_executor()
+    pending = _pending
+    if not pending.acquire(blocking=False):
+        raise PasswordHasherBusy('Too many password operations in progress.')
+    try:
+        future = executor.submit(func, *args)
+        return future.result(timeout=current_app.config.get('PASSWORD_HASH_TIMEOUT', PASSWORD_HASH_TIMEOUT))
+    except FutureTimeoutError:
+        raise PasswordHasherBusy('Password operation timed out.')
+    finally:
+        pending.release()
+
+
+def get_cost():
+    return (
+        current_app.config.get('PASSWORD_HASH_N', PASSWORD_HASH_N),
+        current_app.config.get('PASSWORD_HASH_R', PASSWORD_HASH_R),
+        current_app.config.get('PASSWORD_HASH_P', PASSWORD_HASH_P),
+    )
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * r * n, dklen=HASH_LENGTH)
+
+
+def _hash_password(password, n, r, p):
+    salt = os.urandom(SALT_LENGTH)
+    derived = _scrypt(password, salt, n, r, p)
+    return '$'.join([
+        'scrypt', str(n), str(r), str(p),
+        base64.b64encode(salt).decode(), base64.b64encode(derived).decode(),
+    ])
+
+
+def _verify_password(password, stored_hash):
+    if not stored_hash:
+        return False
+
+    if not stored_hash.startswith('scrypt$'):
+        # 旧形式: ソルト無しの SHA-256
+        legacy_hash = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy_hash, stored_hash)
+
+    try:
+        _, n, r, p, salt, expected = stored_hash.split('$')
+        derived = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(base64.b64encode(derived).decode(), expected)
+
+
+def hash_password(password):
+    n, r, p = get_cost()
+    return run_in_pool(_hash_password, password, n, r, p)
+
+
+def verify_password(password, stored_hash):
+    return run_in_pool(_verify_password, password, stored_hash)
+
+
+def needs_rehash(stored_hash):
+    """保存されたハッシュが旧形式、または現在のコスト設定と異なる場合に True を返す。"""
+    if not stored_hash or not stored_hash.startswith('scrypt$'):
+        return True
+    try:
+        _, n, r, p, _, _ = stored_hash.split('$')
+        return (int(n), int(r), int(p)) != get_cost()
+    except ValueError:
+        return True
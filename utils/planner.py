@@ -0,0 +1,159 @@
+"""
+学習計画の割り当て。
+課題ごとの未完了ページを、今日から締め切り前の最終学習日までの各日に均等に割り振ります。
+1 日の容量を超えた日の超過分は、締め切りに余裕のある課題なら後ろの日へ送り、
+残りは締め切りの早い課題から前の日へ前倒しします。
+
+ページ単位のループは行わず、課題ごとの「1 日あたりのページ数」をリストの掛け算と
+差分配列でまとめて計算し、容量の調整も日単位で行います。
+保存済みの計画に一部の課題だけを割り当て直す場合は、他の課題の残り容量に allocate_within で割り振ります。
+"""
+
+from bisect import bisect_right
+
+
+def count_pages(page_ranges):
+    return sum(end - start + 1 for start, end in page_ranges)
+
+
+def split_ranges(page_ranges, counts):
+    """
+    昇順の page_ranges を先頭から counts の件数ずつに分け、各区切りの範囲リストを返す。
+    例: split_ranges([[1, 5], [8, 9]], [3, 4]) -> [[[1, 3]], [[4, 5], [8, 9]]]
+    """
+    chunks = []
+    index = 0
+    position = page_ranges[0][0] if page_ranges else 0
+    for count in counts:
+        chunk = []
+        while count > 0 and index < len(page_ranges):
+            end = page_ranges[index][1]
+            take = min(count, end - position + 1)
+            chunk.append([position, position + take - 1])
+            count -= take
+            position += take
+            if position > end:
+                index += 1
+                if index < len(page_ranges):
+                    position = page_ranges[index][0]
+        chunks.append(chunk)
+    return chunks
+
+
+def subtract_ranges(page_ranges, removed):
+    """
+    昇順で重なりのない page_ranges から、同じく昇順の removed の範囲を取り除く。
+    例: subtract_ranges([[1, 10]], [[3, 4], [8, 12]]) -> [[1, 2], [5, 7]]
+    """
+    result = []
+    index = 0
+    for start, end in page_ranges:
+        while index < len(removed) and removed[index][1] < start:
+            index += 1
+        position = start
+        current = index
+        while current < len(removed) and removed[current][0] <= end:
+            if removed[current][0] > position:
+                result.append([position, removed[current][0] - 1])
+            position = max(position, removed[current][1] + 1)
+            current += 1
+        if position <= end:
+            result.append([position, end])
+    return result
+
+
+def allocate_within(total, capacities):
+    """
+    total ページを、日ごとの空き容量 capacities を超えない範囲でできるだけ均等に割り振る。
+    空き容量の合計が足りない場合は None を返す。
+    """
+    if total > sum(capacities):
+        return None
+    if total == 0:
+        return [0] * len(capacities)
+
+    # 各日の割り当てを level で頭打ちにしたときに total 以上になる最小の level を二分探索する
+    low, high = 1, max(capacities)
+    while low < high:
+        level = (low + high) // 2
+        if sum(min(capacity, level) for capacity in capacities) >= total:
+            high = level
+        else:
+            low = level + 1
+
+    counts = [min(capacity, low - 1) for capacity in capacities]
+    rest = total - sum(counts)
+    for day, capacity in enumerate(capacities):
+        if rest == 0:
+            break
+        if capacity >= low:
+            counts[day] += 1
+            rest -= 1
+    return counts
+
+
+def shift(counts, totals, capacity, day, to_day, candidates):
+    """day の容量超過分を、candidates の順に各課題の割り当てから to_day へ移す。"""
+    overflow = totals[day] - capacity
+    if overflow <= 0:
+        return
+    moved_total = 0
+    for i in candidates:
+        moved = min(overflow - moved_total, counts[i][day])
+        if moved:
+            counts[i][day] -= moved
+            counts[i][to_day] += moved
+            moved_total += moved
+            if moved_total == overflow:
+                break
+    totals[day] -= moved_total
+    totals[to_day] += moved_total
+
+
+def allocate(items, capacity):
+    """
+    items は (key, page_ranges, last_day) のリスト。last_day は今日を 0 とした最終学習日で、
+    負の値（締め切り超過）は今日に割り当てます。
+    日ごとの [(key, ページ数, page_ranges), ...] のリストと、日ごとの合計ページ数のリストを返す。
+    今日の合計が容量を超える場合は、締め切りまでに終わらない量があることを示します。
+    """
+    if not items:
+        return [], []
+
+    pages = [count_pages(page_ranges) for _, page_ranges, _ in items]
+    spans = [max(last_day, 0) + 1 for _, _, last_day in items]
+    horizon = max(spans)
+
+    # 1. 課題ごとに均等割りし、差分配列で日ごとの合計を求める
+    counts = []
+    difference = [0] * (horizon + 1)
+    for total, span in zip(pages, spans):
+        base, extra = divmod(total, span)
+        counts.append([base + 1] * extra + [base] * (span - extra))
+        difference[0] += base + 1
+        difference[extra] -= 1
+        difference[span] -= base
+    totals = []
+    running = 0
+    for day in range(horizon):
+        running += difference[day]
+        totals.append(running)
+
+    # 2. 容量を超えた日の超過分を移す。まず締め切りに余裕のある課題の分を翌日へ送り、
+    #    それでも残る分は最終日から順に、締め切りの早い課題から前日へ前倒しする
+    order = sorted(range(len(items)), key=lambda i: spans[i])
+    sorted_spans = [spans[i] for i in order]
+    for day in range(horizon - 1):
+        # 翌日にも割り当てられる課題（span > day + 1）を、締め切りの遅いものから送る
+        shift(counts, totals, capacity, day, day + 1, reversed(order[bisect_right(sorted_spans, day + 1):]))
+    for day in range(horizon - 1, 0, -1):
+        shift(counts, totals, capacity, day, day - 1, order[bisect_right(sorted_spans, day):])
+
+    # 3. 日ごとの件数に合わせて未完了の範囲を先頭から切り分ける
+    days = [[] for _ in range(horizon)]
+    for (key, page_ranges, _), day_counts in zip(items, counts):
+        for day, (count, chunk) in enumerate(zip(day_counts, split_ranges(page_ranges, day_counts))):
+            if count:
+                days[day].append((key, count, chunk))
+
+    return days, totals
@@ -0,0 +1,115 @@
+"""
+SQL 文の数の予算（クエリバジェット）と N+1 検出。
+
+エンドポイントは @query_budget(n) で 1 リクエストあたりの SQL 文の上限を宣言します。
+assert_query_budget はテストクライアントでリクエストを送り、その間に実行された SQL を記録して、
+上限を超えた場合や、パラメータだけが異なる同じ形の SQL が繰り返された場合（N+1）に
+QueryBudgetExceeded を送出します。
+"""
+
+from collections import Counter
+from urllib.parse import urlsplit
+
+from sqlalchemy import event
+
+from .slow_query_log import fingerprint
+
+# 同じ形の SQL がこの回数を超えて実行されたら N+1 とみなす
+DEFAULT_MAX_REPEATS = 3
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries, max_repeats=DEFAULT_MAX_REPEATS):
+    """
+    ビュー関数に 1 リクエストあたりの SQL 文の上限を宣言する。
+    @bp.route の直下（@token_required より外側）に付けます。
+    """
+    def decorator(func):
+        func.query_budget = max_queries
+        func.query_max_repeats = max_repeats
+        return func
+    return decorator
+
+
+def match_endpoint(app, method, path):
+    """path のエンドポイント名を返す。path にクエリ文字列が含まれていても構いません。"""
+    endpoint, _ = app.url_map.bind('localhost').match(urlsplit(path).path, method=method.upper())
+    return endpoint
+
+
+def get_query_budget(app, endpoint):
+    """エンドポイントに宣言された (max_queries, max_repeats) を返す。未宣言なら (None, None)。"""
+    view = app.view_functions.get(endpoint)
+    return getattr(view, 'query_budget', None), getattr(view, 'query_max_repeats', None)
+
+
+class QueryRecorder:
+    """with ブロックの間にエンジンで実行された SQL 文を記録する。"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(self.engine, 'after_cursor_execute', self._after_cursor_execute)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event.remove(self.engine, 'after_cursor_execute', self._after_cursor_execute)
+        return False
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self, max_repeats=DEFAULT_MAX_REPEATS):
+        """max_repeats 回を超えて実行された同じ形の SQL を [(正規化した SQL, 回数), ...] で返す。"""
+        counts = Counter()
+        normalized_by_fingerprint = {}
+        for statement, _ in self.statements:
+            statement_fingerprint, normalized = fingerprint(statement)
+            counts[statement_fingerprint] += 1
+            normalized_by_fingerprint[statement_fingerprint] = normalized
+        return [
+            (normalized_by_fingerprint[key], count)
+            for key, count in counts.most_common()
+            if count > max_repeats
+        ]
+
+
+def assert_query_budget(client, method, path, max_queries=None, max_repeats=None, **kwargs):
+    """
+    テストクライアントでリクエストを送り、SQL 文の数と繰り返しを検査してレスポンスを返す。
+    max_queries / max_repeats を省略した場合はエンドポイントに宣言された値を使います。
+    クエリ文字列は path に含めても、query_string= で渡しても構いません。
+    """
+    from ..extensions import db
+
+    app = client.application
+    endpoint = match_endpoint(app, method, path)
+    declared_queries, declared_repeats = get_query_budget(app, endpoint)
+    if max_queries is None:
+        max_queries = declared_queries
+    if max_repeats is None:
+        max_repeats = declared_repeats if declared_repeats is not None else DEFAULT_MAX_REPEATS
+
+    with app.app_context():
+        engine = db.engine
+    with QueryRecorder(engine) as recorder:
+        response = client.open(path, method=method.upper(), **kwargs)
+
+    problems = []
+    if max_queries is not None and recorder.count > max_queries:
+        problems.append(f'{recorder.count} statements exceed the budget of {max_queries}')
+    for normalized, count in recorder.repeated(max_repeats):
+        problems.append(f'N+1: executed {count} times: {normalized}')
+    if problems:
+        raise QueryBudgetExceeded(f'{method.upper()} {path} ({endpoint}):\n  ' + '\n  '.join(problems))
+
+    return response
@@ -0,0 +1,24 @@
+"""
+よく使うクエリの登録先。
+ORM の Query を毎回組み立てる代わりに、モジュール読み込み時に bindparam を使った select() を
+一度だけ構築して登録します。同じ文オブジェクトを使い回すため、キャッシュキーの生成以外の
+組み立て・コンパイル処理はホットパスから外れます。
+"""
+
+from ..extensions import db
+
+_registry = {}
+
+
+def register_query(name, statement):
+    _registry[name] = statement
+    return statement
+
+
+def get_registered_queries():
+    return dict(_registry)
+
+
+def fetch_first(statement, **params):
+    """登録済みの文を実行し、最初の ORM オブジェクト（無ければ None）を返す。"""
+    return db.session.execute(statement, params).scalars().first()
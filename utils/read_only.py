@@ -0,0 +1,41 @@
+"""
+GET エンドポイント用の読み取り専用セッション。
+@read_only を付けたビューは autoflush を無効にしたセッションで実行され、
+データベースには読み取り専用であることを伝えます（SQLite: PRAGMA query_only、
+PostgreSQL: SET TRANSACTION READ ONLY）。ビューの終了時にトランザクションはロールバックされます。
+書き込みを行うビュー（例: /logout）には付けないでください。
+"""
+
+from functools import wraps
+
+from flask import current_app
+
+from ..extensions import db
+
+
+def set_read_only(connection, read_only):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        connection.exec_driver_sql(f'PRAGMA query_only = {1 if read_only else 0}')
+    elif dialect == 'postgresql' and read_only:
+        # トランザクション単位の設定のため、ロールバックで元に戻る
+        connection.exec_driver_sql('SET TRANSACTION READ ONLY')
+
+
+def read_only(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not current_app.config.get('READ_ONLY_SESSIONS', True):
+            return func(*args, **kwargs)
+
+        session = db.session()
+        connection = session.connection()
+        set_read_only(connection, True)
+        try:
+            with session.no_autoflush:
+                return func(*args, **kwargs)
+        finally:
+            # 接続はプールで再利用されるため、返す前に設定を戻す
+            set_read_only(connection, False)
+            session.rollback()
+    return wrapper
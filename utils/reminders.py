@@ -0,0 +1,278 @@
+"""
+締め切りのリマインダー。
+未完了のタスクと課題の締め切りを階層型タイミングホイールに登録し、バックグラウンドスレッドで
+REMINDER_TICK_SECONDS ごとに進めて、締め切りの REMINDER_DUE_SOON_SECONDS 前に due_soon、
+締め切り時刻に overdue の通知をシンクへ渡します。
+
+全件を読むのはスケジューラの起動時だけです。書き込みを行うモデル関数は user_changed を呼び、
+次の tick でそのユーザーの締め切りだけを読み直します。
+送った通知は締め切りごとに記録し、読み直しで同じ項目を登録し直しても同じ締め切りの通知は再送しません。
+
+プリフォークで複数のワーカーが動く場合、ホイールを動かすのはロックファイルを取得した 1 プロセスだけで、
+他のワーカーの user_changed は無効化バスで伝えます。
+
+通知先は REMINDER_SINK で選びます。
+    'log'      logging に出力する（既定）
+    'webhook'  Webhook の代わりに REMINDER_WEBHOOK_PATH へ JSON Lines で追記する
+    'events'   reminder_event テーブルに書き込み、/get_reminders で取得できるようにする
+callable を渡した場合は、それを通知ごとに呼び出します。
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from .timing_wheel import TimingWheel
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICK_SECONDS = 60
+DEFAULT_DUE_SOON_SECONDS = 24 * 60 * 60
+# 無効化バスでリマインダーの変更を伝えるときのエンドポイント名
+REMINDER_CHANNEL = 'reminders'
+
+
+def log_sink(notification):
+    logger.info(
+        'Reminder %s: %s %s "%s" (user %s) deadline=%s',
+        notification['kind'], notification['type'], notification['id'],
+        notification['title'], notification['user_id'], notification['deadline'],
+    )
+
+
+class WebhookSink:
+    """Webhook 送信の代わりに、送るはずだった本文をファイルに 1 行ずつ追記する。"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, notification):
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(notification, ensure_ascii=False) + '\n')
+
+
+def event_sink(notification):
+    from ..models.reminder_model import record_reminder_event
+
+    record_reminder_event(notification)
+
+
+class ReminderScheduler:
+    def __init__(self):
+        self.enabled = False
+        self.app = None
+        self.bus = None
+        self.sink = log_sink
+        self.tick_seconds = DEFAULT_TICK_SECONDS
+        self.due_soon = timedelta(seconds=DEFAULT_DUE_SOON_SECONDS)
+        self.is_leader = False
+        self.delivered = 0
+        self.wheel = None
+        self._deadlines = {}  # (type, id) -> (user_id, deadline)
+        self._keys_by_user = defaultdict(set)
+        self._fired = {}  # (type, id, kind) -> 送った通知の締め切り
+        self._pending_users = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock_file = None
+
+    def init_app(self, app, bus=None):
+        self.enabled = app.config.get('REMINDERS_ENABLED', False)
+        if not self.enabled:
+            return
+
+        self.app = app
+        self.tick_seconds = app.config.get('REMINDER_TICK_SECONDS', DEFAULT_TICK_SECONDS)
+        self.due_soon = timedelta(seconds=app.config.get('REMINDER_DUE_SOON_SECONDS', DEFAULT_DUE_SOON_SECONDS))
+        self.sink = self._resolve_sink(app)
+
+        self.bus = bus
+        if bus is not None:
+            bus.subscribe(self._on_invalidation)
+        # fork 後のワーカーでスレッドを起動するため、最初のリクエストで開始する
+        app.before_request(self.start)
+
+    def _resolve_sink(self, app):
+        sink = app.config.get('REMINDER_SINK', 'log')
+        if callable(sink):
+            return sink
+        if sink == 'webhook':
+            return WebhookSink(app.config.get('REMINDER_WEBHOOK_PATH') or os.path.join(app.instance_path, 'reminder_webhook.jsonl'))
+        if sink == 'events':
+            return event_sink
+        return log_sink
+
+    def start(self):
+        """このプロセスでスケジューラのスレッドを開始する。開始済みの場合は何もしない。"""
+        if not self.enabled or (self._thread is not None and self._pid == os.getpid()):
+            return
+
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # fork 元の状態は引き継がない
+            self._pid = os.getpid()
+            self.is_leader = False
+            self.wheel = None
+            self._deadlines = {}
+            self._keys_by_user = defaultdict(set)
+            self._fired = {}
+            self._pending_users = set()
+            self._lock_file = None
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='reminder-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def user_changed(self, user_id):
+        """ユーザーのタスクや課題の締め切り・状態が変わったことを通知する。"""
+        if not self.enabled:
+            return
+        if self.is_leader:
+            with self._lock:
+                self._pending_users.add(user_id)
+        elif self.bus is not None:
+            self.bus.publish(user_id, REMINDER_CHANNEL)
+
+    def _on_invalidation(self, user_id, endpoint):
+        if endpoint == REMINDER_CHANNEL and self.is_leader:
+            with self._lock:
+                self._pending_users.add(user_id)
+
+    def _run(self):
+        while not self._stop.wait(self.tick_seconds - time.time() % self.tick_seconds):
+            try:
+                self.tick()
+            except Exception:
+                logger.exception('Reminder scheduler tick failed.')
+
+    def tick(self):
+        """変更のあったユーザーを読み直し、現在時刻までホイールを進めて通知を渡す。"""
+        if not self.is_leader:
+            if not self._acquire_leadership():
+                return
+            self.wheel = TimingWheel(self._tick_of(time.time()) - 1)
+            self._reload(None)
+
+        if self.bus is not None:
+            # 購読者（失効トークンのフィルタなど）はアプリケーションコンテキストを必要とする
+            with self.app.app_context():
+                self.bus.poll()
+        with self._lock:
+            users, self._pending_users = self._pending_users, set()
+        if users:
+            self._reload(users)
+
+        # 各 tick の処理は、そのスロットに登録された通知の件数だけで決まる
+        current_tick = math.floor(time.time() / self.tick_seconds)
+        while self.wheel.current_tick < current_tick:
+            for (item_type, item_id, kind), notification in self.wheel.advance():
+                self._fired[(item_type, item_id, kind)] = self._deadlines[(item_type, item_id)][1]
+                if kind == 'overdue':
+                    self._forget((item_type, item_id))
+                self._deliver(notification)
+
+    def _acquire_leadership(self):
+        if fcntl is not None:
+            path = self.app.config.get('REMINDER_LOCK_PATH') or os.path.join(self.app.instance_path, 'reminders.lock')
+            lock_file = open(path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        self.is_leader = True
+        return True
+
+    def _tick_of(self, timestamp):
+        # 締め切りより前に通知しないよう切り上げる
+        return math.ceil(timestamp / self.tick_seconds)
+
+    def _reload(self, user_ids):
+        """
+        user_ids の締め切りを読み直し、変わった項目だけを登録し直す。None の場合は全ユーザーを読む。
+        起動時の読み込みでは、すでに due_soon の期間に入っている項目の due_soon を送りません。
+        """
+        from ..models.reminder_model import load_reminder_items
+
+        now = datetime.now(timezone.utc)
+        since = now - timedelta(seconds=self.tick_seconds)
+        with self.app.app_context():
+            # 直前の tick 以降に締め切りを過ぎ、まだ overdue を送っていない項目も含める
+            items = load_reminder_items(since, user_ids)
+        # 読み込みの対象から外れた締め切りの送信記録は不要になる
+        self._fired = {key: deadline for key, deadline in self._fired.items() if deadline > since}
+
+        seen = set()
+        for item in items:
+            key = (item['type'], item['id'])
+            seen.add(key)
+            if self._deadlines.get(key) == (item['user_id'], item['deadline']):
+                continue
+            self._deadlines[key] = (item['user_id'], item['deadline'])
+            self._keys_by_user[item['user_id']].add(key)
+            self._schedule(item, now, send_late_due_soon=user_ids is not None)
+
+        if user_ids is not None:
+            for user_id in user_ids:
+                for key in self._keys_by_user.get(user_id, set()) - seen:
+                    self._forget(key)
+
+    def _schedule(self, item, now, send_late_due_soon):
+        notification = {
+            'type': item['type'],
+            'id': item['id'],
+            'user_id': item['user_id'],
+            'title': item['title'],
+            'deadline': item['deadline'].isoformat(),
+        }
+        due_soon_at = item['deadline'] - self.due_soon
+        key = (item['type'], item['id'])
+        if (due_soon_at > now or send_late_due_soon) and not self._has_fired(key + ('due_soon',), item['deadline']):
+            self.wheel.schedule(key + ('due_soon',), self._tick_of(due_soon_at.timestamp()), dict(notification, kind='due_soon'))
+        else:
+            self.wheel.cancel(key + ('due_soon',))
+        if not self._has_fired(key + ('overdue',), item['deadline']):
+            self.wheel.schedule(key + ('overdue',), self._tick_of(item['deadline'].timestamp()), dict(notification, kind='overdue'))
+        else:
+            self.wheel.cancel(key + ('overdue',))
+
+    def _has_fired(self, key, deadline):
+        # 締め切りが変わった場合は新しい締め切りとして通知する
+        return self._fired.get(key) == deadline
+
+    def _forget(self, key):
+        user_id, _ = self._deadlines.pop(key, (None, None))
+        if user_id is not None:
+            self._keys_by_user[user_id].discard(key)
+            if not self._keys_by_user[user_id]:
+                del self._keys_by_user[user_id]
+        self.wheel.cancel(key + ('due_soon',))
+        self.wheel.cancel(key + ('overdue',))
+
+    def _deliver(self, notification):
+        try:
+            with self.app.app_context():
+                self.sink(notification)
+            self.delivered += 1
+        except Exception:
+            logger.exception('Failed to deliver reminder %s.', notification)
@@ -0,0 +1,53 @@
+"""
+リクエスト単位の所有者確認キャッシュ。
+(user_id, entity, id) をキーに、1 リクエストの間だけ flask.g に検索結果を保持します。
+同じリクエスト内で書き込みを行った場合は invalidate_lookup でキャッシュを破棄してください。
+リクエストコンテキストの外（CLI やベンチマーク）ではキャッシュせず、毎回 loader を呼び出します。
+"""
+
+from flask import g, has_request_context
+
+_MISSING = object()
+
+
+def get_request_cache():
+    if not has_request_context():
+        return None
+
+    cache = g.get('_identity_cache')
+    if cache is None:
+        cache = g._identity_cache = {}
+    return cache
+
+
+def cached_lookup(user_id, entity, entity_id, loader):
+    """
+    (user_id, entity, entity_id) の検索結果をキャッシュから返す。
+    キャッシュに無い場合は loader() を呼び出し、その結果（None を含む）を保存する。
+    """
+    cache = get_request_cache()
+    if cache is None:
+        return loader()
+
+    key = (user_id, entity, entity_id)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = loader()
+        cache[key] = value
+    return value
+
+
+def invalidate_lookup(user_id, entity, entity_id=None):
+    """
+    キャッシュを破棄する。entity_id を省略した場合はそのユーザーの entity をすべて破棄する。
+    """
+    cache = get_request_cache()
+    if not cache:
+        return
+
+    if entity_id is not None:
+        cache.pop((user_id, entity, entity_id), None)
+        return
+
+    for key in [key for key in cache if key[0] == user_id and key[1] == entity]:
+        del cache[key]
@@ -0,0 +1,176 @@
+"""
+プロセス内のレスポンスキャッシュ（LRU + TTL）。
+(user_id, endpoint, params) をキーに、一覧系のモデル関数の戻り値を保持します。
+書き込みを行うモデル関数は invalidate でそのユーザーの該当エンドポイントを破棄してください。
+無効化バスを渡した場合、invalidate は他のワーカープロセスにも通知されます。
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_TTL = 60
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, enabled=True):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._versions = {}  # (user_id, endpoint) -> 書き込みごとに増える世代番号
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.bus = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def init_app(self, app, bus=None):
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        self.max_bytes = app.config.get('RESPONSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', DEFAULT_TTL)
+        self.clear()
+
+        self.bus = bus
+        if bus is not None:
+            bus.subscribe(self.invalidate_local)
+
+    def cached(self, endpoint):
+        """
+        user_id を第 1 引数に取るモデル関数の戻り値をキャッシュするデコレータ。
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(user_id, *args, **kwargs):
+                if not self.enabled:
+                    return func(user_id, *args, **kwargs)
+
+                key = self.make_key(user_id, endpoint, *args, **kwargs)
+                found, value = self.get(key)
+                if found:
+                    return value
+
+                # 計算中に書き込みがあった場合は古い結果を保存しない
+                version = self.get_version(user_id, endpoint)
+                value = func(user_id, *args, **kwargs)
+                self.set(key, value, version)
+                return value
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def make_key(user_id, endpoint, *args, **kwargs):
+        return (user_id, endpoint, args, tuple(sorted(kwargs.items())))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            expires_at, size, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key, value, version=None):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if version is not None and version != self._versions.get((key[0], key[1]), 0):
+                return
+
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+
+            # メモリ上限を超えた分を古い順に追い出す
+            while self._bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def get_version(self, user_id, endpoint):
+        with self._lock:
+            return self._versions.get((user_id, endpoint), 0)
+
+    def invalidate(self, user_id, *endpoints):
+        """
+        ユーザーの指定したエンドポイントのキャッシュを破棄し、他のワーカーにも通知する。
+        """
+        self.invalidate_local(user_id, *endpoints)
+        if self.bus is not None:
+            self.bus.publish(user_id, *endpoints)
+
+    def invalidate_local(self, user_id, *endpoints):
+        """
+        このプロセスのキャッシュだけを破棄する。
+        """
+        with self._lock:
+            for endpoint in endpoints:
+                version_key = (user_id, endpoint)
+                self._versions[version_key] = self._versions.get(version_key, 0) + 1
+
+            for key in [key for key in self._entries if key[0] == user_id and key[1] in endpoints]:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def metric_samples(self):
+        """/metrics 用に統計値を (name, type, help, samples) のリストで返す。"""
+        stats = self.stats()
+        return [
+            (f'allocaide_response_cache_{name}_total', 'counter', f'Response cache {name}.', [((), stats[name])])
+            for name in ('hits', 'misses', 'evictions', 'expirations', 'invalidations')
+        ] + [
+            ('allocaide_response_cache_entries', 'gauge', 'Response cache entries.', [((), stats['entries'])]),
+            ('allocaide_response_cache_bytes', 'gauge', 'Estimated response cache size.', [((), stats['bytes'])]),
+        ]
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+def estimate_size(value):
+    """キャッシュする値のおおよそのバイト数を見積もる。"""
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
@@ -0,0 +1,165 @@
+"""
+スロークエリログ。
+db.session から発行された SQL のうち、実行時間が SLOW_QUERY_THRESHOLD（秒）を超えたものを、
+パラメータ、発行元のルートとモデル関数、自動取得した EXPLAIN QUERY PLAN と合わせて記録します。
+同じ形の SQL（リテラルと IN リストの長さを正規化したフィンガープリント）は
+SLOW_QUERY_DEDUP_INTERVAL 秒に 1 回だけ出力し、その間の発生回数をまとめて報告します。
+出力全体も 1 分あたり SLOW_QUERY_MAX_PER_MINUTE 件に制限します。
+"""
+
+import hashlib
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_DEDUP_INTERVAL = 60
+DEFAULT_MAX_PER_MINUTE = 30
+DEFAULT_BUFFER_SIZE = 100
+MAX_PARAMETERS_LENGTH = 500
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """リテラルと IN リストの長さを正規化した SQL のフィンガープリントを返す。"""
+    normalized = _STRING_LITERAL.sub('?', statement)
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _IN_LIST.sub('IN (...)', normalized)
+    normalized = _WHITESPACE.sub(' ', normalized).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16], normalized
+
+
+def find_model_function():
+    """呼び出し元をたどり、最も内側のモデル層の関数名（例: page_model.get_incomplete_page_ranges）を返す。"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if '.models.' in module:
+            return f'{module.rsplit(".", 1)[-1]}.{frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self.threshold = None
+        self.dedup_interval = DEFAULT_DEDUP_INTERVAL
+        self.max_per_minute = DEFAULT_MAX_PER_MINUTE
+        self.entries = deque(maxlen=DEFAULT_BUFFER_SIZE)
+        self._last_logged = {}  # fingerprint -> (logged_at, suppressed_count)
+        self._window = deque()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        self.threshold = app.config.get('SLOW_QUERY_THRESHOLD', DEFAULT_THRESHOLD)
+        self.dedup_interval = app.config.get('SLOW_QUERY_DEDUP_INTERVAL', DEFAULT_DEDUP_INTERVAL)
+        self.max_per_minute = app.config.get('SLOW_QUERY_MAX_PER_MINUTE', DEFAULT_MAX_PER_MINUTE)
+        self.entries = deque(maxlen=app.config.get('SLOW_QUERY_BUFFER_SIZE', DEFAULT_BUFFER_SIZE))
+        if not self.threshold:
+            return
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(db.engine, 'handle_error', self._handle_error)
+
+    def recent(self, limit=None):
+        entries = list(self.entries)
+        return entries[-limit:] if limit else entries
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_slow_query_started', []).append(time.perf_counter())
+
+    def _handle_error(self, exception_context):
+        # 失敗した SQL では after_cursor_execute が呼ばれないため、ここで開始時刻を取り除く
+        conn = exception_context.connection
+        if conn is not None and not conn.closed:
+            started_stack = conn.info.get('_slow_query_started')
+            if started_stack:
+                started_stack.pop()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started_stack = conn.info.get('_slow_query_started')
+        if not started_stack:
+            return
+        elapsed = time.perf_counter() - started_stack.pop()
+        if elapsed < self.threshold:
+            return
+
+        statement_fingerprint, normalized = fingerprint(statement)
+        suppressed = self._should_log(statement_fingerprint)
+        if suppressed is None:
+            return
+
+        entry = {
+            'timestamp': time.time(),
+            'duration_ms': round(elapsed * 1000, 3),
+            'fingerprint': statement_fingerprint,
+            'statement': statement,
+            'parameters': repr(parameters)[:MAX_PARAMETERS_LENGTH],
+            'route': request.endpoint if has_request_context() else None,
+            'model_function': find_model_function(),
+            'suppressed_since_last': suppressed,
+            'query_plan': None if executemany else self._explain(conn, cursor, statement, parameters),
+        }
+        self.entries.append(entry)
+        logger.warning(
+            'Slow query %.1fms [%s] route=%s function=%s suppressed=%d\n%s\nparameters=%s\nplan=%s',
+            entry['duration_ms'], statement_fingerprint, entry['route'], entry['model_function'],
+            suppressed, normalized, entry['parameters'], entry['query_plan'],
+        )
+
+    def _should_log(self, statement_fingerprint):
+        """
+        出力する場合は前回の出力以降に抑制した件数を、出力しない場合は None を返す。
+        """
+        now = time.monotonic()
+        with self._lock:
+            logged_at, suppressed = self._last_logged.get(statement_fingerprint, (None, 0))
+            if logged_at is not None and now - logged_at < self.dedup_interval:
+                self._last_logged[statement_fingerprint] = (logged_at, suppressed + 1)
+                return None
+
+            while self._window and now - self._window[0] > 60:
+                self._window.popleft()
+            if len(self._window) >= self.max_per_minute:
+                self._last_logged[statement_fingerprint] = (logged_at, suppressed + 1)
+                return None
+
+            self._window.append(now)
+            self._last_logged[statement_fingerprint] = (now, 0)
+            return suppressed
+
+    @staticmethod
+    def _explain(conn, cursor, statement, parameters):
+        dialect = conn.dialect.name
+        if dialect == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        elif dialect in ('postgresql', 'mysql'):
+            prefix = 'EXPLAIN '
+        else:
+            return None
+        if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+            return None
+
+        # 同じ DBAPI 接続で実行する（エンジンイベントを再度発生させない）
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            return [' '.join(str(column) for column in row) for row in explain_cursor.fetchall()]
+        except Exception as e:
+            return [f'EXPLAIN failed: {e}']
+        finally:
+            explain_cursor.close()
@@ -0,0 +1,80 @@
+"""
+階層型タイミングホイール。
+時刻を tick（整数）で表し、各レベルは slots 個のスロットを持ちます。
+レベル l のスロットは slots ** l tick 分の期間を表し、現在の tick と発火 tick を slots 進数で
+比べたときに最初に異なる桁のレベルに登録します。現在の tick がそのスロットの期間に入ったときに
+下のレベルへ移し替え（カスケード）、レベル 0 のスロットに来た時点で発火します。
+
+登録・取り消しは O(1)、1 tick 進めるごとの処理はそのスロットの件数とカスケード分
+（1 件あたり最大 levels 回）だけで、登録済みの全件を走査することはありません。
+全レベルの範囲（slots ** levels tick）を超える登録は overflow に置き、
+最上位レベルが一周するたびに登録し直します。
+"""
+
+
+class TimingWheel:
+    def __init__(self, current_tick, slots=64, levels=4):
+        self.current_tick = current_tick
+        self.slots = slots
+        self.levels = levels
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._overflow = {}
+        self._locations = {}  # key -> 登録先の辞書
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __contains__(self, key):
+        return key in self._locations
+
+    def schedule(self, key, tick, payload):
+        """key を tick に登録する。同じ key が登録済みの場合は置き換える。"""
+        self.cancel(key)
+        # 過去の tick は次の tick で発火させる
+        self._place(key, max(tick, self.current_tick + 1), payload)
+
+    def cancel(self, key):
+        bucket = self._locations.pop(key, None)
+        if bucket is not None:
+            del bucket[key]
+            return True
+        return False
+
+    def advance(self):
+        """1 tick 進め、新しい現在の tick に発火する (key, payload) のリストを返す。"""
+        self.current_tick += 1
+        tick = self.current_tick
+
+        if tick % self.slots ** self.levels == 0:
+            self._replace(self._overflow)
+        for level in range(self.levels - 1, 0, -1):
+            span = self.slots ** level
+            if tick % span == 0:
+                self._replace(self._wheels[level][tick // span % self.slots])
+
+        bucket = self._wheels[0][tick % self.slots]
+        fired = [(key, payload) for key, (_, payload) in bucket.items()]
+        for key, _ in fired:
+            del self._locations[key]
+        bucket.clear()
+        return fired
+
+    def _place(self, key, tick, payload):
+        level = 0
+        span = self.slots
+        while tick // span != self.current_tick // span:
+            level += 1
+            span *= self.slots
+        if level >= self.levels:
+            bucket = self._overflow
+        else:
+            bucket = self._wheels[level][tick // self.slots ** level % self.slots]
+        bucket[key] = (tick, payload)
+        self._locations[key] = bucket
+
+    def _replace(self, bucket):
+        entries = list(bucket.items())
+        bucket.clear()
+        for key, (tick, payload) in entries:
+            del self._locations[key]
+            self._place(key, tick, payload)
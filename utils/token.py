@@ -1,64 +1,156 @@
-from flask import jsonify, request, current_app
+from flask import jsonify, request, current_app, g
 import jwt, datetime
+import hashlib
+import uuid
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from datetime import datetime, timedelta, timezone
+from ..models.revoked_token_model import is_token_revoked
 
 # アクセストークンの有効期限（例: 1時間）
 ACCESS_TOKEN_EXPIRATION = timedelta(hours=1)
 # リフレッシュトークンの有効期限（例: 7日）
 REFRESH_TOKEN_EXPIRATION = timedelta(days=7)
+# 検証済みトークンキャッシュの最大件数（0 でキャッシュ無効）
+TOKEN_CACHE_SIZE = 10000
 
+ALGORITHM = 'HS256'
+# トークンの種類。アクセストークンとリフレッシュトークンを取り違えて使えないよう type クレームに入れる
+ACCESS_TOKEN_TYPE = 'access'
+REFRESH_TOKEN_TYPE = 'refresh'
 
-def generate_access_token(user_id):
+# 署名キーは SECRET_KEY ごとに一度だけ準備する
+_signing_key = (None, None)
+# トークンのダイジェスト -> (SECRET_KEY, exp, payload)
+_verified_tokens = OrderedDict()
+_verified_tokens_lock = threading.Lock()
+
+
+def get_signing_key():
+    global _signing_key
     secret_key = current_app.config['SECRET_KEY']
+    if _signing_key[0] != secret_key:
+        prepared_key = jwt.get_algorithm_by_name(ALGORITHM).prepare_key(secret_key)
+        _signing_key = (secret_key, prepared_key)
+    return _signing_key
+
+
+def generate_access_token(user_id):
+    _, secret_key = get_signing_key()
     expiration_time = datetime.now(timezone.utc) + ACCESS_TOKEN_EXPIRATION
     exp_timestamp = int(expiration_time.timestamp())
     payload = {
         'user_id': user_id,
-        'exp': exp_timestamp
+        'exp': exp_timestamp,
+        'jti': uuid.uuid4().hex,
+        'type': ACCESS_TOKEN_TYPE,
     }
-    token = jwt.encode(payload, secret_key, algorithm='HS256')
+    token = jwt.encode(payload, secret_key, algorithm=ALGORITHM)
     return token
 
 
 def generate_refresh_token(user_id):
-    secret_key = current_app.config['SECRET_KEY']
+    _, secret_key = get_signing_key()
     expiration_time = datetime.now(timezone.utc) + REFRESH_TOKEN_EXPIRATION
     exp_timestamp = int(expiration_time.timestamp())
     payload = {
         'user_id': user_id,
-        'exp': exp_timestamp
+        'exp': exp_timestamp,
+        'jti': uuid.uuid4().hex,
+        'type': REFRESH_TOKEN_TYPE,
     }
-    token = jwt.encode(payload, secret_key, algorithm='HS256')
+    token = jwt.encode(payload, secret_key, algorithm=ALGORITHM)
     return token
 
 
+def verify_token(token):
+    """
+    トークンを検証してペイロードを返す。
+    一度検証したトークンはダイジェストをキーにキャッシュし、以降は exp の確認のみ行う。
+    """
+    secret_key, prepared_key = get_signing_key()
+    cache_size = current_app.config.get('TOKEN_CACHE_SIZE', TOKEN_CACHE_SIZE)
+    if not cache_size:
+        return jwt.decode(token, prepared_key, algorithms=[ALGORITHM])
+
+    digest = hashlib.sha256(token.encode()).digest()
+    with _verified_tokens_lock:
+        cached = _verified_tokens.get(digest)
+        if cached is not None and cached[0] == secret_key:
+            _verified_tokens.move_to_end(digest)
+
+    if cached is not None and cached[0] == secret_key:
+        exp = cached[1]
+        if exp is not None and exp <= time.time():
+            with _verified_tokens_lock:
+                _verified_tokens.pop(digest, None)
+            raise jwt.ExpiredSignatureError('Signature has expired')
+        return cached[2]
+
+    payload = jwt.decode(token, prepared_key, algorithms=[ALGORITHM])
+    with _verified_tokens_lock:
+        _verified_tokens[digest] = (secret_key, payload.get('exp'), payload)
+        while len(_verified_tokens) > cache_size:
+            _verified_tokens.popitem(last=False)
+    return payload
+
+
+def authenticate(authorization_header, token_type=ACCESS_TOKEN_TYPE):
+    """
+    Authorization ヘッダーを検証し、(payload, error_response, status_code) を返す。
+    検証に成功した場合 error_response は None。type クレームが token_type と異なるトークンは拒否します。
+    """
+    if not authorization_header or authorization_header == 'Bearer null':
+        return None, {'error': 'Token not found.'}, 401
 
-def token_required(func):
+    try:
+        token_parts = authorization_header.split()
+        if len(token_parts) != 2:
+            raise jwt.InvalidTokenError('Invalid token format')
+        
+        payload = verify_token(token_parts[1])
+        if payload.get('user_id') is None:
+            raise jwt.InvalidTokenError('User ID not found in token payload')
+        # type クレームを持たないデプロイ前のトークンは、exp まではアクセストークンとして扱う
+        if payload.get('type', ACCESS_TOKEN_TYPE) != token_type:
+            raise jwt.InvalidTokenError('Invalid token type')
+
+        # 失効済みのトークンを拒否する（通常はブルームフィルタのみで判定される）
+        if is_token_revoked(payload.get('jti')):
+            raise jwt.InvalidTokenError('Token has been revoked')
+
+        return payload, None, None
+
+    except jwt.ExpiredSignatureError:
+        return None, {'error': 'Token has expired'}, 401
+    except jwt.InvalidTokenError as e:
+        return None, {'error': str(e)}, 401
+    except Exception as e:
+        return None, {'error': str(e)}, 500
+
+
+def token_required(func, token_type=ACCESS_TOKEN_TYPE):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token or token == 'Bearer null':
-            return jsonify({'error': 'Token not found.'}), 401
-        
+        payload, error_response, status_code = authenticate(request.headers.get('Authorization'), token_type)
+        if error_response:
+            return jsonify(error_response), status_code
+
         try:
-            token_parts = token.split()
-            if len(token_parts) != 2:
-                raise jwt.InvalidTokenError('Invalid token format')
-            
-            payload = jwt.decode(token_parts[1], current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            user_id = payload.get('user_id')
-            if user_id is None:
-                raise jwt.InvalidTokenError('User ID not found in token payload')
+            # ログアウトやトークンのローテーションで失効させるためにペイロードを保持する
+            g.token_payload = payload
 
             # 元の関数に user_id を渡して実行
-            return func(user_id, *args, **kwargs)
+            return func(payload['user_id'], *args, **kwargs)
             
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError as e:
-            return jsonify({'error': str(e)}), 401
         except Exception as e:
             return jsonify({'error': str(e)}), 500
         
     return wrapper
+
+
+def refresh_token_required(func):
+    """token_required と同じだが、リフレッシュトークンだけを受け付ける。"""
+    return token_required(func, REFRESH_TOKEN_TYPE)
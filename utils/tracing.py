@@ -0,0 +1,139 @@
+"""
+リクエスト単位のトレース。
+サンプリングされたリクエストについて、@traced を付けたモデル関数、span() で囲んだ処理、
+および SQL の実行をネストしたスパンの木として記録します。
+記録したトレースはメモリ上のリングバッファ（/debug/traces で参照）と、
+TRACE_FILE を指定した場合は NDJSON ファイルに出力します。
+サンプリングされていないリクエストでは、@traced と span() は flask.g を 1 回参照するだけです。
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+DEFAULT_SAMPLE_RATE = 0.0
+DEFAULT_BUFFER_SIZE = 100
+MAX_STATEMENT_LENGTH = 200
+
+
+class Span:
+    __slots__ = ('name', 'started', 'ended', 'attributes', 'children')
+
+    def __init__(self, name, attributes=None):
+        self.name = name
+        self.started = time.perf_counter()
+        self.ended = None
+        self.attributes = attributes or {}
+        self.children = []
+
+    def to_dict(self, origin):
+        return {
+            'name': self.name,
+            'start_ms': round((self.started - origin) * 1000, 3),
+            'duration_ms': round((self.ended - self.started) * 1000, 3) if self.ended is not None else None,
+            'attributes': self.attributes,
+            'children': [child.to_dict(origin) for child in self.children],
+        }
+
+
+def _current_stack():
+    if not has_request_context():
+        return None
+    return g.get('_trace_stack')
+
+
+@contextmanager
+def span(name, **attributes):
+    """サンプリング中のリクエストであれば、現在のスパンの子スパンとして処理を記録する。"""
+    stack = _current_stack()
+    if stack is None:
+        yield None
+        return
+
+    child = Span(name, attributes)
+    stack[-1].children.append(child)
+    stack.append(child)
+    try:
+        yield child
+    finally:
+        child.ended = time.perf_counter()
+        stack.pop()
+
+
+def traced(func):
+    """関数の実行をスパンとして記録するデコレータ。"""
+    name = f'{func.__module__.rsplit(".", 1)[-1]}.{func.__name__}'
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current_stack() is None:
+            return func(*args, **kwargs)
+        with span(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class Tracer:
+    def __init__(self):
+        self.sample_rate = DEFAULT_SAMPLE_RATE
+        self.trace_file = None
+        self.traces = deque(maxlen=DEFAULT_BUFFER_SIZE)
+        self._file_lock = threading.Lock()
+
+    def init_app(self, app, db):
+        self.sample_rate = app.config.get('TRACE_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+        self.trace_file = app.config.get('TRACE_FILE')
+        self.traces = deque(maxlen=app.config.get('TRACE_BUFFER_SIZE', DEFAULT_BUFFER_SIZE))
+        if not self.sample_rate:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def recent(self, limit=None):
+        traces = list(self.traces)
+        return traces[-limit:] if limit else traces
+
+    def _before_request(self):
+        if random.random() >= self.sample_rate:
+            return
+        g._trace_stack = [Span(f'{request.method} {request.path}')]
+
+    def _after_request(self, response):
+        stack = g.pop('_trace_stack', None)
+        if not stack:
+            return response
+
+        root = stack[0]
+        root.ended = time.perf_counter()
+        root.attributes.update({'endpoint': request.endpoint, 'status': response.status_code})
+        trace = {'timestamp': time.time(), **root.to_dict(root.started)}
+        self.traces.append(trace)
+
+        if self.trace_file:
+            with self._file_lock, open(self.trace_file, 'a', encoding='utf-8') as trace_file:
+                trace_file.write(json.dumps(trace, default=str) + '\n')
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stack = _current_stack()
+        if stack is None or context is None:
+            return
+        sql_span = Span('sql', {'statement': statement[:MAX_STATEMENT_LENGTH]})
+        stack[-1].children.append(sql_span)
+        context._trace_span = sql_span
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        sql_span = getattr(context, '_trace_span', None)
+        if sql_span is not None:
+            sql_span.ended = time.perf_counter()